@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import DateTime, delete, func, insert, literal, literal_column, select
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import archived_contacts
+from app.queries import CONTACT_FIELDS
+
+IN_CHUNK_SIZE = 500
+
+# Литерал, а не параметр: иначе SQLite не сопоставит условие с частичным индексом ix_contacts_closed_created_at
+CLOSED = literal_column("'closed'")
+
+
+def archive_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archive_batch(db: Session, before: datetime, limit: int) -> int:
+    """
+    Перенести до limit закрытых обращений, созданных раньше before, в contacts_archive
+    одной транзакцией. Обращение с наибольшим id не переносится: SQLite выдает
+    новым строкам max(id) + 1, и его удаление вернуло бы id архивного обращения в оборот.
+    """
+    newest = select(func.max(models.Contact.id)).scalar_subquery()
+    contact_ids = db.scalars(
+        select(models.Contact.id).where(
+            models.Contact.status == CLOSED,
+            models.Contact.created_at < before,
+            models.Contact.id < newest
+        ).order_by(models.Contact.created_at).limit(limit)
+    ).all()
+    if not contact_ids:
+        return 0
+
+    archived_at = literal(datetime.utcnow(), DateTime)
+    columns = [getattr(models.Contact, name) for name in CONTACT_FIELDS]
+    for start in range(0, len(contact_ids), IN_CHUNK_SIZE):
+        chunk = contact_ids[start:start + IN_CHUNK_SIZE]
+        # Закрытое обращение больше не меняется, поэтому копия и удаление согласованы
+        db.execute(insert(models.ContactArchive).from_select(
+            CONTACT_FIELDS + ("archived_at",),
+            select(*columns, archived_at).where(models.Contact.id.in_(chunk))
+        ))
+        db.execute(delete(models.Contact).where(models.Contact.id.in_(chunk)))
+    db.commit()
+    archived_contacts.inc(amount=len(contact_ids))
+    return len(contact_ids)
+
+
+def archive_contacts(db: Session, before: Optional[datetime] = None) -> int:
+    """
+    Переносить закрытые обращения старше ARCHIVE_AFTER_DAYS пачками по ARCHIVE_BATCH_SIZE
+    с паузой ARCHIVE_BATCH_PAUSE между ними, чтобы не занимать запись надолго
+    """
+    before = before or archive_cutoff()
+    total = 0
+    while True:
+        archived = archive_batch(db, before, settings.ARCHIVE_BATCH_SIZE)
+        total += archived
+        if archived < settings.ARCHIVE_BATCH_SIZE:
+            return total
+        time.sleep(settings.ARCHIVE_BATCH_PAUSE)
+
+
+def archive_closed_contacts() -> int:
+    """Архивировать закрытые обращения в отдельной сессии"""
+    db = SessionLocal()
+    try:
+        return archive_contacts(db)
+    finally:
+        db.close()
+
+
+def is_archived(db: Session, contact_id: int) -> bool:
+    return db.get(models.ContactArchive, contact_id) is not None
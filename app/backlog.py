@@ -0,0 +1,179 @@
+import threading
+from collections import Counter
+from typing import Iterable, List, NamedTuple, Set
+from sqlalchemy import literal_column, select, update
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.config import settings
+from app.counters import ContactCounterService, counter_key
+from app.database import SessionLocal
+from app.loads import load_tracker
+from app.metrics import backlog_assigned
+from app.routing import routing_table
+from app.services import DistributionService, TransactionConflict
+
+# Литерал, а не параметр: иначе SQLite не сопоставит условие с частичным индексом ix_contacts_backlog
+ACTIVE = literal_column("'active'")
+
+
+class BacklogAssignment(NamedTuple):
+    contact_id: int
+    source_id: int
+    operator_id: int
+
+
+class BacklogScheduler:
+    """
+    События появления свободной нагрузки: операторы (активация, рост max_load,
+    закрытие обращений) и источники (новые веса). Повторные события до
+    обработки схлопываются.
+    """
+
+    def __init__(self):
+        self._operator_ids: Set[int] = set()
+        self._source_ids: Set[int] = set()
+        self._sweep = False
+        self._lock = threading.Lock()
+
+    def notify_operators(self, operator_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._operator_ids.update(operator_id for operator_id in operator_ids if operator_id)
+
+    def notify_sources(self, source_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._source_ids.update(source_ids)
+
+    def request_sweep(self) -> None:
+        """Проверить все источники (при запуске и периодически - на случай событий других процессов)"""
+        with self._lock:
+            self._sweep = True
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._sweep or self._operator_ids or self._source_ids)
+
+    def take(self):
+        with self._lock:
+            events = (self._operator_ids, self._source_ids, self._sweep)
+            self._operator_ids, self._source_ids, self._sweep = set(), set(), False
+        return events
+
+
+backlog_scheduler = BacklogScheduler()
+
+
+def _affected_sources(db: Session, operator_ids: Set[int], source_ids: Set[int], sweep: bool) -> List[int]:
+    weights = select(models.SourceOperatorWeight.source_id).distinct()
+    if sweep:
+        return list(db.scalars(weights))
+    affected = set(source_ids)
+    if operator_ids:
+        affected.update(db.scalars(weights.where(models.SourceOperatorWeight.operator_id.in_(operator_ids))))
+    return sorted(affected)
+
+
+def _assign_backlog(db: Session, source_ids: List[int], limit: int) -> List[BacklogAssignment]:
+    """
+    Назначить до limit старейших нераспределенных обращений источников по весам
+    среди операторов со свободной нагрузкой. Из каждого источника читается не
+    больше обращений, чем свободно у его операторов, поэтому стоимость зависит
+    от освободившейся нагрузки, а не от размера очереди.
+    """
+    routes = {source_id: routing_table.get(db, source_id) for source_id in source_ids}
+    routes = {source_id: route for source_id, route in routes.items() if route.entries}
+    capacity = DistributionService.free_capacity(db, routes.values())
+
+    def has_capacity(entry) -> bool:
+        return capacity.get(entry.operator_id, 0) > 0
+
+    backlog = []
+    for source_id, route in routes.items():
+        free = sum(max(capacity.get(operator_id, 0), 0) for operator_id in {
+            entry.operator_id for entry in route.entries
+        })
+        if free <= 0:
+            continue
+        backlog.extend(db.execute(
+            select(models.Contact.id, models.Contact.source_id, models.Contact.created_at).where(
+                models.Contact.source_id == source_id,
+                models.Contact.operator_id.is_(None),
+                models.Contact.status == ACTIVE
+            ).order_by(models.Contact.id).limit(min(free, limit))
+        ).all())
+    # Общий порядок FIFO между источниками
+    backlog.sort(key=lambda row: row.id)
+
+    assignments = []
+    deltas = Counter()
+    active = schemas.ContactStatus.ACTIVE.value
+    for row in backlog:
+        if len(assignments) == limit:
+            break
+        entry = routes[row.source_id].select(has_capacity)
+        if entry is None:
+            continue
+        capacity[entry.operator_id] -= 1
+        assignments.append(BacklogAssignment(row.id, row.source_id, entry.operator_id))
+        deltas[counter_key(row.source_id, None, active, row.created_at)] -= 1
+        deltas[counter_key(row.source_id, entry.operator_id, active, row.created_at)] += 1
+
+    by_operator = {}
+    for assignment in assignments:
+        by_operator.setdefault(assignment.operator_id, []).append(assignment.contact_id)
+    for operator_id, contact_ids in by_operator.items():
+        if not DistributionService.reserve_capacity(db, operator_id, len(contact_ids)):
+            raise TransactionConflict(operator_id)
+        for start in range(0, len(contact_ids), DistributionService.IN_CHUNK_SIZE):
+            chunk = contact_ids[start:start + DistributionService.IN_CHUNK_SIZE]
+            updated = db.execute(
+                update(models.Contact).where(
+                    models.Contact.id.in_(chunk),
+                    models.Contact.operator_id.is_(None),
+                    models.Contact.status == ACTIVE
+                ).values(operator_id=operator_id).execution_options(synchronize_session=False)
+            ).rowcount
+            # Обращение закрыли или назначили параллельно: повторяем с новым снимком
+            if updated != len(chunk):
+                raise TransactionConflict(operator_id)
+
+    ContactCounterService.record(db, deltas)
+    return assignments
+
+
+def assign_backlog(db: Session, source_ids: List[int]) -> int:
+    """Назначать нераспределенные обращения источников пачками, пока хватает свободной нагрузки"""
+    total = 0
+    while True:
+        assignments = DistributionService.run_in_transaction(
+            db, lambda: _assign_backlog(db, source_ids, settings.BACKLOG_BATCH_SIZE)
+        )
+        for operator_id, amount in Counter(assignment.operator_id for assignment in assignments).items():
+            load_tracker.increment(operator_id, amount)
+        for source_id, amount in Counter(assignment.source_id for assignment in assignments).items():
+            backlog_assigned.inc(str(source_id), amount=amount)
+        total += len(assignments)
+        if len(assignments) < settings.BACKLOG_BATCH_SIZE:
+            return total
+
+
+def drain_backlog() -> bool:
+    """Обработать накопленные события свободной нагрузки; вернуть True, если появились новые"""
+    operator_ids, source_ids, sweep = backlog_scheduler.take()
+    if not (operator_ids or source_ids or sweep):
+        return False
+
+    db = SessionLocal()
+    try:
+        affected = _affected_sources(db, operator_ids, source_ids, sweep)
+        if affected:
+            assign_backlog(db, affected)
+    except Exception:
+        # События не теряются: повторим после паузы
+        backlog_scheduler.notify_operators(operator_ids)
+        backlog_scheduler.notify_sources(source_ids)
+        if sweep:
+            backlog_scheduler.request_sweep()
+        raise
+    finally:
+        db.close()
+    return backlog_scheduler.pending
@@ -0,0 +1,170 @@
+import argparse
+import sys
+from datetime import datetime, timedelta
+from app.database import SessionLocal, init_db
+
+
+def rebuild_stats(args) -> None:
+    from app.counters import ContactCounterService
+
+    db = SessionLocal()
+    try:
+        total = ContactCounterService.rebuild(db)
+    finally:
+        db.close()
+    print(f"Contact counters rebuilt: {total} contacts")
+
+
+def recount_loads(args) -> None:
+    from app.loads import recount_operator_loads
+
+    db = SessionLocal()
+    try:
+        loads = recount_operator_loads(db)
+    finally:
+        db.close()
+    print(f"Operator loads recounted: {len(loads)} operators")
+
+
+def archive_contacts(args) -> None:
+    from app.archive import archive_contacts as archive
+
+    before = datetime.utcnow() - timedelta(days=args.older_than_days) if args.older_than_days is not None else None
+    db = SessionLocal()
+    try:
+        total = archive(db, before)
+    finally:
+        db.close()
+    print(f"Contacts archived: {total}")
+
+
+def import_leads(args) -> None:
+    from app.exports import FileFormat
+    from app.imports import import_leads_file
+
+    file_format = FileFormat(args.format) if args.format else (
+        FileFormat.NDJSON if args.path.endswith((".ndjson", ".jsonl")) else FileFormat.CSV
+    )
+    error_path = args.errors or args.path + ".errors.csv"
+
+    def progress(processed: int, imported: int, failed: int) -> None:
+        print(f"{processed} rows processed, {imported} imported, {failed} failed", file=sys.stderr)
+
+    with open(args.path, "rb") as source:
+        report = import_leads_file(source, file_format, error_path, progress)
+    print(f"Leads imported: {report.imported} of {report.processed} rows, {report.failed} failed")
+    if report.error_file:
+        print(f"Errors written to {report.error_file}")
+
+
+def _simulation_operator(value: str):
+    from app import schemas
+
+    parts = value.split(":")
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError("expected OPERATOR_ID:WEIGHT[:MAX_LOAD]")
+    try:
+        numbers = [int(part) for part in parts]
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected integers in OPERATOR_ID:WEIGHT[:MAX_LOAD]")
+    return schemas.SimulationOperator(
+        operator_id=numbers[0], weight=numbers[1], max_load=numbers[2] if len(numbers) == 3 else None
+    )
+
+
+def simulate(args) -> None:
+    from app import schemas, simulation
+
+    config = schemas.SimulationRequest(
+        operators=args.operator,
+        arrivals=args.arrivals,
+        contacts=args.contacts,
+        rate_per_hour=args.rate_per_hour,
+        since=args.since,
+        until=args.until,
+        rate_multiplier=args.rate_multiplier,
+        mean_lifetime_minutes=args.mean_lifetime_minutes,
+        from_current_load=args.from_current_load,
+        seed=args.seed
+    )
+    db = SessionLocal()
+    try:
+        result = simulation.simulate_source(db, args.source_id, config)
+    except simulation.SimulationError as error:
+        sys.exit(str(error))
+    finally:
+        db.close()
+
+    if args.json:
+        print(result.model_dump_json(indent=2))
+        return
+    print(
+        f"{result.contacts} contacts over {result.duration_seconds / 3600:.1f} h: "
+        f"{result.assigned} assigned, {result.unassigned} unassigned ({result.unassigned_rate:.2%})"
+    )
+    if result.first_unassigned_after_seconds is not None:
+        print(f"All operators saturated after {result.first_unassigned_after_seconds / 3600:.2f} h")
+    print(f"{'operator':>8} {'weight':>6} {'max':>5} {'assigned':>9} {'share':>7} {'mean':>7} {'util':>7} {'peak':>5}  saturated")
+    for operator in result.operators:
+        saturated = operator.saturated_after_seconds
+        print(
+            f"{operator.operator_id:>8} {operator.weight:>6} {operator.max_load:>5} {operator.assigned:>9} "
+            f"{operator.share:>7.2%} {operator.mean_load:>7.2f} {operator.utilization:>7.2%} {operator.peak_load:>5}  "
+            + ("-" if saturated is None else f"{saturated / 3600:.2f} h")
+        )
+
+
+def main(argv=None) -> None:
+    """Служебные команды: python -m app.cli <команда>"""
+    from app import schemas
+    from app.exports import FileFormat
+
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "rebuild-stats", help="пересобрать счетчики и агрегаты статистики по таблице обращений"
+    ).set_defaults(handler=rebuild_stats)
+    commands.add_parser(
+        "recount-loads", help="пересчитать нагрузку операторов по активным обращениям"
+    ).set_defaults(handler=recount_loads)
+    archive_parser = commands.add_parser(
+        "archive-contacts", help="перенести закрытые обращения старше срока хранения в архив"
+    )
+    archive_parser.add_argument("--older-than-days", type=int, help="срок хранения (по умолчанию ARCHIVE_AFTER_DAYS)")
+    archive_parser.set_defaults(handler=archive_contacts)
+    import_parser = commands.add_parser(
+        "import-leads", help="импортировать лидов из CSV или NDJSON файла"
+    )
+    import_parser.add_argument("path", help="путь к файлу")
+    import_parser.add_argument("--format", choices=[item.value for item in FileFormat], help="формат файла (по умолчанию - по расширению)")
+    import_parser.add_argument("--errors", help="файл для ошибочных строк (по умолчанию <path>.errors.csv)")
+    import_parser.set_defaults(handler=import_leads)
+
+    simulate_parser = commands.add_parser(
+        "simulate", help="смоделировать распределение источника при других весах и max_load"
+    )
+    simulate_parser.add_argument("source_id", type=int)
+    simulate_parser.add_argument(
+        "--operator", action="append", type=_simulation_operator, metavar="ID:WEIGHT[:MAX_LOAD]",
+        help="оператор предлагаемой конфигурации (по умолчанию - текущие веса источника)"
+    )
+    simulate_parser.add_argument("--arrivals", choices=[item.value for item in schemas.SimulationArrivals], default="poisson")
+    simulate_parser.add_argument("--contacts", type=int, default=10000, help="число обращений (для history - не больше)")
+    simulate_parser.add_argument("--rate-per-hour", type=float, help="интенсивность потока (по умолчанию - по истории)")
+    simulate_parser.add_argument("--since", type=datetime.fromisoformat, help="начало периода истории")
+    simulate_parser.add_argument("--until", type=datetime.fromisoformat, help="конец периода истории")
+    simulate_parser.add_argument("--rate-multiplier", type=float, default=1.0, help="во сколько раз ускорить поток")
+    simulate_parser.add_argument("--mean-lifetime-minutes", type=float, default=60.0, help="среднее время жизни активного обращения")
+    simulate_parser.add_argument("--from-current-load", action="store_true", help="начать с текущей нагрузки операторов")
+    simulate_parser.add_argument("--seed", type=int)
+    simulate_parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    simulate_parser.set_defaults(handler=simulate)
+
+    args = parser.parse_args(argv)
+    init_db()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
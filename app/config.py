@@ -10,6 +10,58 @@ class Settings(BaseSettings):
     APP_VERSION: str
     DEBUG: bool = False
     API_V1_PREFIX: str = ""
+    LOAD_RECONCILE_INTERVAL: float = 60.0
+    STATS_HOURLY_RETENTION_DAYS: int = 7
+    STATS_COMPACT_INTERVAL: float = 3600.0
+    LEAD_CACHE_SIZE: int = 100000
+    LEAD_FILTER_CAPACITY: int = 1000000
+    LEAD_FILTER_ERROR_RATE: float = 0.01
+    CONFIG_VERSION_TTL: float = 1.0
+    CONFIG_CACHE_SIZE: int = 256
+    IMPORT_BATCH_SIZE: int = 5000
+    IMPORT_COMMIT_EVERY: int = 50000
+    IMPORT_ERRORS_DIR: str = "import_errors"
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_INTERVAL: float = 3600.0
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ARCHIVE_BATCH_PAUSE: float = 0.05
+    SIMULATION_MAX_CONTACTS: int = 1000000
+    BACKLOG_ENABLED: bool = True
+    BACKLOG_BATCH_SIZE: int = 500
+    BACKLOG_POLL_INTERVAL: float = 0.1
+    BACKLOG_SWEEP_INTERVAL: float = 300.0
+    INGEST_QUEUE_ENABLED: bool = False
+    INGEST_QUEUE_URL: str = "sqlite:///./ingest_queue.db"
+    INGEST_BATCH_SIZE: int = 500
+    INGEST_POLL_INTERVAL: float = 0.05
+    INGEST_LEASE_SECONDS: float = 60.0
+    INGEST_MAX_ATTEMPTS: int = 5
+    INGEST_RECEIPT_TTL_HOURS: int = 24
+    INGEST_PURGE_INTERVAL: float = 3600.0
+    METRICS_ENABLED: bool = True
+    SQL_PROFILING: bool = False
+    SQL_PROFILE_HEADER: str = "X-DB-Profile"
+    SQL_SLOW_QUERY_MS: float = 100.0
+    SQL_SLOW_LOG_FILE: str = ""
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: str = ""
+
+    READ_REPLICA_URLS: str = ""
+    READ_REPLICA_CHECK_INTERVAL: float = 5.0
+    READ_REPLICA_RETRY_INTERVAL: float = 1.0
+    READ_REPLICA_RETRY_MAX: float = 30.0
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_TEMP_STORE: str = "MEMORY"
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,168 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+
+CACHE_CONTROL = "no-cache"
+
+# Заголовки, которые сохраняются вместе с закэшированным телом ответа
+_SKIPPED_HEADERS = {"content-length", "content-type"}
+
+
+class ConfigVersion:
+    """
+    Версия конфигурации распределения. Хранится в БД и увеличивается в транзакции
+    изменения; процесс перечитывает ее не чаще раза в CONFIG_VERSION_TTL секунд.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, db: Session) -> int:
+        now = time.monotonic()
+        version = self._version
+        if version is not None and now - self._checked_at < self.ttl:
+            return version
+
+        version = db.scalar(
+            select(models.ConfigVersion.version).where(models.ConfigVersion.id == 1)
+        ) or 0
+        with self._lock:
+            self._version = version
+            self._checked_at = now
+        return version
+
+    @staticmethod
+    def bump(db: Session) -> None:
+        """Увеличить версию в текущей транзакции (после commit вызвать invalidate)"""
+        db.execute(
+            update(models.ConfigVersion).where(
+                models.ConfigVersion.id == 1
+            ).values(
+                version=models.ConfigVersion.version + 1
+            ).execution_options(synchronize_session=False)
+        )
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+
+
+class ConfigResponseCache:
+    """Ограниченный кэш сериализованных ответов по URL, действительный для одной версии"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, Tuple[int, bytes, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                return None
+            self._items.move_to_end(key)
+            return item[1], item[2]
+
+    def put(self, key: str, version: int, content: bytes, headers: Dict[str, str]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (version, content, headers)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+config_version = ConfigVersion(settings.CONFIG_VERSION_TTL)
+response_cache = ConfigResponseCache(settings.CONFIG_CACHE_SIZE)
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def serialize(response_model: Any, data: Any) -> bytes:
+    """Сериализовать данные в JSON по схеме ответа"""
+    adapter = _adapters.get(response_model)
+    if adapter is None:
+        adapter = _adapters.setdefault(response_model, TypeAdapter(response_model))
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def etag_response(
+    request: Request,
+    etag: str,
+    content: bytes,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Ответ с ETag: 304 без тела, если у клиента актуальная версия"""
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def content_etag(content: bytes) -> str:
+    return '"' + hashlib.blake2b(content, digest_size=16).hexdigest() + '"'
+
+
+def config_etag(key: str, version: int) -> str:
+    """ETag ресурса: версия конфигурации и хэш URL, чтобы ETag одного ресурса не подтверждал другие"""
+    return f'"cfg-{version}-' + hashlib.blake2b(key.encode(), digest_size=8).hexdigest() + '"'
+
+
+def config_response(
+    request: Request,
+    db: Session,
+    response_model: Any,
+    build: Callable[[Response], Any]
+) -> Response:
+    """
+    Ответ конфигурационного эндпоинта со строгим ETag по версии конфигурации и URL.
+    При совпадении If-None-Match отвечает 304 без обращения к БД (в пределах
+    CONFIG_VERSION_TTL), тело ответа кэшируется для текущей версии.
+    ETag выдается только существующему ресурсу, поэтому 304 до build не скрывает 404;
+    If-None-Match: * проверяется уже после build.
+    build получает Response для заголовков (например, X-Next-Cursor).
+    """
+    version = config_version.current(db)
+    key = request.url.path + "?" + request.url.query
+    etag = config_etag(key, version)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and if_none_match.strip() != "*" and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    cached = response_cache.get(key, version)
+    if cached is None:
+        header_holder = Response()
+        content = serialize(response_model, build(header_holder))
+        headers = {
+            name: value for name, value in header_holder.headers.items()
+            if name not in _SKIPPED_HEADERS
+        }
+        response_cache.put(key, version, content, headers)
+        cached = content, headers
+
+    content, headers = cached
+    return etag_response(request, etag, content, headers)
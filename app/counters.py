@@ -0,0 +1,300 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select, union_all, update
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+UNASSIGNED = 0
+
+# (source_id, operator_id, status, час создания обращения)
+CounterKey = Tuple[int, int, str, datetime]
+
+GROUP_COLUMNS = {
+    "source": "source_id",
+    "operator": "operator_id",
+    "status": "status",
+}
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def counter_key(
+    source_id: int,
+    operator_id: Optional[int],
+    status: str,
+    created_at: datetime
+) -> CounterKey:
+    return (
+        source_id,
+        operator_id or UNASSIGNED,
+        getattr(status, "value", status),
+        hour_bucket(created_at)
+    )
+
+
+def _update(db: Session, model, key: dict, amount: int) -> bool:
+    """Изменить существующую строку агрегата, вернуть False, если ее нет"""
+    result = db.execute(
+        update(model).where(
+            *(getattr(model, column) == value for column, value in key.items())
+        ).values(
+            count=model.count + amount
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def _increment(db: Session, model, key: dict, amount: int) -> None:
+    if not _update(db, model, key, amount):
+        # Параллельная вставка того же ключа даст IntegrityError и повтор транзакции
+        db.execute(insert(model).values(count=amount, **key))
+
+
+class ContactCounterService:
+    """Счетчики и почасовые агрегаты обращений, обновляемые в транзакции изменения обращений"""
+
+    @staticmethod
+    def record(db: Session, deltas: Dict[CounterKey, int]) -> None:
+        """
+        Применить изменения счетчиков и агрегатов в текущей транзакции.
+        Ключ - counter_key(...), значение - приращение (отрицательное при уходе из статуса).
+        Час старше hourly_cutoff(), уже свернутый в суточный агрегат, меняется в суточном:
+        иначе в часовом агрегате появилась бы строка с отрицательным числом.
+        """
+        cutoff = ContactCounterService.hourly_cutoff()
+        totals = Counter()
+        daily = Counter()
+        for (source_id, operator_id, status, bucket_start), amount in deltas.items():
+            if not amount:
+                continue
+            totals[(source_id, operator_id, status)] += amount
+            hourly_key = {
+                "bucket_start": bucket_start,
+                "source_id": source_id,
+                "operator_id": operator_id,
+                "status": status
+            }
+            if bucket_start >= cutoff:
+                _increment(db, models.ContactRollupHourly, hourly_key, amount)
+            elif not _update(db, models.ContactRollupHourly, hourly_key, amount):
+                daily[(day_bucket(bucket_start), source_id, operator_id, status)] += amount
+
+        for (bucket_start, source_id, operator_id, status), amount in daily.items():
+            if amount:
+                _increment(db, models.ContactRollupDaily, {
+                    "bucket_start": bucket_start,
+                    "source_id": source_id,
+                    "operator_id": operator_id,
+                    "status": status
+                }, amount)
+
+        for (source_id, operator_id, status), amount in totals.items():
+            if amount:
+                _increment(db, models.ContactCounter, {
+                    "source_id": source_id,
+                    "operator_id": operator_id,
+                    "status": status
+                }, amount)
+
+    @staticmethod
+    def hourly_cutoff(now: Optional[datetime] = None) -> datetime:
+        """Граница, старше которой часовые агрегаты сворачиваются в суточные"""
+        now = now or datetime.utcnow()
+        return day_bucket(now - timedelta(days=settings.STATS_HOURLY_RETENTION_DAYS))
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """Пересобрать счетчики и агрегаты по обращениям (с архивом), вернуть число обращений"""
+        cutoff = ContactCounterService.hourly_cutoff()
+        totals = Counter()
+        hourly = Counter()
+        daily = Counter()
+
+        # Архивные обращения учитываются наравне с оперативными
+        rows = db.execute(
+            union_all(*(
+                select(model.source_id, model.operator_id, model.status, model.created_at)
+                for model in (models.Contact, models.ContactArchive)
+            )).execution_options(yield_per=10000)
+        )
+        for source_id, operator_id, status, created_at in rows:
+            source_id, operator_id, status, bucket_start = counter_key(
+                source_id, operator_id, status, created_at
+            )
+            totals[(source_id, operator_id, status)] += 1
+            if bucket_start < cutoff:
+                daily[(day_bucket(bucket_start), source_id, operator_id, status)] += 1
+            else:
+                hourly[(bucket_start, source_id, operator_id, status)] += 1
+
+        db.query(models.ContactCounter).delete(synchronize_session=False)
+        db.query(models.ContactRollupHourly).delete(synchronize_session=False)
+        db.query(models.ContactRollupDaily).delete(synchronize_session=False)
+
+        if totals:
+            db.execute(insert(models.ContactCounter), [
+                {"source_id": source_id, "operator_id": operator_id, "status": status, "count": count}
+                for (source_id, operator_id, status), count in totals.items()
+            ])
+        for model, buckets in ((models.ContactRollupHourly, hourly), (models.ContactRollupDaily, daily)):
+            if buckets:
+                db.execute(insert(model), [
+                    {
+                        "bucket_start": bucket_start,
+                        "source_id": source_id,
+                        "operator_id": operator_id,
+                        "status": status,
+                        "count": count
+                    }
+                    for (bucket_start, source_id, operator_id, status), count in buckets.items()
+                ])
+        db.commit()
+        return sum(totals.values())
+
+    @staticmethod
+    def compact(db: Session, before: Optional[datetime] = None) -> int:
+        """Свернуть часовые агрегаты старше границы в суточные, вернуть число часовых строк"""
+        before = before or ContactCounterService.hourly_cutoff()
+        # DELETE ... RETURNING забирает строки атомарно относительно параллельных приращений
+        rows = db.execute(
+            delete(models.ContactRollupHourly).where(
+                models.ContactRollupHourly.bucket_start < before
+            ).returning(
+                models.ContactRollupHourly.bucket_start,
+                models.ContactRollupHourly.source_id,
+                models.ContactRollupHourly.operator_id,
+                models.ContactRollupHourly.status,
+                models.ContactRollupHourly.count
+            )
+        ).all()
+        if not rows:
+            db.rollback()
+            return 0
+
+        daily = Counter()
+        for bucket_start, source_id, operator_id, status, count in rows:
+            daily[(day_bucket(bucket_start), source_id, operator_id, status)] += count
+
+        for (bucket_start, source_id, operator_id, status), count in daily.items():
+            if count:
+                _increment(db, models.ContactRollupDaily, {
+                    "bucket_start": bucket_start,
+                    "source_id": source_id,
+                    "operator_id": operator_id,
+                    "status": status
+                }, count)
+
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    def contact_stats(db: Session) -> dict:
+        """Общее число обращений и разбивка по источникам, операторам и статусам"""
+        total = db.query(func.coalesce(func.sum(models.ContactCounter.count), 0)).scalar()
+
+        by_source = db.query(
+            models.Source.name,
+            func.sum(models.ContactCounter.count)
+        ).join(
+            models.ContactCounter, models.ContactCounter.source_id == models.Source.id
+        ).group_by(models.Source.id).all()
+
+        by_operator = db.query(
+            models.Operator.name,
+            func.sum(models.ContactCounter.count)
+        ).join(
+            models.ContactCounter, models.ContactCounter.operator_id == models.Operator.id
+        ).group_by(models.Operator.id).all()
+
+        by_status = db.query(
+            models.ContactCounter.status,
+            func.sum(models.ContactCounter.count)
+        ).group_by(models.ContactCounter.status).all()
+
+        return {
+            "total_contacts": total,
+            "contacts_by_source": {name: count for name, count in by_source if count},
+            "contacts_by_operator": {name: count for name, count in by_operator if count},
+            "contacts_by_status": {status: count for status, count in by_status if count}
+        }
+
+    @staticmethod
+    def distribution_stats(db: Session) -> dict:
+        """Число обращений по парам источник/оператор"""
+        rows = db.query(
+            models.Source.name,
+            models.Operator.name,
+            func.sum(models.ContactCounter.count)
+        ).join(
+            models.ContactCounter, models.ContactCounter.source_id == models.Source.id
+        ).join(
+            models.Operator, models.ContactCounter.operator_id == models.Operator.id
+        ).group_by(
+            models.Source.id, models.Operator.id
+        ).all()
+
+        result = {}
+        for source_name, operator_name, count in rows:
+            if count:
+                result.setdefault(source_name, {})[operator_name] = count
+        return result
+
+    @staticmethod
+    def timeseries(
+        db: Session,
+        start: datetime,
+        end: datetime,
+        bucket: str,
+        group_by: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Число обращений по интервалам [start, end) из агрегатов.
+        Часовые интервалы доступны за период хранения часовых агрегатов,
+        более ранние данные возвращаются суточными интервалами.
+        """
+        points = Counter()
+        for model in (models.ContactRollupHourly, models.ContactRollupDaily):
+            columns = [model.bucket_start]
+            if group_by:
+                columns.append(getattr(model, GROUP_COLUMNS[group_by]))
+            rows = db.query(*columns, func.sum(model.count)).filter(
+                model.bucket_start >= (
+                    day_bucket(start) if model is models.ContactRollupDaily else hour_bucket(start)
+                ),
+                model.bucket_start < end
+            ).group_by(*columns).all()
+
+            for row in rows:
+                bucket_start, count = row[0], row[-1]
+                group = row[1] if group_by else None
+                if group_by == "operator" and group == UNASSIGNED:
+                    group = None
+                if bucket == "day":
+                    bucket_start = day_bucket(bucket_start)
+                points[(bucket_start, group)] += count
+
+        return [
+            {"bucket_start": bucket_start, "group": group, "count": count}
+            for (bucket_start, group), count in sorted(
+                points.items(), key=lambda item: (item[0][0], str(item[0][1]))
+            )
+            if count
+        ]
+
+
+def compact_contact_rollups() -> int:
+    """Свернуть устаревшие часовые агрегаты в отдельной сессии"""
+    db = SessionLocal()
+    try:
+        return ContactCounterService.compact(db)
+    finally:
+        db.close()
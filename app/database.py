@@ -1,22 +1,106 @@
-from sqlalchemy import create_engine
+import asyncio
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional, TypeVar
+from fastapi import Depends
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.util import await_only
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
 
+T = TypeVar("T")
+
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (
+    ":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL.rstrip("/") == "sqlite:"
+)
+
 connect_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+if IS_SQLITE:
     connect_args = {"check_same_thread": False}
 
+pool_args = {}
+if not IS_SQLITE_MEMORY:
+    pool_args = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
+    SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **pool_args
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def sqlite_pragmas() -> list:
+    """PRAGMA профиля SQLite из настроек"""
+    pragmas = [
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+        ("cache_size", -settings.SQLITE_CACHE_SIZE_KB if settings.SQLITE_CACHE_SIZE_KB else None),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE),
+        ("temp_store", settings.SQLITE_TEMP_STORE),
+    ]
+    return [(name, value) for name, value in pragmas if value not in (None, "")]
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Применить профиль SQLite к каждому новому соединению"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas():
+            if name == "journal_mode" and IS_SQLITE_MEMORY:
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def get_async_database_url(url: Optional[str] = None) -> str:
+    """URL БД для асинхронного драйвера (по умолчанию - основной БД)"""
+    if url is None:
+        if settings.ASYNC_DATABASE_URL:
+            return settings.ASYNC_DATABASE_URL
+        url = SQLALCHEMY_DATABASE_URL
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(dialect, scheme)}://{rest}"
+
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    async_pool_args = dict(pool_args, poolclass=AsyncAdaptedQueuePool) if pool_args else {}
+    async_engine = create_async_engine(get_async_database_url(), **async_pool_args)
+    if IS_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+
+
 def get_db():
     """Dependency для получения сессии БД"""
     db = SessionLocal()
@@ -26,6 +110,80 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency для получения асинхронной сессии БД"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Код выполняется в обработчике async_endpoint, то есть в потоке цикла событий
+_on_event_loop: ContextVar[bool] = ContextVar("on_event_loop", default=False)
+
+
+def run_blocking(func: Callable[..., T], *args) -> T:
+    """
+    Выполнить блокирующий вызов (не через сессию обработчика): внутри async_endpoint -
+    в пуле потоков с ожиданием через цикл событий, иначе - напрямую
+    """
+    if not _on_event_loop.get():
+        return func(*args)
+
+    def call():
+        _on_event_loop.set(False)
+        return func(*args)
+
+    return await_only(run_in_threadpool(call))
+
+
+def pause(seconds: float) -> None:
+    """Пауза, не блокирующая цикл событий внутри async_endpoint"""
+    if _on_event_loop.get():
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+
+# Синхронная зависимость сессии -> асинхронная (app.replicas добавляет get_read_db)
+ASYNC_DEPENDENCIES = {get_db: get_async_db}
+
+
+def async_endpoint(endpoint):
+    """
+    Асинхронная версия синхронного обработчика с параметром db = Depends(get_db)
+    (или другой зависимостью из ASYNC_DEPENDENCIES).
+    Тело обработчика выполняется через AsyncSession.run_sync: ORM-код остается
+    прежним, а ввод-вывод идет через асинхронный драйвер без занятия потока.
+    Прочие блокирующие вызовы обработчика идут через run_blocking и pause.
+    """
+    signature = inspect.signature(endpoint)
+    db_parameter = signature.parameters.get("db")
+    async_dependency = ASYNC_DEPENDENCIES.get(getattr(getattr(db_parameter, "default", None), "dependency", None))
+    if async_dependency is None:
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        async_db = kwargs.pop("db")
+
+        def call(session):
+            token = _on_event_loop.set(True)
+            try:
+                return endpoint(*args, db=session, **kwargs)
+            finally:
+                _on_event_loop.reset(token)
+
+        return await async_db.run_sync(call)
+
+    wrapper.__signature__ = signature.replace(parameters=[
+        parameter.replace(default=Depends(async_dependency), annotation=inspect.Parameter.empty)
+        if parameter.name == "db" else parameter
+        for parameter in signature.parameters.values()
+    ])
+    return wrapper
+
+
 def init_db():
-    """Создание всех таблиц"""
+    """Создание всех таблиц и применение миграций схемы"""
+    from app.migrations import apply_migrations
     Base.metadata.create_all(bind=engine)
+    apply_migrations(engine)
@@ -0,0 +1,127 @@
+import csv
+import io
+from datetime import datetime
+from enum import Enum
+from typing import Iterator, Optional, Sequence
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select, union_all
+from app import models
+from app.queries import CONTACT_FIELDS, LEAD_FIELDS, as_utc
+from app.replicas import read_session
+from app.responses import dumps
+
+CHUNK_SIZE = 5000
+
+
+class FileFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    FileFormat.NDJSON: "application/x-ndjson",
+    FileFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def _created_between(statement: Select, column, start: Optional[datetime], end: Optional[datetime]) -> Select:
+    if start is not None:
+        statement = statement.where(column >= as_utc(start))
+    if end is not None:
+        statement = statement.where(column < as_utc(end))
+    return statement
+
+
+def contact_export_query(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source_id: Optional[int] = None,
+    operator_id: Optional[int] = None,
+    status: Optional[str] = None
+) -> Select:
+    """Обращения для выгрузки (включая архив закрытых): плоские колонки без JOIN, по возрастанию id"""
+    def filtered(model) -> Select:
+        statement = select(*(getattr(model, name) for name in CONTACT_FIELDS))
+        statement = _created_between(statement, model.created_at, start, end)
+        if source_id is not None:
+            statement = statement.where(model.source_id == source_id)
+        if operator_id is not None:
+            statement = statement.where(model.operator_id == operator_id)
+        if status is not None:
+            statement = statement.where(model.status == status)
+        return statement
+
+    statement = filtered(models.Contact)
+    if status == "active":
+        return statement.order_by(models.Contact.id)
+    statement = union_all(statement, filtered(models.ContactArchive))
+    return statement.order_by(statement.selected_columns.id)
+
+
+def lead_export_query(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Select:
+    """Лиды для выгрузки по возрастанию id"""
+    statement = select(*(getattr(models.Lead, name) for name in LEAD_FIELDS))
+    statement = _created_between(statement, models.Lead.created_at, start, end)
+    return statement.order_by(models.Lead.id)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_ndjson(rows, columns: Sequence[str]) -> bytes:
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _encode_csv(rows, columns: Sequence[str]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def stream_rows(
+    request: Request,
+    statement: Select,
+    columns: Sequence[str],
+    export_format: FileFormat
+) -> Iterator[bytes]:
+    """
+    Потоково выгрузить результат запроса порциями по CHUNK_SIZE строк.
+    Сессия открывается внутри генератора и живет, пока клиент читает ответ;
+    yield_per держит в памяти только текущую порцию (на PostgreSQL - серверный курсор).
+    Клиент, недавно изменявший данные, читает с основной БД (read-your-writes).
+    """
+    if export_format == FileFormat.CSV:
+        header = io.StringIO()
+        csv.writer(header, lineterminator="\n").writerow(columns)
+        yield header.getvalue().encode()
+
+    encode = _encode_csv if export_format == FileFormat.CSV else _encode_ndjson
+    db = read_session(request)
+    try:
+        result = db.execute(statement.execution_options(yield_per=CHUNK_SIZE))
+        for rows in result.partitions():
+            yield encode(rows, columns)
+    finally:
+        db.close()
+
+
+def export_response(
+    request: Request,
+    statement: Select,
+    columns: Sequence[str],
+    export_format: FileFormat,
+    name: str
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(request, statement, columns, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'}
+    )
@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.config import settings
+from app.database import SessionLocal
+from app.exports import FileFormat
+from app.lead_cache import lead_filter
+
+ERROR_SAMPLE_SIZE = 100
+ERROR_COLUMNS = ("line", "external_id", "error")
+LEAD_COLUMNS = ("external_id", "phone", "email")
+
+# (номер строки файла, данные строки или None, ошибка разбора)
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+_leads_adapter = TypeAdapter(List[schemas.LeadBase])
+
+
+def read_records(stream: TextIO, file_format: FileFormat) -> Iterator[Record]:
+    """Построчно разобрать CSV (с заголовком) или NDJSON"""
+    if file_format == FileFormat.CSV:
+        reader = csv.reader(stream)
+        header = next(reader, None) or []
+        for row in reader:
+            yield reader.line_num, dict(zip(header, row)), None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def _lead_values(row: dict) -> dict:
+    """Поля LeadBase из строки файла (пустые значения CSV - None)"""
+    values = {}
+    for name in LEAD_COLUMNS:
+        value = row.get(name)
+        values[name] = None if value == "" else value
+    return values
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+def _upsert_statement(db: Session):
+    """INSERT ... ON CONFLICT(external_id) DO UPDATE для SQLite и PostgreSQL"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise ValueError(f"Lead import is not supported for {dialect}")
+
+    statement = insert(models.Lead).inline().values(
+        external_id=bindparam("external_id"),
+        phone=bindparam("phone"),
+        email=bindparam("email"),
+        created_at=bindparam("created_at")
+    )
+    # Пустые поля файла не затирают уже известные контакты лида
+    return statement.on_conflict_do_update(
+        index_elements=[models.Lead.external_id],
+        set_={
+            "phone": func.coalesce(statement.excluded.phone, models.Lead.phone),
+            "email": func.coalesce(statement.excluded.email, models.Lead.email),
+        }
+    )
+
+
+class _UpsertWriter:
+    """
+    Пакетная запись лидов скомпилированным один раз upsert через executemany драйвера:
+    обработка параметров SQLAlchemy на каждую строку - основная доля времени импорта
+    """
+
+    COLUMNS = ("external_id", "phone", "email", "created_at")
+
+    def __init__(self, db: Session):
+        self.db = db
+        dialect = db.get_bind().dialect
+        compiled = _upsert_statement(db).compile(dialect=dialect)
+        self.sql = str(compiled)
+        self.positional = compiled.positional
+        self.order = tuple(compiled.positiontup) if compiled.positional else self.COLUMNS
+        self.process_created_at = models.Lead.__table__.c.created_at.type.dialect_impl(dialect).bind_processor(dialect)
+
+    def write(self, leads: Dict[str, Tuple[Optional[str], Optional[str]]]) -> None:
+        created_at = datetime.utcnow()
+        if self.process_created_at:
+            created_at = self.process_created_at(created_at)
+        rows = [
+            (external_id, phone, email, created_at)
+            for external_id, (phone, email) in leads.items()
+        ]
+        if not self.positional:
+            rows = [dict(zip(self.COLUMNS, row)) for row in rows]
+        elif self.order != self.COLUMNS:
+            positions = [self.COLUMNS.index(name) for name in self.order]
+            rows = [tuple(row[position] for position in positions) for row in rows]
+        # Соединение берется заново: после commit сессия его освобождает
+        self.db.connection().exec_driver_sql(self.sql, rows)
+
+
+class LeadImportService:
+    """Потоковый импорт лидов из CSV/NDJSON"""
+
+    @staticmethod
+    def import_leads(
+        db: Session,
+        stream: TextIO,
+        file_format: FileFormat,
+        errors: Optional[TextIO] = None,
+        on_progress: Optional[Callable[[int, int, int], None]] = None
+    ) -> schemas.LeadImportReport:
+        """
+        Разобрать файл построчно, проверить строки схемой LeadBase и записать пачками по
+        IMPORT_BATCH_SIZE через INSERT ... ON CONFLICT(external_id) DO UPDATE,
+        фиксируя транзакцию каждые IMPORT_COMMIT_EVERY строк. Ошибочные строки
+        пишутся в errors (CSV: line, external_id, error), в отчет попадают первые из них.
+        on_progress(processed, imported, failed) вызывается после каждой фиксации.
+        """
+        writer = _UpsertWriter(db)
+        error_writer = None
+        if errors is not None:
+            error_writer = csv.writer(errors, lineterminator="\n")
+            error_writer.writerow(ERROR_COLUMNS)
+
+        processed = imported = failed = uncommitted = 0
+        sample = []
+        pending: List[Tuple[int, dict]] = []
+
+        def report_error(line: int, row: Optional[dict], error: str) -> None:
+            nonlocal failed
+            failed += 1
+            external_id = row.get("external_id") if row else None
+            external_id = None if external_id is None else str(external_id)
+            if error_writer:
+                error_writer.writerow((line, external_id, error))
+            if len(sample) < ERROR_SAMPLE_SIZE:
+                sample.append(schemas.LeadImportError(line=line, external_id=external_id, error=error))
+
+        def validate(batch: List[Tuple[int, dict]]) -> List[schemas.LeadBase]:
+            values = [_lead_values(row) for _, row in batch]
+            try:
+                return _leads_adapter.validate_python(values)
+            except ValidationError:
+                pass
+            # В пачке есть ошибки: проверяем строки по одной, чтобы сохранить верные
+            leads = []
+            for (line, row), row_values in zip(batch, values):
+                try:
+                    leads.append(schemas.LeadBase.model_validate(row_values))
+                except ValidationError as validation_error:
+                    report_error(line, row, _format_validation_error(validation_error))
+            return leads
+
+        def flush() -> None:
+            nonlocal imported, uncommitted
+            if not pending:
+                return
+            leads = validate(pending)
+            pending.clear()
+            # Повтор external_id внутри пачки: побеждает последняя строка
+            unique = {lead.external_id: (lead.phone, lead.email) for lead in leads}
+            if unique:
+                writer.write(unique)
+                lead_filter.add_many(unique)
+            imported += len(leads)
+            uncommitted += len(leads)
+            if uncommitted >= settings.IMPORT_COMMIT_EVERY:
+                db.commit()
+                uncommitted = 0
+                if on_progress:
+                    on_progress(processed, imported, failed)
+
+        try:
+            for line, row, error in read_records(stream, file_format):
+                processed += 1
+                if error is not None:
+                    report_error(line, row, error)
+                    continue
+                pending.append((line, row))
+                if len(pending) >= settings.IMPORT_BATCH_SIZE:
+                    flush()
+
+            flush()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        if on_progress:
+            on_progress(processed, imported, failed)
+        return schemas.LeadImportReport(
+            processed=processed,
+            imported=imported,
+            failed=failed,
+            errors=sample
+        )
+
+
+def import_leads_file(
+    source: BinaryIO,
+    file_format: FileFormat,
+    error_path: Optional[str] = None,
+    on_progress: Optional[Callable[[int, int, int], None]] = None
+) -> schemas.LeadImportReport:
+    """Импорт лидов из бинарного потока (UTF-8) в отдельной сессии, ошибочные строки - в error_path"""
+    stream = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    errors = open(error_path, "w", encoding="utf-8", newline="") if error_path else None
+    db = SessionLocal()
+    report = None
+    try:
+        report = LeadImportService.import_leads(db, stream, file_format, errors, on_progress)
+    finally:
+        db.close()
+        stream.detach()
+        if errors:
+            errors.close()
+            # Файл без ошибок или от прерванного импорта не нужен
+            if report is None or not report.failed:
+                os.remove(error_path)
+
+    if error_path and report.failed:
+        report.error_file = error_path
+    return report
@@ -0,0 +1,293 @@
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, String, and_, create_engine, delete, event, func, insert, inspect, or_, select,
+    text, update
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, declarative_base
+from app import models, schemas
+from app.config import settings
+from app.database import SessionLocal, apply_sqlite_pragmas, run_blocking
+from app.metrics import Sample, registry
+from app.services import DistributionService
+
+logger = logging.getLogger(__name__)
+
+IN_CHUNK_SIZE = 500
+ERROR_MAX_LENGTH = 500
+
+# Очередь живет в отдельной БД, чтобы прием не ждал блокировку записи основной БД
+QueueBase = declarative_base()
+
+
+class IngestQueueItem(QueueBase):
+    """Обращение, принятое в очередь и еще не распределенное"""
+    __tablename__ = "ingest_queue"
+    __table_args__ = (
+        Index("ix_ingest_queue_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    ticket = Column(String(32), nullable=False, unique=True)
+    external_id = Column(String, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    phone = Column(String, nullable=True)
+    email = Column(String, nullable=True)
+    status = Column(String, nullable=False, default=schemas.IngestStatus.QUEUED.value)
+    claimed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class IngestQueue:
+    """Долговременная локальная очередь приема обращений (outbox в SQLite)"""
+
+    def __init__(self, url: str):
+        is_sqlite = url.startswith("sqlite")
+        self.engine = create_engine(
+            url, connect_args={"check_same_thread": False} if is_sqlite else {}
+        )
+        if is_sqlite:
+            event.listen(self.engine, "connect", apply_sqlite_pragmas)
+        self.table = IngestQueueItem.__table__
+        self._insert = insert(self.table)
+
+    def init(self) -> None:
+        QueueBase.metadata.create_all(bind=self.engine)
+        # Очередь, созданная до появления счетчика попыток
+        columns = {column["name"] for column in inspect(self.engine).get_columns(self.table.name)}
+        if "attempts" not in columns:
+            with self.engine.begin() as connection:
+                connection.execute(text("ALTER TABLE ingest_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"))
+
+    def put(self, contact: schemas.ContactCreate) -> str:
+        """Добавить обращение в очередь и вернуть номер квитанции"""
+        ticket = uuid.uuid4().hex
+        # Готовый INSERT с параметрами-словарем: без построения выражения на каждый прием
+        with self.engine.begin() as connection:
+            connection.execute(self._insert, {
+                "ticket": ticket,
+                "external_id": contact.external_id,
+                "source_id": contact.source_id,
+                "phone": contact.phone,
+                "email": contact.email,
+                "status": schemas.IngestStatus.QUEUED.value,
+                "created_at": datetime.utcnow()
+            })
+        return ticket
+
+    def claim(self, limit: int, lease_seconds: float) -> List[Row]:
+        """
+        Забрать до limit первых обращений одним UPDATE ... RETURNING, увеличив их счетчик попыток.
+        Обращения, захваченные давно (процесс упал), забираются повторно.
+        """
+        table = self.table
+        now = datetime.utcnow()
+        claimable = select(table.c.id).where(or_(
+            table.c.status == schemas.IngestStatus.QUEUED.value,
+            and_(
+                table.c.status == schemas.IngestStatus.PROCESSING.value,
+                table.c.claimed_at < now - timedelta(seconds=lease_seconds)
+            )
+        )).order_by(table.c.id).limit(limit)
+
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                update(table).where(table.c.id.in_(claimable.scalar_subquery())).values(
+                    status=schemas.IngestStatus.PROCESSING.value,
+                    claimed_at=now,
+                    attempts=table.c.attempts + 1
+                ).returning(
+                    table.c.id, table.c.ticket, table.c.external_id,
+                    table.c.source_id, table.c.phone, table.c.email, table.c.attempts
+                )
+            ).all()
+        return sorted(rows, key=lambda row: row.id)
+
+    def release(self, ids: List[int]) -> None:
+        """Вернуть обращения в очередь для следующей попытки"""
+        with self.engine.begin() as connection:
+            for start in range(0, len(ids), IN_CHUNK_SIZE):
+                connection.execute(
+                    update(self.table).where(self.table.c.id.in_(ids[start:start + IN_CHUNK_SIZE])).values(
+                        status=schemas.IngestStatus.QUEUED.value,
+                        claimed_at=None
+                    )
+                )
+
+    def remove(self, ids: List[int]) -> None:
+        with self.engine.begin() as connection:
+            for start in range(0, len(ids), IN_CHUNK_SIZE):
+                connection.execute(
+                    delete(self.table).where(self.table.c.id.in_(ids[start:start + IN_CHUNK_SIZE]))
+                )
+
+    def status(self, ticket: str) -> Optional[str]:
+        with self.engine.connect() as connection:
+            return connection.scalar(select(self.table.c.status).where(self.table.c.ticket == ticket))
+
+    def depth(self) -> dict:
+        with self.engine.connect() as connection:
+            return dict(connection.execute(
+                select(self.table.c.status, func.count()).group_by(self.table.c.status)
+            ).all())
+
+
+ingest_queue = IngestQueue(settings.INGEST_QUEUE_URL)
+
+
+def _existing_receipts(db: Session, tickets: List[str]) -> set:
+    found = set()
+    for start in range(0, len(tickets), IN_CHUNK_SIZE):
+        found.update(db.scalars(
+            select(models.IngestReceipt.ticket).where(
+                models.IngestReceipt.ticket.in_(tickets[start:start + IN_CHUNK_SIZE])
+            )
+        ))
+    return found
+
+
+def _distribute(db: Session, rows: List[Row]) -> None:
+    """Распределить обращения очереди и записать квитанции в той же транзакции"""
+    # Данные проверены схемой при приеме
+    items = [
+        schemas.ContactCreate.model_construct(
+            external_id=row.external_id,
+            source_id=row.source_id,
+            phone=row.phone,
+            email=row.email
+        )
+        for row in rows
+    ]
+
+    def write_receipts(results: List[schemas.ContactBatchItemResult]) -> None:
+        created_at = datetime.utcnow()
+        db.execute(insert(models.IngestReceipt), [
+            {
+                "ticket": row.ticket,
+                "contact_id": result.contact_id,
+                "operator_id": result.operator_id,
+                "error": result.error,
+                "created_at": created_at
+            }
+            for row, result in zip(rows, results)
+        ])
+
+    DistributionService.distribute_batch(db, items, on_results=write_receipts)
+
+
+def _write_failures(db: Session, failures: List[Tuple[Row, str]]) -> None:
+    """Квитанции failed для обращений, исчерпавших попытки"""
+    if not failures:
+        return
+    created_at = datetime.utcnow()
+    db.execute(insert(models.IngestReceipt), [
+        {"ticket": row.ticket, "error": error[:ERROR_MAX_LENGTH], "created_at": created_at}
+        for row, error in failures
+    ])
+    db.commit()
+
+
+def drain_ingest_queue() -> bool:
+    """
+    Распределить очередную пачку из очереди через DistributionService.distribute_batch.
+    Квитанции пишутся в транзакции распределения, поэтому повторно забранные
+    после сбоя обращения не создаются дважды. Если пачка падает целиком, обращения
+    распределяются по одному; сбойные возвращаются в очередь, а после
+    INGEST_MAX_ATTEMPTS попыток получают квитанцию failed.
+    Вернуть True, если пачка была полной.
+    """
+    rows = ingest_queue.claim(settings.INGEST_BATCH_SIZE, settings.INGEST_LEASE_SECONDS)
+    if not rows:
+        return False
+
+    max_attempts = settings.INGEST_MAX_ATTEMPTS
+    retry: List[Row] = []
+    db = SessionLocal()
+    try:
+        done = _existing_receipts(db, [row.ticket for row in rows])
+        # Предыдущая попытка не завершилась (процесс упал или завис), и она была последней
+        exhausted = [
+            (row, f"Processing did not complete in {max_attempts} attempts")
+            for row in rows if row.ticket not in done and row.attempts > max_attempts
+        ]
+        pending = [row for row in rows if row.ticket not in done and row.attempts <= max_attempts]
+
+        failures: List[Tuple[Row, Exception]] = []
+        if pending:
+            try:
+                _distribute(db, pending)
+            except Exception as error:
+                db.rollback()
+                if len(pending) == 1:
+                    failures.append((pending[0], error))
+                else:
+                    logger.warning("Ingest batch of %d contacts failed, distributing one by one", len(pending))
+                    for row in pending:
+                        try:
+                            _distribute(db, [row])
+                        except Exception as row_error:
+                            db.rollback()
+                            failures.append((row, row_error))
+
+        for row, error in failures:
+            logger.warning("Ingest ticket %s failed (attempt %d of %d): %r", row.ticket, row.attempts, max_attempts, error)
+        retry = [row for row, error in failures if row.attempts < max_attempts]
+        _write_failures(db, exhausted + [
+            (row, f"{type(error).__name__}: {error}") for row, error in failures if row.attempts >= max_attempts
+        ])
+    finally:
+        db.close()
+
+    retry_ids = {row.id for row in retry}
+    ingest_queue.release(sorted(retry_ids))
+    ingest_queue.remove([row.id for row in rows if row.id not in retry_ids])
+    return len(rows) == settings.INGEST_BATCH_SIZE
+
+
+def purge_ingest_receipts() -> int:
+    """Удалить квитанции старше INGEST_RECEIPT_TTL_HOURS"""
+    db = SessionLocal()
+    try:
+        result = db.execute(delete(models.IngestReceipt).where(
+            models.IngestReceipt.created_at < datetime.utcnow() - timedelta(hours=settings.INGEST_RECEIPT_TTL_HOURS)
+        ))
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def _receipt_ticket(receipt: models.IngestReceipt) -> schemas.IngestTicket:
+    return schemas.IngestTicket(
+        ticket=receipt.ticket,
+        status=schemas.IngestStatus.FAILED if receipt.error else schemas.IngestStatus.DONE,
+        contact_id=receipt.contact_id,
+        operator_id=receipt.operator_id,
+        error=receipt.error
+    )
+
+
+def ticket_status(db: Session, ticket: str) -> Optional[schemas.IngestTicket]:
+    """Статус квитанции: результат распределения или положение в очереди"""
+    receipt = db.get(models.IngestReceipt, ticket)
+    if receipt is not None:
+        return _receipt_ticket(receipt)
+
+    status = run_blocking(ingest_queue.status, ticket)
+    if status is None:
+        # Из очереди обращение удаляется после фиксации квитанции: перечитываем ее
+        receipt = db.get(models.IngestReceipt, ticket)
+        return _receipt_ticket(receipt) if receipt is not None else None
+    return schemas.IngestTicket(ticket=ticket, status=status)
+
+
+if settings.INGEST_QUEUE_ENABLED:
+    @registry.collector("crm_ingest_queue_depth", "Contacts waiting in the ingestion queue by status")
+    def ingest_queue_depth(db: Session) -> Iterable[Sample]:
+        depth = ingest_queue.depth()
+        for status in (schemas.IngestStatus.QUEUED, schemas.IngestStatus.PROCESSING):
+            yield {"status": status.value}, depth.get(status.value, 0)
@@ -0,0 +1,164 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, select
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+
+class LeadCache:
+    """Ограниченный LRU-кэш external_id -> lead_id"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, external_id: str) -> Optional[int]:
+        with self._lock:
+            lead_id = self._items.get(external_id)
+            if lead_id is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(external_id)
+            self.hits += 1
+            return lead_id
+
+    def put(self, external_id: str, lead_id: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[external_id] = lead_id
+            self._items.move_to_end(external_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def put_many(self, lead_ids: Dict[str, int]) -> None:
+        for external_id, lead_id in lead_ids.items():
+            self.put(external_id, lead_id)
+
+    def invalidate(self, external_id: str) -> None:
+        with self._lock:
+            self._items.pop(external_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class BloomFilter:
+    """Фильтр Блума: без ложноотрицательных ответов, с заданной долей ложноположительных"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> List[int]:
+        # Фильтр живет только в памяти процесса, поэтому подходит встроенный hash (SipHash):
+        # две 32-битные половины дают k позиций двойным хешированием
+        digest = hash(key) & 0xFFFFFFFFFFFFFFFF
+        first = digest & 0xFFFFFFFF
+        second = (digest >> 32) | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> None:
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class LeadFilter:
+    """Фильтр известных external_id: новые ID можно вставлять без поиска в БД"""
+
+    def __init__(self):
+        self._bloom: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self.skipped_lookups = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._bloom is not None
+
+    def load(self, external_ids: Iterable[str], expected: int) -> None:
+        bloom = BloomFilter(
+            capacity=max(settings.LEAD_FILTER_CAPACITY, expected * 2),
+            error_rate=settings.LEAD_FILTER_ERROR_RATE
+        )
+        for external_id in external_ids:
+            bloom.add(external_id)
+        with self._lock:
+            self._bloom = bloom
+
+    def add(self, external_id: str) -> None:
+        bloom = self._bloom
+        if bloom is not None:
+            with self._lock:
+                bloom.add(external_id)
+
+    def add_many(self, external_ids: Iterable[str]) -> None:
+        bloom = self._bloom
+        if bloom is not None:
+            with self._lock:
+                for external_id in external_ids:
+                    bloom.add(external_id)
+
+    def might_exist(self, external_id: str) -> bool:
+        """False - лида с таким external_id точно нет (если фильтр загружен)"""
+        bloom = self._bloom
+        if bloom is None or external_id in bloom:
+            return True
+        self.skipped_lookups += 1
+        return False
+
+    def stats(self) -> dict:
+        bloom = self._bloom
+        return {
+            "loaded": bloom is not None,
+            "size_bits": bloom.size if bloom else 0,
+            "hash_count": bloom.hash_count if bloom else 0,
+            "skipped_lookups": self.skipped_lookups,
+        }
+
+
+lead_cache = LeadCache(settings.LEAD_CACHE_SIZE)
+lead_filter = LeadFilter()
+
+
+def preload_lead_filter() -> None:
+    """Загрузить фильтр известных external_id из таблицы лидов"""
+    if settings.LEAD_FILTER_CAPACITY <= 0:
+        return
+    db = SessionLocal()
+    try:
+        expected = db.query(func.count(models.Lead.id)).scalar()
+        external_ids = db.execute(
+            select(models.Lead.external_id).execution_options(yield_per=10000)
+        ).scalars()
+        lead_filter.load((external_id for external_id in external_ids if external_id), expected)
+    finally:
+        db.close()
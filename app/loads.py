@@ -0,0 +1,97 @@
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app import models
+from app.database import SessionLocal
+
+
+class OperatorLoadTracker:
+    """Счетчики текущей нагрузки операторов в памяти процесса"""
+
+    def __init__(self):
+        self._loads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    @property
+    def seeded(self) -> bool:
+        return self._seeded
+
+    def reconcile(self, db: Session) -> Dict[int, int]:
+        """Загрузить нагрузку всех операторов из БД одним запросом"""
+        rows = db.query(models.Operator.id, models.Operator.active_load).all()
+
+        loads = {operator_id: active_load for operator_id, active_load in rows}
+        with self._lock:
+            self._loads = loads
+            self._seeded = True
+        return dict(loads)
+
+    def refresh(self, db: Session, operator_ids: List[int]) -> None:
+        """Обновить нагрузку выбранных операторов из БД"""
+        rows = db.query(models.Operator.id, models.Operator.active_load).filter(
+            models.Operator.id.in_(operator_ids)
+        ).all()
+        with self._lock:
+            for operator_id, active_load in rows:
+                self._loads[operator_id] = active_load
+
+    def ensure_seeded(self, db: Session) -> None:
+        if not self._seeded:
+            self.reconcile(db)
+
+    def get(self, operator_id: int) -> int:
+        return self._loads.get(operator_id, 0)
+
+    def snapshot(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._loads)
+
+    def increment(self, operator_id: Optional[int], amount: int = 1) -> None:
+        if operator_id is None:
+            return
+        with self._lock:
+            self._loads[operator_id] = self._loads.get(operator_id, 0) + amount
+
+    def decrement(self, operator_id: Optional[int], amount: int = 1) -> None:
+        if operator_id is None:
+            return
+        with self._lock:
+            self._loads[operator_id] = max(self._loads.get(operator_id, 0) - amount, 0)
+
+    def mark_full(self, operator_id: int, max_load: int) -> None:
+        with self._lock:
+            self._loads[operator_id] = max(self._loads.get(operator_id, 0), max_load)
+
+    def forget(self, operator_id: int) -> None:
+        with self._lock:
+            self._loads.pop(operator_id, None)
+
+
+load_tracker = OperatorLoadTracker()
+
+
+def reconcile_operator_loads() -> Dict[int, int]:
+    """Сверить счетчики нагрузки с БД в отдельной сессии"""
+    db = SessionLocal()
+    try:
+        return load_tracker.reconcile(db)
+    finally:
+        db.close()
+
+
+def recount_operator_loads(db: Session) -> Dict[int, int]:
+    """Пересчитать сохраненную нагрузку операторов по активным обращениям"""
+    active_contacts = select(func.count(models.Contact.id)).where(
+        models.Contact.operator_id == models.Operator.id,
+        models.Contact.status == "active"
+    ).scalar_subquery()
+
+    db.execute(
+        update(models.Operator).values(active_load=active_contacts).execution_options(
+            synchronize_session=False
+        )
+    )
+    db.commit()
+    return load_tracker.reconcile(db)
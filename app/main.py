@@ -1,6 +1,19 @@
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from app.database import init_db
+from fastapi import Depends, FastAPI
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from app.database import async_engine, engine, get_db, init_db
+from app.archive import archive_closed_contacts
+from app.backlog import backlog_scheduler, drain_backlog
+from app.counters import compact_contact_rollups
+from app.ingest import drain_ingest_queue, ingest_queue, purge_ingest_receipts
+from app.lead_cache import preload_lead_filter
+from app.loads import reconcile_operator_loads
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, instrument_engine, registry
+from app import profiling
+from app.replicas import ReadYourWritesMiddleware, read_replicas
+from app.tasks import run_periodically, run_until_idle
 from app.routers import operators, sources, contacts, leads, stats
 from app.config import settings
 
@@ -9,8 +22,53 @@ from app.config import settings
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
     init_db()
+    reconcile_operator_loads()
+    preload_lead_filter()
+
+    background_tasks = []
+    if settings.LOAD_RECONCILE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(settings.LOAD_RECONCILE_INTERVAL, reconcile_operator_loads)
+        ))
+    if settings.STATS_COMPACT_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(settings.STATS_COMPACT_INTERVAL, compact_contact_rollups)
+        ))
+    if settings.ARCHIVE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(settings.ARCHIVE_INTERVAL, archive_closed_contacts)
+        ))
+    if settings.BACKLOG_ENABLED:
+        backlog_scheduler.request_sweep()
+        background_tasks.append(asyncio.create_task(
+            run_until_idle(settings.BACKLOG_POLL_INTERVAL, drain_backlog)
+        ))
+        if settings.BACKLOG_SWEEP_INTERVAL > 0:
+            background_tasks.append(asyncio.create_task(
+                run_periodically(settings.BACKLOG_SWEEP_INTERVAL, backlog_scheduler.request_sweep)
+            ))
+    if read_replicas and settings.READ_REPLICA_CHECK_INTERVAL > 0:
+        read_replicas.check()
+        background_tasks.append(asyncio.create_task(
+            run_periodically(settings.READ_REPLICA_CHECK_INTERVAL, read_replicas.check)
+        ))
+    if settings.INGEST_QUEUE_ENABLED:
+        ingest_queue.init()
+        background_tasks.append(asyncio.create_task(
+            run_until_idle(settings.INGEST_POLL_INTERVAL, drain_ingest_queue)
+        ))
+        background_tasks.append(asyncio.create_task(
+            run_periodically(settings.INGEST_PURGE_INTERVAL, purge_ingest_receipts)
+        ))
+
     yield
 
+    for task in background_tasks:
+        task.cancel()
+    if async_engine is not None:
+        await async_engine.dispose()
+    await read_replicas.dispose()
+
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -20,6 +78,26 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Синхронные и асинхронные движки основной БД и реплик
+engines = [engine] + read_replicas.engines + [
+    item.sync_engine for item in [async_engine] + read_replicas.async_engines if item is not None
+]
+
+if read_replicas and settings.READ_YOUR_WRITES_SECONDS > 0:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    for item in engines:
+        instrument_engine(item)
+
+if settings.SQL_PROFILING:
+    # Добавляется последним, поэтому оборачивает метрики и видит все запросы
+    app.add_middleware(profiling.SQLProfilingMiddleware)
+    profiling.configure_slow_log()
+    for item in engines:
+        profiling.instrument_engine(item)
+
 app.include_router(operators.router, prefix=settings.API_V1_PREFIX)
 app.include_router(sources.router, prefix=settings.API_V1_PREFIX)
 app.include_router(contacts.router, prefix=settings.API_V1_PREFIX)
@@ -36,3 +114,10 @@ def root():
         "api_prefix": settings.API_V1_PREFIX if settings.API_V1_PREFIX else "нет префикса",
         "api_endpoints": f"{settings.API_V1_PREFIX}/operators/" if settings.API_V1_PREFIX else "/operators/"
     }
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics(db: Session = Depends(get_db)):
+        """Метрики в текстовом формате Prometheus"""
+        return Response(registry.render(db), media_type=CONTENT_TYPE)
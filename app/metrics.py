@@ -0,0 +1,340 @@
+import functools
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import models
+from app.lead_cache import lead_cache, lead_filter
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STEP_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# (метки, значение) для метрик, вычисляемых при опросе
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(ABC):
+    """Метрика с фиксированным набором меток; значения хранятся по кортежу значений меток"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def _labels(self, values: tuple) -> Dict[str, str]:
+        return dict(zip(self.label_names, values))
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    @abstractmethod
+    def render(self, db: Session = None) -> List[str]:
+        """Строки метрики в текстовом формате Prometheus"""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self, db: Session = None) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными границами: наблюдение - бинарный поиск и инкремент под блокировкой"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        # По каждому набору меток: счетчики корзин (последняя - +Inf), сумма
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *label_values) -> Callable:
+        """Декоратор: наблюдать длительность вызова функции"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *label_values)
+            return wrapper
+        return decorator
+
+    def render(self, db: Session = None) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(dict(labels, le=_format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Collector(Metric):
+    """Метрика, значения которой вычисляются в момент опроса"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        collect: Callable[[Session], Iterable[Sample]]
+    ):
+        super().__init__(name, documentation)
+        self.type = metric_type
+        self.collect = collect
+
+    def render(self, db: Session = None) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in self.collect(db)
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def collector(self, name: str, documentation: str, metric_type: str = "gauge") -> Callable:
+        """Декоратор функции (db) -> [(метки, значение)], вызываемой при каждом опросе"""
+        def decorator(collect):
+            self._register(Collector(name, documentation, metric_type, collect))
+            return collect
+        return decorator
+
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, db: Session) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(db))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "crm_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "crm_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+db_queries_per_request = registry.histogram(
+    "crm_db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS
+)
+db_time_per_request = registry.histogram(
+    "crm_db_time_per_request_seconds", "Time spent in SQL statements per HTTP request", ("route",)
+)
+db_queries = registry.counter("crm_db_queries_total", "SQL statements executed")
+db_read_sessions = registry.counter(
+    "crm_db_read_sessions_total", "Read-only sessions by database (replica or primary fallback)", ("target",)
+)
+db_query_time = registry.counter("crm_db_query_seconds_total", "Time spent in SQL statements")
+
+distribution_contacts = registry.counter(
+    "crm_distribution_contacts_total", "Distributed contacts by source and outcome", ("source_id", "outcome")
+)
+distribution_candidates = registry.histogram(
+    "crm_distribution_candidates", "Operators with free capacity when a contact is assigned", (), COUNT_BUCKETS
+)
+distribution_step_duration = registry.histogram(
+    "crm_distribution_step_duration_seconds", "Time spent in distribution steps", ("step",), STEP_BUCKETS
+)
+
+backlog_assigned = registry.counter(
+    "crm_backlog_assigned_total", "Backlog contacts assigned once capacity appeared", ("source_id",)
+)
+archived_contacts = registry.counter(
+    "crm_archived_contacts_total", "Closed contacts moved to the archive table"
+)
+
+
+@registry.collector("crm_operator_utilization_ratio", "Active contacts of an operator relative to max_load")
+def operator_utilization(db: Session) -> Iterable[Sample]:
+    rows = db.execute(
+        select(models.Operator.id, models.Operator.active_load, models.Operator.max_load).where(
+            models.Operator.is_active == True
+        ).order_by(models.Operator.id)
+    )
+    for operator_id, active_load, max_load in rows:
+        yield {"operator_id": operator_id}, active_load / max_load if max_load else 0.0
+
+
+@registry.collector("crm_lead_cache_entries", "Leads in the process LRU cache")
+def lead_cache_entries(db: Session) -> Iterable[Sample]:
+    yield {}, lead_cache.stats()["size"]
+
+
+@registry.collector("crm_lead_cache_lookups_total", "Lead cache lookups by result", "counter")
+def lead_cache_lookups(db: Session) -> Iterable[Sample]:
+    stats = lead_cache.stats()
+    yield {"result": "hit"}, stats["hits"]
+    yield {"result": "miss"}, stats["misses"]
+
+
+@registry.collector("crm_lead_cache_evictions_total", "Leads evicted from the LRU cache", "counter")
+def lead_cache_evictions(db: Session) -> Iterable[Sample]:
+    yield {}, lead_cache.stats()["evictions"]
+
+
+@registry.collector(
+    "crm_lead_filter_skipped_lookups_total", "Lead lookups skipped because the filter knows the id is new", "counter"
+)
+def lead_filter_skipped_lookups(db: Session) -> Iterable[Sample]:
+    yield {}, lead_filter.stats()["skipped_lookups"]
+
+
+def record_distribution(source_id: int, assigned: bool, amount: int = 1) -> None:
+    """Учесть зафиксированные обращения источника: с оператором или без"""
+    distribution_contacts.inc(str(source_id), "assigned" if assigned else "unassigned", amount=amount)
+
+
+class RequestQueries:
+    """Число и длительность SQL-запросов текущего HTTP-запроса"""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Контекст переходит в пул потоков и в run_sync асинхронной сессии
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    db_queries.inc()
+    db_query_time.inc(amount=elapsed)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.duration += elapsed
+
+
+def instrument_engine(engine) -> None:
+    """Учитывать SQL-запросы движка (для асинхронного - его sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: задержка и SQL-запросы по шаблону маршрута (а не по конкретному URL)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            route = scope.get("route")
+            # Несуществующие пути не раздувают число рядов
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route_path, str(status))
+            http_request_duration.observe(elapsed, method, route_path)
+            db_queries_per_request.observe(queries.count, route_path)
+            db_time_per_request.observe(queries.duration, route_path)
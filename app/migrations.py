@@ -0,0 +1,128 @@
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app import models
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _add_operator_active_load(connection: Connection) -> None:
+    """Сохраняемая нагрузка операторов"""
+    columns = {column["name"] for column in inspect(connection).get_columns("operators")}
+    if "active_load" in columns:
+        return
+
+    connection.execute(text(
+        "ALTER TABLE operators ADD COLUMN active_load INTEGER NOT NULL DEFAULT 0"
+    ))
+    connection.execute(text(
+        "UPDATE operators SET active_load = ("
+        "SELECT COUNT(*) FROM contacts "
+        "WHERE contacts.operator_id = operators.id AND contacts.status = 'active')"
+    ))
+
+
+def _create_distribution_indexes(connection: Connection) -> None:
+    """Индексы для распределения, выборок и статистики"""
+    # Перед уникальным индексом оставляем последний вес для каждой пары источник/оператор
+    connection.execute(text(
+        "DELETE FROM source_operator_weights WHERE id NOT IN ("
+        "SELECT MAX(id) FROM source_operator_weights GROUP BY source_id, operator_id)"
+    ))
+    for table in (models.SourceOperatorWeight.__table__, models.Contact.__table__):
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _create_contact_counters(connection: Connection) -> None:
+    """Счетчики обращений для статистики (заполняются вместе с агрегатами в миграции 4)"""
+    models.ContactCounter.__table__.create(bind=connection, checkfirst=True)
+
+
+def _fill_contact_counters(connection: Connection) -> None:
+    """Агрегаты обращений для статистики; счетчики и агрегаты пересобираются одним проходом"""
+    from app.counters import ContactCounterService
+
+    for model in (models.ContactCounter, models.ContactRollupHourly, models.ContactRollupDaily):
+        model.__table__.create(bind=connection, checkfirst=True)
+    with Session(bind=connection) as db:
+        ContactCounterService.rebuild(db)
+
+
+def _create_config_version(connection: Connection) -> None:
+    """Версия конфигурации для условного кэширования"""
+    table = models.ConfigVersion.__table__
+    table.create(bind=connection, checkfirst=True)
+    if connection.execute(table.select().where(table.c.id == 1)).first() is None:
+        connection.execute(table.insert().values(id=1, version=1))
+
+
+def _create_ingest_receipts(connection: Connection) -> None:
+    """Квитанции очереди приема обращений"""
+    models.IngestReceipt.__table__.create(bind=connection, checkfirst=True)
+
+
+def _create_backlog_index(connection: Connection) -> None:
+    """Индекс очереди нераспределенных обращений вместо индекса по всем обращениям без оператора"""
+    connection.execute(text("DROP INDEX IF EXISTS ix_contacts_unassigned"))
+    for index in models.Contact.__table__.indexes:
+        if index.name == "ix_contacts_backlog":
+            index.create(bind=connection, checkfirst=True)
+
+
+def _create_contacts_archive(connection: Connection) -> None:
+    """Архив закрытых обращений и индекс для отбора кандидатов в него"""
+    models.ContactArchive.__table__.create(bind=connection, checkfirst=True)
+    for index in models.Contact.__table__.indexes:
+        if index.name == "ix_contacts_closed_created_at":
+            index.create(bind=connection, checkfirst=True)
+
+
+def _create_contacts_archive_indexes(connection: Connection) -> None:
+    """Индексы фильтров выгрузки в архиве обращений"""
+    for index in models.ContactArchive.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "operators.active_load", _add_operator_active_load),
+    Migration(2, "distribution indexes", _create_distribution_indexes),
+    Migration(3, "contact counters", _create_contact_counters),
+    Migration(4, "contact rollups", _fill_contact_counters),
+    Migration(5, "config version", _create_config_version),
+    Migration(6, "ingest receipts", _create_ingest_receipts),
+    Migration(7, "contacts backlog index", _create_backlog_index),
+    Migration(8, "contacts archive", _create_contacts_archive),
+    Migration(9, "contacts archive indexes", _create_contacts_archive_indexes),
+]
+
+
+def apply_migrations(engine: Engine) -> List[int]:
+    """Применить недостающие миграции по порядку, вернуть примененные версии"""
+    migrations_table = models.SchemaMigration.__table__
+    with engine.begin() as connection:
+        migrations_table.create(bind=connection, checkfirst=True)
+        applied = set(connection.execute(migrations_table.select().with_only_columns(
+            migrations_table.c.version
+        )).scalars())
+
+    applied_now = []
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(migrations_table.insert().values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.utcnow()
+            ))
+        applied_now.append(migration.version)
+
+    return applied_now
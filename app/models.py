@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -12,18 +12,12 @@ class Operator(Base):
     name = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     max_load = Column(Integer, default=10)
+    active_load = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     contacts = relationship("Contact", back_populates="operator")
     source_weights = relationship("SourceOperatorWeight", back_populates="operator", cascade="all, delete-orphan")
 
-    def get_current_load(self, db):
-        from app.models import Contact
-        return db.query(Contact).filter(
-            Contact.operator_id == self.id,
-            Contact.status == "active"
-        ).count()
-
 
 class Source(Base):
     """Источник"""
@@ -40,6 +34,10 @@ class Source(Base):
 class SourceOperatorWeight(Base):
     """Вес оператора для конкретного источника"""
     __tablename__ = "source_operator_weights"
+    __table_args__ = (
+        Index("ux_source_operator_weights_source_operator", "source_id", "operator_id", unique=True),
+        Index("ix_source_operator_weights_operator_id", "operator_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     source_id = Column(Integer, ForeignKey("sources.id"), nullable=False)
@@ -66,6 +64,25 @@ class Lead(Base):
 class Contact(Base):
     """Обращение"""
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_lead_id", "lead_id"),
+        Index("ix_contacts_source_id", "source_id"),
+        Index("ix_contacts_operator_id", "operator_id"),
+        Index("ix_contacts_operator_status", "operator_id", "status"),
+        # Очередь нераспределенных активных обращений (FIFO по id внутри источника);
+        # operator_id в ключе дает планировщику SQLite второе условие и выбор этого индекса
+        Index(
+            "ix_contacts_backlog", "source_id", "operator_id", "id",
+            sqlite_where=text("operator_id IS NULL AND status = 'active'"),
+            postgresql_where=text("operator_id IS NULL AND status = 'active'")
+        ),
+        # Кандидаты на перенос в архив: закрытые обращения по времени создания
+        Index(
+            "ix_contacts_closed_created_at", "created_at",
+            sqlite_where=text("status = 'closed'"),
+            postgresql_where=text("status = 'closed'")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     lead_id = Column(Integer, ForeignKey("leads.id"), nullable=False)
@@ -77,3 +94,101 @@ class Contact(Base):
     lead = relationship("Lead", back_populates="contacts")
     source = relationship("Source", back_populates="contacts")
     operator = relationship("Operator", back_populates="contacts")
+
+
+class ContactArchive(Base):
+    """Закрытое обращение, перенесенное из contacts по сроку хранения (id сохраняется)"""
+    __tablename__ = "contacts_archive"
+    __table_args__ = (
+        Index("ix_contacts_archive_lead_id", "lead_id"),
+        # Фильтры выгрузки, как у contacts; в архиве только закрытые обращения, поэтому индекс по created_at полный
+        Index("ix_contacts_archive_source_id", "source_id"),
+        Index("ix_contacts_archive_operator_id", "operator_id"),
+        Index("ix_contacts_archive_created_at", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    lead_id = Column(Integer, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    operator_id = Column(Integer, nullable=True)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ContactCounter(Base):
+    """Счетчик обращений по источнику, оператору (0 - без оператора) и статусу"""
+    __tablename__ = "contact_counters"
+    __table_args__ = (
+        Index("ux_contact_counters_key", "source_id", "operator_id", "status", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    source_id = Column(Integer, nullable=False)
+    operator_id = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ContactRollupHourly(Base):
+    """Число обращений за час (по времени создания) в разрезе источника, оператора и статуса"""
+    __tablename__ = "contact_rollups_hourly"
+    __table_args__ = (
+        Index(
+            "ux_contact_rollups_hourly_key",
+            "bucket_start", "source_id", "operator_id", "status", unique=True
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    operator_id = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ContactRollupDaily(Base):
+    """Число обращений за сутки, собирается из часовых агрегатов"""
+    __tablename__ = "contact_rollups_daily"
+    __table_args__ = (
+        Index(
+            "ux_contact_rollups_daily_key",
+            "bucket_start", "source_id", "operator_id", "status", unique=True
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    operator_id = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class SchemaMigration(Base):
+    """Примененная миграция схемы БД"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ConfigVersion(Base):
+    """Версия конфигурации распределения (источники, веса, операторы)"""
+    __tablename__ = "config_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
+
+class IngestReceipt(Base):
+    """Результат распределения обращения, принятого через очередь (по номеру квитанции)"""
+    __tablename__ = "ingest_receipts"
+
+    ticket = Column(String(32), primary_key=True)
+    contact_id = Column(Integer, nullable=True)
+    operator_id = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
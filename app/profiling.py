@@ -0,0 +1,126 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from app.config import settings
+
+slow_logger = logging.getLogger("app.profiling.slow")
+
+
+class RequestProfile:
+    """SQL-запросы одного HTTP-запроса: текст и длительность в мс"""
+
+    __slots__ = ("statements", "total_ms")
+
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = []
+        self.total_ms = 0.0
+
+    def add(self, statement: str, duration_ms: float) -> None:
+        self.statements.append((statement, duration_ms))
+        self.total_ms += duration_ms
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, повторенные больше threshold раз (признак N+1)"""
+        counts = Counter(statement for statement, _ in self.statements)
+        return [(statement, count) for statement, count in counts.most_common() if count > threshold]
+
+    def header(self, threshold: int) -> str:
+        return (
+            f"queries={len(self.statements)}; db_ms={self.total_ms:.2f}; "
+            f"n_plus_one={len(self.repeated(threshold))}"
+        )
+
+
+# Контекст переходит в пул потоков и в run_sync асинхронной сессии
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(statement, (time.perf_counter() - context._profile_started) * 1000)
+
+
+def instrument_engine(engine) -> None:
+    """Записывать SQL-запросы движка в профиль текущего HTTP-запроса"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def configure_slow_log() -> None:
+    """Писать медленные запросы в файл SQL_SLOW_LOG_FILE (одна JSON-запись на строку)"""
+    if not settings.SQL_SLOW_LOG_FILE:
+        return
+    handler = logging.FileHandler(settings.SQL_SLOW_LOG_FILE, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_logger.addHandler(handler)
+    slow_logger.setLevel(logging.INFO)
+    slow_logger.propagate = False
+
+
+def _log(event_name: str, **fields) -> None:
+    slow_logger.warning(json.dumps(dict(event=event_name, **fields), ensure_ascii=False))
+
+
+class SQLProfilingMiddleware:
+    """
+    ASGI middleware: заголовок со сводкой SQL-запросов запроса, журнал медленных
+    запросов и предупреждения о повторах одного запроса (N+1)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        header_name = settings.SQL_PROFILE_HEADER.lower().encode()
+
+        async def send_wrapper(message):
+            # У потоковых ответов заголовок отражает запросы до начала передачи тела
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (header_name, profile.header(settings.SQL_N_PLUS_ONE_THRESHOLD).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile.reset(token)
+            self._report(scope, profile)
+
+    @staticmethod
+    def _report(scope, profile: RequestProfile) -> None:
+        route = getattr(scope.get("route"), "path", scope["path"])
+        method = scope["method"]
+        for statement, duration_ms in profile.statements:
+            if duration_ms >= settings.SQL_SLOW_QUERY_MS:
+                _log(
+                    "slow_query",
+                    method=method,
+                    route=route,
+                    duration_ms=round(duration_ms, 3),
+                    statement=statement
+                )
+        for statement, count in profile.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD):
+            _log(
+                "n_plus_one",
+                method=method,
+                route=route,
+                count=count,
+                total_queries=len(profile.statements),
+                statement=statement
+            )
@@ -0,0 +1,118 @@
+from datetime import datetime, timezone
+from typing import Optional, Sequence, Tuple
+from sqlalchemy.orm import Query, Session
+from app import models
+
+CONTACT_FIELDS = ("id", "lead_id", "source_id", "operator_id", "status", "created_at")
+CONTACT_EXPANSIONS = ("lead", "source", "operator")
+
+LEAD_FIELDS = ("id", "external_id", "phone", "email", "created_at")
+
+OPERATOR_COLUMNS = {
+    "id": models.Operator.id,
+    "name": models.Operator.name,
+    "is_active": models.Operator.is_active,
+    "max_load": models.Operator.max_load,
+    "created_at": models.Operator.created_at,
+    "current_load": models.Operator.active_load,
+}
+
+_EXPANSION_COLUMNS = {
+    "lead": (
+        models.Lead.external_id.label("lead_external_id"),
+        models.Lead.phone.label("lead_phone"),
+        models.Lead.email.label("lead_email"),
+        models.Lead.created_at.label("lead_created_at"),
+    ),
+    "source": (
+        models.Source.name.label("source_name"),
+        models.Source.created_at.label("source_created_at"),
+    ),
+    "operator": (
+        models.Operator.name.label("operator_name"),
+        models.Operator.is_active.label("operator_is_active"),
+        models.Operator.max_load.label("operator_max_load"),
+        models.Operator.active_load.label("operator_active_load"),
+        models.Operator.created_at.label("operator_created_at"),
+    ),
+}
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Время в UTC без часового пояса, как оно хранится в БД"""
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def contact_rows_query(db: Session, expand: Sequence[str] = CONTACT_EXPANSIONS, model=models.Contact) -> Query:
+    """
+    Обращения вместе с лидом, источником и оператором одним запросом (JOIN только для expand).
+    model=models.ContactArchive - те же строки из архива закрытых обращений.
+    """
+    columns = [getattr(model, name) for name in CONTACT_FIELDS]
+    for name in CONTACT_EXPANSIONS:
+        if name in expand:
+            columns.extend(_EXPANSION_COLUMNS[name])
+
+    query = db.query(*columns)
+    if "lead" in expand:
+        query = query.join(models.Lead, models.Lead.id == model.lead_id)
+    if "source" in expand:
+        query = query.join(models.Source, models.Source.id == model.source_id)
+    if "operator" in expand:
+        query = query.outerjoin(models.Operator, models.Operator.id == model.operator_id)
+    return query
+
+
+def contact_row_to_dict(
+    row,
+    fields: Optional[Tuple[str, ...]] = None,
+    expand: Sequence[str] = CONTACT_EXPANSIONS
+) -> dict:
+    """Собрать ответ ContactResponse из строки contact_rows_query"""
+    item = {name: getattr(row, name) for name in (fields or CONTACT_FIELDS)}
+
+    if "lead" in expand:
+        item["lead"] = {
+            "id": row.lead_id,
+            "external_id": row.lead_external_id,
+            "phone": row.lead_phone,
+            "email": row.lead_email,
+            "created_at": row.lead_created_at
+        }
+    if "source" in expand:
+        item["source"] = {
+            "id": row.source_id,
+            "name": row.source_name,
+            "created_at": row.source_created_at
+        }
+    if "operator" in expand:
+        operator = None
+        if row.operator_name is not None:
+            operator = {
+                "id": row.operator_id,
+                "name": row.operator_name,
+                "is_active": row.operator_is_active,
+                "max_load": row.operator_max_load,
+                "created_at": row.operator_created_at,
+                "current_load": row.operator_active_load
+            }
+        item["operator"] = operator
+    return item
+
+
+def lead_rows_query(db: Session, fields: Optional[Tuple[str, ...]] = None) -> Query:
+    """Лиды с выборкой только запрошенных колонок (id нужен для курсора)"""
+    names = ("id",) + tuple(name for name in (fields or LEAD_FIELDS) if name != "id")
+    return db.query(*(getattr(models.Lead, name) for name in names))
+
+
+def operator_rows_query(db: Session, fields: Optional[Tuple[str, ...]] = None) -> Query:
+    """Операторы с выборкой только запрошенных колонок, нагрузка - из active_load"""
+    names = ("id",) + tuple(name for name in (fields or OPERATOR_COLUMNS) if name != "id")
+    return db.query(*(OPERATOR_COLUMNS[name].label(name) for name in names))
+
+
+def row_to_dict(row, fields: Sequence[str]) -> dict:
+    return {name: getattr(row, name) for name in fields}
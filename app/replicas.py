@@ -0,0 +1,257 @@
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.database import (
+    ASYNC_DEPENDENCIES, AsyncSessionLocal, SessionLocal, get_async_database_url, pool_args, sqlite_pragmas
+)
+from app.metrics import Sample, db_read_sessions, registry
+
+logger = logging.getLogger(__name__)
+
+READ_YOUR_WRITES_COOKIE = "crm_last_write"
+PRIMARY = "primary"
+
+
+def read_only_url(url: str) -> str:
+    """
+    Файл SQLite-реплики открывается только для чтения (mode=ro): иначе отсутствующий
+    файл молча создается пустым, и реплика без данных считается исправной
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:") or "uri" in parsed.query:
+        return url
+    return parsed.set(
+        database=f"file:{parsed.database}", query=dict(parsed.query, mode="ro", uri="true")
+    ).render_as_string(hide_password=False)
+
+
+def apply_replica_pragmas(dbapi_connection, connection_record):
+    """Профиль SQLite без journal_mode: режим журнала реплики задает тот, кто в нее пишет"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas():
+            if name != "journal_mode":
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+class ReadReplicas:
+    """
+    Реплики для чтения: сессии выдаются по кругу среди исправных реплик,
+    без исправных - на основной БД. Исправность проверяется периодически
+    и при выдаче сессии (pre-ping соединения); неисправную реплику по истечении
+    паузы с экспоненциальным ростом перепроверяет один из запросов сессии.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.urls = urls
+        self.engines = [self._create_engine(url) for url in urls]
+        self._sessions = [sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines]
+        self.async_engines = []
+        self._async_sessions = []
+        if settings.DB_ASYNC and urls:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+            from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+            for url in urls:
+                async_pool_args = dict(pool_args, poolclass=AsyncAdaptedQueuePool) if pool_args else {}
+                async_engine = create_async_engine(
+                    get_async_database_url(read_only_url(url)), pool_pre_ping=True, **async_pool_args
+                )
+                if url.startswith("sqlite"):
+                    event.listen(async_engine.sync_engine, "connect", apply_replica_pragmas)
+                self.async_engines.append(async_engine)
+                self._async_sessions.append(async_sessionmaker(bind=async_engine, autoflush=False))
+        self.healthy = [True] * len(urls)
+        self._failures = [0] * len(urls)
+        self._retry_at = [0.0] * len(urls)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _create_engine(url: str):
+        is_sqlite = url.startswith("sqlite")
+        engine = create_engine(
+            read_only_url(url),
+            connect_args={"check_same_thread": False} if is_sqlite else {},
+            pool_pre_ping=True,
+            **pool_args
+        )
+        if is_sqlite:
+            event.listen(engine, "connect", apply_replica_pragmas)
+        return engine
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def _candidates(self) -> List[int]:
+        """Неисправная реплика, которую пора перепроверить, и исправные реплики по кругу, начиная со следующей"""
+        count = len(self.engines)
+        start = next(self._counter)
+        ordered = [(start + offset) % count for offset in range(count)]
+        now = time.monotonic()
+        with self._lock:
+            due = next((index for index in ordered if not self.healthy[index] and self._retry_at[index] <= now), None)
+            if due is not None:
+                # Перепроверку берет один запрос; ее результат назначит следующий срок
+                self._retry_at[due] = now + settings.READ_REPLICA_RETRY_MAX
+        healthy = [index for index in ordered if self.healthy[index]]
+        return healthy if due is None else [due] + healthy
+
+    def _set_health(self, index: int, healthy: bool) -> None:
+        with self._lock:
+            if healthy:
+                self._failures[index] = 0
+            else:
+                self._failures[index] += 1
+                self._retry_at[index] = time.monotonic() + min(
+                    settings.READ_REPLICA_RETRY_INTERVAL * 2 ** min(self._failures[index] - 1, 16),
+                    settings.READ_REPLICA_RETRY_MAX
+                )
+            if self.healthy[index] == healthy:
+                return
+            self.healthy[index] = healthy
+        if healthy:
+            logger.info("Read replica %d is back", index)
+        else:
+            logger.warning("Read replica %d is unavailable, reads fall back", index)
+
+    def session(self) -> Session:
+        """Сессия для чтения: на исправной реплике или на основной БД"""
+        for index in self._candidates():
+            db = self._sessions[index]()
+            try:
+                db.connection()
+            except DBAPIError:
+                db.close()
+                self._set_health(index, False)
+                continue
+            if not self.healthy[index]:
+                self._set_health(index, True)
+            db_read_sessions.inc(f"replica-{index}")
+            return db
+        db_read_sessions.inc(PRIMARY)
+        return SessionLocal()
+
+    async def async_session(self):
+        for index in self._candidates():
+            db = self._async_sessions[index]()
+            try:
+                await db.connection()
+            except DBAPIError:
+                await db.close()
+                self._set_health(index, False)
+                continue
+            if not self.healthy[index]:
+                self._set_health(index, True)
+            db_read_sessions.inc(f"replica-{index}")
+            return db
+        db_read_sessions.inc(PRIMARY)
+        return AsyncSessionLocal()
+
+    def check(self) -> List[bool]:
+        """Проверить реплики запросом к таблице contacts, вернуть их исправность"""
+        for index, engine in enumerate(self.engines):
+            try:
+                with engine.connect() as connection:
+                    # SELECT 1 проходит и на пустой БД без схемы
+                    connection.execute(text("SELECT 1 FROM contacts LIMIT 1"))
+            except DBAPIError:
+                self._set_health(index, False)
+            else:
+                self._set_health(index, True)
+        return list(self.healthy)
+
+    async def dispose(self) -> None:
+        for async_engine in self.async_engines:
+            await async_engine.dispose()
+
+
+read_replicas = ReadReplicas([url.strip() for url in settings.READ_REPLICA_URLS.split(",") if url.strip()])
+
+
+def recently_wrote(request: Request) -> bool:
+    """Клиент недавно что-то изменил: его чтения идут на основную БД (read-your-writes)"""
+    written_at = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    if written_at is None:
+        return False
+    try:
+        return time.time() - float(written_at) < settings.READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
+
+def read_session(request: Optional[Request] = None) -> Session:
+    """Сессия для чтения; без реплик - обычная сессия основной БД"""
+    if not read_replicas:
+        return SessionLocal()
+    if request is not None and recently_wrote(request):
+        db_read_sessions.inc(PRIMARY)
+        return SessionLocal()
+    return read_replicas.session()
+
+
+def get_read_db(request: Request):
+    """Dependency для сессии только для чтения (реплика или основная БД)"""
+    db = read_session(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    """Dependency для асинхронной сессии только для чтения"""
+    if not read_replicas:
+        db = AsyncSessionLocal()
+    elif recently_wrote(request):
+        db_read_sessions.inc(PRIMARY)
+        db = AsyncSessionLocal()
+    else:
+        db = await read_replicas.async_session()
+    async with db:
+        yield db
+
+
+ASYNC_DEPENDENCIES[get_read_db] = get_async_read_db
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware: успешный изменяющий запрос ставит cookie со временем записи,
+    и следующие READ_YOUR_WRITES_SECONDS секунд чтения клиента идут на основную БД
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = (
+                    f"{READ_YOUR_WRITES_COOKIE}={time.time():.3f}; "
+                    f"Max-Age={max(int(settings.READ_YOUR_WRITES_SECONDS), 1)}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+if read_replicas:
+    @registry.collector("crm_read_replica_up", "Read replica health by index (1 - used for reads)")
+    def read_replica_up(db: Session) -> List[Sample]:
+        return [({"replica": str(index)}, int(healthy)) for index, healthy in enumerate(read_replicas.healthy)]
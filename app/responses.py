@@ -0,0 +1,69 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, Optional, Tuple
+from fastapi import HTTPException, Response
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Сериализовать уже подготовленные словари/списки в JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ без повторной валидации по response_model (данные уже приведены к схеме)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """Ответ со списком строк; заголовки (например, X-Next-Cursor) переносятся из response"""
+    headers = None
+    if response is not None:
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name not in ("content-length", "content-type")
+        }
+    return FastJSONResponse(content=content, headers=headers)
+
+
+def parse_field_list(
+    value: Optional[str],
+    allowed: Iterable[str],
+    parameter: str
+) -> Optional[Tuple[str, ...]]:
+    """Разобрать параметр вида a,b,c; None - параметр не передан"""
+    if value is None:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {parameter}: {', '.join(unknown)}"
+        )
+    return names
+
+
+def pick_fields(item: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    if fields is None:
+        return item
+    return {name: item[name] for name in fields}
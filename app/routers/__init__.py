@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from app.config import settings
+from app.database import async_endpoint
+
+
+class DatabaseRouter(APIRouter):
+    """Роутер, переводящий обработчики с сессией БД в асинхронный режим при DB_ASYNC"""
+
+    def add_api_route(self, path, endpoint, **kwargs):
+        if settings.DB_ASYNC:
+            endpoint = async_endpoint(endpoint)
+        super().add_api_route(path, endpoint, **kwargs)
@@ -1,16 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import Depends, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from typing import List, Optional
+from app.archive import is_archived
+from app.backlog import backlog_scheduler
+from app.config import settings
+from app.database import get_db, run_blocking
+from app.routers import DatabaseRouter
 from app import models, schemas
-from app.services import DistributionService
+from app.exports import FileFormat, contact_export_query, export_response
+from app.ingest import ingest_queue, ticket_status
+from app.pagination import paginate
+from app.replicas import get_read_db
+from app.queries import CONTACT_EXPANSIONS, CONTACT_FIELDS, contact_row_to_dict, contact_rows_query
+from app.responses import parse_field_list, rows_response
+from app.services import DistributionService, OperatorCapacityExceeded
 
-router = APIRouter(prefix="/contacts", tags=["Обращения"])
+router = DatabaseRouter(prefix="/contacts", tags=["Обращения"])
 
 
-@router.post("/", response_model=schemas.ContactResponse)
+@router.post(
+    "/",
+    response_model=schemas.ContactResponse,
+    responses={202: {"model": schemas.IngestTicket}}
+)
 def create_contact(
     contact: schemas.ContactCreate,
+    request: Request,
+    prefer: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """
@@ -19,37 +37,126 @@ def create_contact(
     - найдет или создаст лида
     - выберет оператора по правилам распределения
     - создаст обращение
+    С заголовком `Prefer: respond-async` (при INGEST_QUEUE_ENABLED) обращение
+    ставится в очередь и распределяется в фоне: ответ 202 с номером квитанции.
     """
+    if settings.INGEST_QUEUE_ENABLED and prefer and "respond-async" in prefer.lower():
+        ticket = run_blocking(ingest_queue.put, contact)
+        return JSONResponse(
+            status_code=202,
+            content={"ticket": ticket, "status": schemas.IngestStatus.QUEUED.value},
+            headers={
+                "Location": str(request.url_for("get_contact_ticket", ticket=ticket)),
+                "Preference-Applied": "respond-async"
+            }
+        )
+
     source = db.query(models.Source).filter(models.Source.id == contact.source_id).first()
     if not source:
         raise HTTPException(status_code=404, detail="Source not found")
 
     db_contact = DistributionService.distribute_contact(db=db, contact_data=contact)
 
-    return schemas.ContactResponse(
-        id=db_contact.id,
-        lead_id=db_contact.lead_id,
-        source_id=db_contact.source_id,
-        operator_id=db_contact.operator_id,
-        status=db_contact.status,
-        created_at=db_contact.created_at,
-        lead=schemas.LeadResponse.model_validate(db_contact.lead),
-        source=schemas.SourceResponse.model_validate(db_contact.source),
-        operator=schemas.OperatorResponse.model_validate(db_contact.operator) if db_contact.operator else None
+    row = contact_rows_query(db).filter(models.Contact.id == db_contact.id).one()
+    return contact_row_to_dict(row)
+
+
+@router.get("/tickets/{ticket}", response_model=schemas.IngestTicket)
+def get_contact_ticket(ticket: str, db: Session = Depends(get_db)):
+    """Получить статус обращения, принятого через очередь, и ID созданного обращения"""
+    status = ticket_status(db, ticket)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return status
+
+
+@router.post("/batch", response_model=schemas.ContactBatchResponse)
+def create_contacts_batch(
+    batch: schemas.ContactBatchCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    Зарегистрировать пачку обращений.
+    Лиды ищутся и создаются пакетно, обращения распределяются по снимку
+    нагрузки операторов и сохраняются в одной транзакции.
+    """
+    results = DistributionService.distribute_batch(db=db, items=batch.contacts)
+
+    created = [result for result in results if result.error is None]
+    return schemas.ContactBatchResponse(
+        created=len(created),
+        assigned=sum(1 for result in created if result.operator_id is not None),
+        unassigned=[result.index for result in created if result.operator_id is None],
+        failed=[result.index for result in results if result.error is not None],
+        results=results
     )
 
 
+def _check_contact_update(update: schemas.ContactUpdate, db: Session) -> None:
+    if update.action != schemas.ContactAction.REASSIGN:
+        return
+    if update.operator_id is None:
+        raise HTTPException(status_code=400, detail="operator_id is required for reassign")
+    operator = db.query(models.Operator).filter(models.Operator.id == update.operator_id).first()
+    if not operator:
+        raise HTTPException(status_code=404, detail="Operator not found")
+    if not operator.is_active:
+        raise HTTPException(status_code=409, detail="Operator is not active")
+
+
+def _change_contacts(db: Session, contact_ids: List[int], update: schemas.ContactUpdate):
+    try:
+        result = DistributionService.change_contacts(
+            db=db,
+            contact_ids=contact_ids,
+            action=update.action,
+            operator_id=update.operator_id
+        )
+    except OperatorCapacityExceeded:
+        raise HTTPException(status_code=409, detail="Operator has no capacity for these contacts")
+    # Закрытие и переназначение освобождают нагрузку прежних операторов
+    backlog_scheduler.notify_operators(load.operator_id for load in result.operator_loads)
+    return result
+
+
+@router.patch("/batch", response_model=schemas.ContactBatchUpdateResponse)
+def update_contacts_batch(
+    update: schemas.ContactBatchUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Закрыть или переназначить пачку активных обращений.
+    Изменение выполняется пакетным UPDATE в одной транзакции, освобожденная
+    нагрузка сразу доступна для распределения. В ответе - новая нагрузка
+    затронутых операторов.
+    """
+    _check_contact_update(update, db)
+    return _change_contacts(db, update.contact_ids, update)
+
+
 @router.get("/", response_model=List[schemas.ContactResponse])
 def get_contacts(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     lead_id: int = None,
     source_id: int = None,
     operator_id: int = None,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """Получить список обращений с фильтрацией"""
-    query = db.query(models.Contact)
+    """
+    Получить список обращений с фильтрацией (курсор следующей страницы - в X-Next-Cursor).
+    fields - поля обращения через запятую, expand - вложенные объекты
+    lead,source,operator (по умолчанию все; пустое значение - без JOIN).
+    """
+    field_names = parse_field_list(fields, CONTACT_FIELDS, "fields")
+    expansions = parse_field_list(expand, CONTACT_EXPANSIONS, "expand")
+    if expansions is None:
+        expansions = CONTACT_EXPANSIONS
+    query = contact_rows_query(db, expansions)
 
     if lead_id:
         query = query.filter(models.Contact.lead_id == lead_id)
@@ -58,43 +165,66 @@ def get_contacts(
     if operator_id:
         query = query.filter(models.Contact.operator_id == operator_id)
 
-    contacts = query.offset(skip).limit(limit).all()
-
-    result = []
-    for contact in contacts:
-        result.append(schemas.ContactResponse(
-            id=contact.id,
-            lead_id=contact.lead_id,
-            source_id=contact.source_id,
-            operator_id=contact.operator_id,
-            status=contact.status,
-            created_at=contact.created_at,
-            lead=schemas.LeadResponse.model_validate(contact.lead),
-            source=schemas.SourceResponse.model_validate(contact.source),
-            operator=schemas.OperatorResponse.model_validate(contact.operator) if contact.operator else None
-        ))
-    return result
+    rows = paginate(query, models.Contact.id, response, cursor=cursor, skip=skip, limit=limit)
+    return rows_response([contact_row_to_dict(row, field_names, expansions) for row in rows], response)
+
+
+@router.get("/export", response_class=StreamingResponse)
+def export_contacts(
+    request: Request,
+    format: FileFormat = FileFormat.NDJSON,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source_id: Optional[int] = None,
+    operator_id: Optional[int] = None,
+    status: Optional[schemas.ContactStatus] = None
+):
+    """Потоковая выгрузка обращений в NDJSON или CSV с фильтрами по периоду [start, end), источнику, оператору и статусу"""
+    statement = contact_export_query(
+        start=start,
+        end=end,
+        source_id=source_id,
+        operator_id=operator_id,
+        status=status.value if status else None
+    )
+    return export_response(request, statement, CONTACT_FIELDS, format, "contacts")
 
 
 @router.get("/{contact_id}", response_model=schemas.ContactResponse)
 def get_contact(
     contact_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить обращение по ID"""
+    row = contact_rows_query(db).filter(models.Contact.id == contact_id).first()
+    if not row:
+        # Закрытые обращения старше ARCHIVE_AFTER_DAYS перенесены в архив
+        row = contact_rows_query(db, model=models.ContactArchive).filter(
+            models.ContactArchive.id == contact_id
+        ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Contact not found")
+
+    return contact_row_to_dict(row)
+
+
+@router.patch("/{contact_id}", response_model=schemas.ContactResponse)
+def update_contact(
+    contact_id: int,
+    update: schemas.ContactUpdate,
+    db: Session = Depends(get_db)
+):
+    """Закрыть или переназначить обращение"""
     contact = db.query(models.Contact).filter(models.Contact.id == contact_id).first()
     if not contact:
+        if is_archived(db, contact_id):
+            raise HTTPException(status_code=409, detail="Contact is not active")
         raise HTTPException(status_code=404, detail="Contact not found")
+    if contact.status != schemas.ContactStatus.ACTIVE.value:
+        raise HTTPException(status_code=409, detail="Contact is not active")
 
-    return schemas.ContactResponse(
-        id=contact.id,
-        lead_id=contact.lead_id,
-        source_id=contact.source_id,
-        operator_id=contact.operator_id,
-        status=contact.status,
-        created_at=contact.created_at,
-        lead=schemas.LeadResponse.model_validate(contact.lead),
-        source=schemas.SourceResponse.model_validate(contact.source),
-        operator=schemas.OperatorResponse.model_validate(contact.operator) if contact.operator else None
-    )
+    _check_contact_update(update, db)
+    _change_contacts(db, [contact_id], update)
 
+    row = contact_rows_query(db).filter(models.Contact.id == contact_id).one()
+    return contact_row_to_dict(row)
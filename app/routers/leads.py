@@ -1,27 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+import os
+import re
+import tempfile
+import uuid
+from datetime import datetime
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from app.config import settings
+from app.routers import DatabaseRouter
 from app import models, schemas
+from app.exports import FileFormat, export_response, lead_export_query
+from app.imports import import_leads_file
+from app.pagination import paginate
+from app.replicas import get_read_db
+from app.queries import (
+    CONTACT_EXPANSIONS, CONTACT_FIELDS, LEAD_FIELDS,
+    contact_row_to_dict, contact_rows_query, lead_rows_query, row_to_dict
+)
+from app.responses import parse_field_list, rows_response
 
-router = APIRouter(prefix="/leads", tags=["Лиды"])
+logger = logging.getLogger(__name__)
+
+router = DatabaseRouter(prefix="/leads", tags=["Лиды"])
+
+# Тело импорта до этого размера держится в памяти, больше - во временном файле
+UPLOAD_SPOOL_SIZE = 8 * 1024 * 1024
+
+# Имена файлов ошибок, которые создает import_leads: другие файлы не отдаются
+ERROR_FILE_NAME = re.compile(r"leads-\d{14}-[0-9a-f]{8}\.errors\.csv")
 
 
 @router.get("/", response_model=List[schemas.LeadResponse])
 def get_leads(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Получить список лидов (курсор следующей страницы - в X-Next-Cursor, fields - поля через запятую)"""
+    field_names = parse_field_list(fields, LEAD_FIELDS, "fields") or LEAD_FIELDS
+    rows = paginate(lead_rows_query(db, field_names), models.Lead.id, response, cursor=cursor, skip=skip, limit=limit)
+    return rows_response([row_to_dict(row, field_names) for row in rows], response)
+
+
+@router.get("/export", response_class=StreamingResponse)
+def export_leads(
+    request: Request,
+    format: FileFormat = FileFormat.NDJSON,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
 ):
-    """Получить список лидов"""
-    leads = db.query(models.Lead).offset(skip).limit(limit).all()
-    return leads
+    """Потоковая выгрузка лидов в NDJSON или CSV, start/end - период создания [start, end)"""
+    return export_response(request, lead_export_query(start=start, end=end), LEAD_FIELDS, format, "leads")
+
+
+@router.post("/import", response_model=schemas.LeadImportReport)
+async def import_leads(request: Request, format: FileFormat = FileFormat.CSV):
+    """
+    Импорт лидов из CSV (заголовок external_id,phone,email) или NDJSON в теле запроса.
+    Существующие лиды обновляются по external_id; ошибочные строки сохраняются
+    в файл в IMPORT_ERRORS_DIR, ссылка для его скачивания - в error_file отчета.
+    """
+    os.makedirs(settings.IMPORT_ERRORS_DIR, exist_ok=True)
+    error_name = f"leads-{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.errors.csv"
+    error_path = os.path.join(settings.IMPORT_ERRORS_DIR, error_name)
+
+    def log_progress(processed: int, imported: int, failed: int) -> None:
+        logger.info("Lead import %s: %d rows processed, %d imported, %d failed", error_name, processed, imported, failed)
+
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE) as upload:
+        # Сверх UPLOAD_SPOOL_SIZE запись идет на диск: не блокируем цикл событий
+        async for chunk in request.stream():
+            await run_in_threadpool(upload.write, chunk)
+        await run_in_threadpool(upload.seek, 0)
+        report = await run_in_threadpool(import_leads_file, upload, format, error_path, log_progress)
+
+    if report.error_file:
+        # Путь на сервере клиенту не нужен: отдаем ссылку на скачивание
+        report.error_file = request.url_for("get_import_errors", name=error_name).path
+    return report
+
+
+@router.get("/import/errors/{name}", response_class=FileResponse)
+def get_import_errors(name: str):
+    """Скачать файл ошибочных строк импорта"""
+    if not ERROR_FILE_NAME.fullmatch(name):
+        raise HTTPException(status_code=404, detail="Import errors not found")
+    path = os.path.join(settings.IMPORT_ERRORS_DIR, name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Import errors not found")
+    return FileResponse(path, media_type="text/csv; charset=utf-8", filename=name)
 
 
 @router.get("/{lead_id}", response_model=schemas.LeadResponse)
 def get_lead(
     lead_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить лида по ID"""
     lead = db.query(models.Lead).filter(models.Lead.id == lead_id).first()
@@ -33,27 +112,26 @@ def get_lead(
 @router.get("/{lead_id}/contacts", response_model=List[schemas.ContactResponse])
 def get_lead_contacts(
     lead_id: int,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """Получить все обращения конкретного лида"""
-    lead = db.query(models.Lead).filter(models.Lead.id == lead_id).first()
+    """Получить все обращения конкретного лида, включая архивные (fields и expand - как в GET /contacts/)"""
+    field_names = parse_field_list(fields, CONTACT_FIELDS, "fields")
+    expansions = parse_field_list(expand, CONTACT_EXPANSIONS, "expand")
+    if expansions is None:
+        expansions = CONTACT_EXPANSIONS
+
+    lead = db.query(models.Lead.id).filter(models.Lead.id == lead_id).first()
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
 
-    contacts = db.query(models.Contact).filter(models.Contact.lead_id == lead_id).all()
-
-    result = []
-    for contact in contacts:
-        result.append(schemas.ContactResponse(
-            id=contact.id,
-            lead_id=contact.lead_id,
-            source_id=contact.source_id,
-            operator_id=contact.operator_id,
-            status=contact.status,
-            created_at=contact.created_at,
-            lead=schemas.LeadResponse.model_validate(contact.lead),
-            source=schemas.SourceResponse.model_validate(contact.source),
-            operator=schemas.OperatorResponse.model_validate(contact.operator) if contact.operator else None
-        ))
-    return result
-
+    rows = contact_rows_query(db, expansions).filter(
+        models.Contact.lead_id == lead_id
+    ).all()
+    # Закрытые обращения старше ARCHIVE_AFTER_DAYS - в архиве
+    rows.extend(contact_rows_query(db, expansions, models.ContactArchive).filter(
+        models.ContactArchive.lead_id == lead_id
+    ).all())
+    rows.sort(key=lambda row: row.id)
+    return rows_response([contact_row_to_dict(row, field_names, expansions) for row in rows])
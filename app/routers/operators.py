@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database import get_db
+from app.routers import DatabaseRouter
 from app import models, schemas
+from app.backlog import backlog_scheduler
+from app.config_cache import config_version, content_etag, etag_response
+from app.loads import load_tracker
+from app.pagination import NEXT_CURSOR_HEADER, paginate
+from app.replicas import get_read_db
+from app.queries import OPERATOR_COLUMNS, operator_rows_query, row_to_dict
+from app.responses import dumps, parse_field_list
+from app.routing import routing_table
 
-router = APIRouter(prefix="/operators", tags=["Операторы"])
+router = DatabaseRouter(prefix="/operators", tags=["Операторы"])
 
 
 @router.post("/", response_model=schemas.OperatorResponse)
@@ -22,31 +31,39 @@ def create_operator(
 
 @router.get("/", response_model=List[schemas.OperatorResponse])
 def get_operators(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """Получить список операторов"""
-    operators = db.query(models.Operator).offset(skip).limit(limit).all()
-    result = []
-    for op in operators:
-        op_dict = schemas.OperatorResponse.model_validate(op).model_dump()
-        op_dict["current_load"] = op.get_current_load(db)
-        result.append(op_dict)
-    return result
+    """
+    Получить список операторов (курсор следующей страницы - в X-Next-Cursor, fields - поля через запятую).
+    ETag считается по содержимому: текущая нагрузка меняется с каждым обращением.
+    """
+    field_names = parse_field_list(fields, OPERATOR_COLUMNS, "fields") or tuple(OPERATOR_COLUMNS)
+    response = Response()
+    rows = paginate(operator_rows_query(db, field_names), models.Operator.id, response, cursor=cursor, skip=skip, limit=limit)
+    content = dumps([row_to_dict(row, field_names) for row in rows])
+
+    headers = {}
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return etag_response(request, content_etag(content), content, headers)
 
 
 @router.get("/{operator_id}", response_model=schemas.OperatorResponse)
 def get_operator(
     operator_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить оператора по ID"""
     operator = db.query(models.Operator).filter(models.Operator.id == operator_id).first()
     if not operator:
         raise HTTPException(status_code=404, detail="Operator not found")
     result = schemas.OperatorResponse.model_validate(operator).model_dump()
-    result["current_load"] = operator.get_current_load(db)
+    result["current_load"] = operator.active_load
     return result
 
 
@@ -65,10 +82,15 @@ def update_operator(
     for field, value in update_data.items():
         setattr(operator, field, value)
 
+    config_version.bump(db)
     db.commit()
+    config_version.invalidate()
+    routing_table.invalidate()
+    # Активация или рост лимита освобождают нагрузку для очереди нераспределенных
+    backlog_scheduler.notify_operators([operator_id])
     db.refresh(operator)
     result = schemas.OperatorResponse.model_validate(operator).model_dump()
-    result["current_load"] = operator.get_current_load(db)
+    result["current_load"] = operator.active_load
     return result
 
 
@@ -82,6 +104,10 @@ def delete_operator(
     if not operator:
         raise HTTPException(status_code=404, detail="Operator not found")
     db.delete(operator)
+    config_version.bump(db)
     db.commit()
+    config_version.invalidate()
+    load_tracker.forget(operator_id)
+    routing_table.invalidate()
     return {"message": "Operator deleted"}
 
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database import get_db
-from app import models, schemas
+from app.routers import DatabaseRouter
+from app import models, schemas, simulation
+from app.backlog import backlog_scheduler
+from app.config_cache import config_response, config_version
+from app.pagination import paginate
+from app.replicas import read_session
+from app.routing import routing_table
 
-router = APIRouter(prefix="/sources", tags=["Источники"])
+router = DatabaseRouter(prefix="/sources", tags=["Источники"])
 
 
 @router.post("/", response_model=schemas.SourceResponse)
@@ -15,32 +21,44 @@ def create_source(
     """Создать источник (бота)"""
     db_source = models.Source(**source.dict())
     db.add(db_source)
+    config_version.bump(db)
     db.commit()
+    config_version.invalidate()
     db.refresh(db_source)
     return db_source
 
 
 @router.get("/", response_model=List[schemas.SourceResponse])
 def get_sources(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Получить список источников"""
-    sources = db.query(models.Source).offset(skip).limit(limit).all()
-    return sources
+    """Получить список источников (курсор следующей страницы - в X-Next-Cursor, поддерживается ETag)"""
+    return config_response(request, db, List[schemas.SourceResponse], lambda response: paginate(
+        db.query(models.Source), models.Source.id, response, cursor=cursor, skip=skip, limit=limit
+    ))
+
+
+def _get_source_or_404(db: Session, source_id: int) -> models.Source:
+    source = db.query(models.Source).filter(models.Source.id == source_id).first()
+    if not source:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return source
 
 
 @router.get("/{source_id}", response_model=schemas.SourceResponse)
 def get_source(
     source_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Получить источник по ID"""
-    source = db.query(models.Source).filter(models.Source.id == source_id).first()
-    if not source:
-        raise HTTPException(status_code=404, detail="Source not found")
-    return source
+    """Получить источник по ID (поддерживается ETag)"""
+    return config_response(
+        request, db, schemas.SourceResponse, lambda response: _get_source_or_404(db, source_id)
+    )
 
 
 @router.post("/{source_id}/distribution", response_model=List[schemas.SourceOperatorWeightResponse])
@@ -50,9 +68,11 @@ def set_source_distribution(
     db: Session = Depends(get_db)
 ):
     """Настроить распределение для источника (операторы и их веса)"""
-    source = db.query(models.Source).filter(models.Source.id == source_id).first()
-    if not source:
-        raise HTTPException(status_code=404, detail="Source not found")
+    _get_source_or_404(db, source_id)
+
+    operator_ids = [weight_data.operator_id for weight_data in config.operator_weights]
+    if len(set(operator_ids)) != len(operator_ids):
+        raise HTTPException(status_code=400, detail="Duplicate operator_id in distribution")
 
     db.query(models.SourceOperatorWeight).filter(
         models.SourceOperatorWeight.source_id == source_id
@@ -77,7 +97,11 @@ def set_source_distribution(
         db.add(weight_obj)
         weights.append(weight_obj)
 
+    config_version.bump(db)
     db.commit()
+    config_version.invalidate()
+    routing_table.invalidate(source_id)
+    backlog_scheduler.notify_sources([source_id])
     for weight in weights:
         db.refresh(weight)
 
@@ -87,15 +111,37 @@ def set_source_distribution(
 @router.get("/{source_id}/distribution", response_model=List[schemas.SourceOperatorWeightResponse])
 def get_source_distribution(
     source_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Получить настройки распределения для источника"""
-    source = db.query(models.Source).filter(models.Source.id == source_id).first()
-    if not source:
-        raise HTTPException(status_code=404, detail="Source not found")
+    """Получить настройки распределения для источника (поддерживается ETag)"""
+    def build(response: Response):
+        _get_source_or_404(db, source_id)
+        return db.query(models.SourceOperatorWeight).filter(
+            models.SourceOperatorWeight.source_id == source_id
+        ).all()
+
+    return config_response(request, db, List[schemas.SourceOperatorWeightResponse], build)
 
-    weights = db.query(models.SourceOperatorWeight).filter(
-        models.SourceOperatorWeight.source_id == source_id
-    ).all()
-    return weights
 
+@router.post("/{source_id}/distribution/simulate", response_model=schemas.SimulationResult)
+def simulate_source_distribution(
+    source_id: int,
+    config: schemas.SimulationRequest
+):
+    """
+    Смоделировать распределение при предложенных весах и max_load операторов
+    (по умолчанию - текущих) на истории обращений источника или пуассоновском потоке
+    """
+    # Своя сессия вместо Depends(get_db): расчет занимает секунды и идет в пуле
+    # потоков, а не в цикле событий, в том числе при DB_ASYNC; история читается с реплики
+    db = read_session()
+    try:
+        _get_source_or_404(db, source_id)
+        return simulation.simulate_source(db, source_id, config)
+    except simulation.OperatorNotFound as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    except simulation.SimulationError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    finally:
+        db.close()
@@ -1,62 +1,65 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_db
-from app import models, schemas
+from typing import Optional
+from app.counters import ContactCounterService
+from app.lead_cache import lead_cache, lead_filter
+from app.queries import as_utc
+from app.replicas import get_read_db
+from app.routers import DatabaseRouter
+from app import schemas
 
-router = APIRouter(prefix="/stats", tags=["Статистика"])
+router = DatabaseRouter(prefix="/stats", tags=["Статистика"])
 
 
-@router.get("/contacts")
-def get_contact_stats(db: Session = Depends(get_db)):
-    """Получить статистику по обращениям"""
-    total_contacts = db.query(models.Contact).count()
+@router.get("/contacts", response_model=schemas.ContactStats)
+def get_contact_stats(db: Session = Depends(get_read_db)):
+    """Получить статистику по обращениям (из счетчиков, без обхода таблицы обращений)"""
+    return ContactCounterService.contact_stats(db)
 
-    contacts_by_source = db.query(
-        models.Source.name,
-        func.count(models.Contact.id).label("count")
-    ).join(
-        models.Contact, models.Contact.source_id == models.Source.id
-    ).group_by(models.Source.id).all()
-
-    source_dict = {name: count for name, count in contacts_by_source}
-
-    contacts_by_operator = db.query(
-        models.Operator.name,
-        func.count(models.Contact.id).label("count")
-    ).join(
-        models.Contact, models.Contact.operator_id == models.Operator.id
-    ).group_by(models.Operator.id).all()
-
-    operator_dict = {name: count for name, count in contacts_by_operator}
 
+@router.get("/lead-cache")
+def get_lead_cache_stats():
+    """Получить метрики кэша лидов и фильтра известных external_id"""
     return {
-        "total_contacts": total_contacts,
-        "contacts_by_source": source_dict,
-        "contacts_by_operator": operator_dict
+        "cache": lead_cache.stats(),
+        "filter": lead_filter.stats()
     }
 
 
 @router.get("/distribution")
-def get_distribution_stats(db: Session = Depends(get_db)):
+def get_distribution_stats(db: Session = Depends(get_read_db)):
     """Получить статистику распределения обращений по источникам и операторам"""
-    stats = db.query(
-        models.Source.name.label("source_name"),
-        models.Operator.name.label("operator_name"),
-        func.count(models.Contact.id).label("contact_count")
-    ).join(
-        models.Contact, models.Contact.source_id == models.Source.id
-    ).join(
-        models.Operator, models.Contact.operator_id == models.Operator.id
-    ).group_by(
-        models.Source.id, models.Operator.id
-    ).all()
-
-    result = {}
-    for source_name, operator_name, count in stats:
-        if source_name not in result:
-            result[source_name] = {}
-        result[source_name][operator_name] = count
-
-    return result
+    return ContactCounterService.distribution_stats(db)
+
 
+@router.get("/timeseries", response_model=schemas.TimeseriesResponse)
+def get_timeseries_stats(
+    start: datetime,
+    end: datetime,
+    bucket: schemas.StatsBucket = schemas.StatsBucket.HOUR,
+    group_by: Optional[schemas.StatsGroupBy] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Получить число созданных обращений по часам или суткам за период [start, end)
+    с группировкой по источнику, оператору или статусу
+    """
+    start, end = as_utc(start), as_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+
+    points = ContactCounterService.timeseries(
+        db,
+        start=start,
+        end=end,
+        bucket=bucket.value,
+        group_by=group_by.value if group_by else None
+    )
+    return {
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "group_by": group_by,
+        "points": points
+    }
@@ -0,0 +1,127 @@
+import random
+import threading
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from app import models
+from app.config_cache import config_version
+
+
+class RouteEntry(NamedTuple):
+    operator_id: int
+    weight: int
+    max_load: int
+
+
+class SourceRoute:
+    """Маршрут источника: активные операторы и префиксные суммы их весов"""
+
+    MAX_REJECTIONS = 8
+
+    def __init__(self, entries: List[RouteEntry]):
+        self.entries = entries
+        self.cumulative = list(accumulate(entry.weight for entry in entries))
+        self.total_weight = self.cumulative[-1] if entries else 0
+
+    def select(
+        self,
+        is_available: Callable[[RouteEntry], bool]
+    ) -> Optional[RouteEntry]:
+        """
+        Выбрать оператора с учетом весов среди доступных.
+        Недоступные операторы отбрасываются повторной выборкой (бинарный поиск
+        по префиксным суммам), без перестроения маршрута.
+        """
+        if self.total_weight > 0:
+            for _ in range(self.MAX_REJECTIONS):
+                random_value = random.uniform(0, self.total_weight)
+                index = min(bisect_left(self.cumulative, random_value), len(self.entries) - 1)
+                entry = self.entries[index]
+                if entry.weight > 0 and is_available(entry):
+                    return entry
+
+        available = [entry for entry in self.entries if is_available(entry)]
+        return select_by_weights(available)
+
+
+def select_by_weights(entries: List[RouteEntry]) -> Optional[RouteEntry]:
+    """Вероятностный выбор по кумулятивным весам среди уже отобранных операторов"""
+    if not entries:
+        return None
+
+    total_weight = sum(entry.weight for entry in entries)
+    if total_weight == 0:
+        return random.choice(entries)
+
+    random_value = random.uniform(0, total_weight)
+    cumulative = 0
+    for entry in entries:
+        cumulative += entry.weight
+        if random_value <= cumulative:
+            return entry
+
+    return entries[0]
+
+
+class RoutingTable:
+    """Кэш маршрутов по источникам, строится из source_operator_weights"""
+
+    def __init__(self):
+        self._routes: Dict[int, SourceRoute] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._version: Optional[int] = None
+
+    def get(self, db: Session, source_id: int) -> SourceRoute:
+        self._sync_version(db)
+        route = self._routes.get(source_id)
+        if route is not None:
+            return route
+
+        generation = self._generation
+        route = self._build(db, source_id)
+        with self._lock:
+            if generation == self._generation:
+                self._routes[source_id] = route
+        return route
+
+    def _sync_version(self, db: Session) -> None:
+        """Сбросить кэш, если конфигурацию изменил другой процесс"""
+        version = config_version.current(db)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._generation += 1
+                self._routes.clear()
+                self._version = version
+
+    def invalidate(self, source_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if source_id is None:
+                self._routes.clear()
+            else:
+                self._routes.pop(source_id, None)
+
+    @staticmethod
+    def _build(db: Session, source_id: int) -> SourceRoute:
+        rows = db.query(
+            models.SourceOperatorWeight.operator_id,
+            models.SourceOperatorWeight.weight,
+            models.Operator.max_load
+        ).join(
+            models.Operator, models.Operator.id == models.SourceOperatorWeight.operator_id
+        ).filter(
+            models.SourceOperatorWeight.source_id == source_id,
+            models.Operator.is_active == True
+        ).order_by(models.SourceOperatorWeight.id).all()
+
+        return SourceRoute([
+            RouteEntry(operator_id=operator_id, weight=weight, max_load=max_load)
+            for operator_id, weight, max_load in rows
+        ])
+
+
+routing_table = RoutingTable()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Union
 from datetime import datetime
 from enum import Enum
 
@@ -68,6 +68,54 @@ class SourceDistributionConfig(BaseModel):
     operator_weights: List[SourceOperatorWeightCreate]
 
 
+class SimulationArrivals(str, Enum):
+    HISTORY = "history"
+    POISSON = "poisson"
+
+
+class SimulationOperator(BaseModel):
+    operator_id: int
+    weight: int = Field(..., ge=0)
+    max_load: Optional[int] = Field(None, ge=0)
+
+
+class SimulationRequest(BaseModel):
+    operators: Optional[List[SimulationOperator]] = None
+    arrivals: SimulationArrivals = SimulationArrivals.POISSON
+    contacts: int = Field(10000, ge=1)
+    rate_per_hour: Optional[float] = Field(None, gt=0)
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    rate_multiplier: float = Field(1.0, gt=0)
+    mean_lifetime_minutes: float = Field(60.0, gt=0)
+    from_current_load: bool = False
+    seed: Optional[int] = None
+
+
+class SimulationOperatorResult(BaseModel):
+    operator_id: int
+    weight: int
+    max_load: int
+    assigned: int
+    share: float
+    mean_load: float
+    utilization: float
+    peak_load: int
+    saturated_after_seconds: Optional[float] = None
+
+
+class SimulationResult(BaseModel):
+    source_id: int
+    arrivals: SimulationArrivals
+    contacts: int
+    duration_seconds: float
+    assigned: int
+    unassigned: int
+    unassigned_rate: float
+    first_unassigned_after_seconds: Optional[float] = None
+    operators: List[SimulationOperatorResult]
+
+
 class LeadBase(BaseModel):
     external_id: str
     phone: Optional[str] = None
@@ -85,6 +133,20 @@ class LeadResponse(LeadBase):
     model_config = {"from_attributes": True}
 
 
+class LeadImportError(BaseModel):
+    line: int
+    external_id: Optional[str] = None
+    error: str
+
+
+class LeadImportReport(BaseModel):
+    processed: int
+    imported: int
+    failed: int
+    error_file: Optional[str] = None
+    errors: List[LeadImportError]
+
+
 class ContactBase(BaseModel):
     lead_id: int
     source_id: int
@@ -99,6 +161,69 @@ class ContactCreate(BaseModel):
     email: Optional[EmailStr] = None
 
 
+class ContactBatchCreate(BaseModel):
+    contacts: List[ContactCreate] = Field(..., min_length=1, max_length=10000)
+
+
+class ContactBatchItemResult(BaseModel):
+    index: int
+    external_id: str
+    source_id: int
+    contact_id: Optional[int] = None
+    lead_id: Optional[int] = None
+    operator_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ContactBatchResponse(BaseModel):
+    created: int
+    assigned: int
+    unassigned: List[int]
+    failed: List[int]
+    results: List[ContactBatchItemResult]
+
+
+class IngestStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class IngestTicket(BaseModel):
+    ticket: str
+    status: IngestStatus
+    contact_id: Optional[int] = None
+    operator_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ContactAction(str, Enum):
+    CLOSE = "close"
+    REASSIGN = "reassign"
+
+
+class ContactUpdate(BaseModel):
+    action: ContactAction
+    operator_id: Optional[int] = None
+
+
+class ContactBatchUpdate(ContactUpdate):
+    contact_ids: List[int] = Field(..., min_length=1, max_length=10000)
+
+
+class OperatorLoad(BaseModel):
+    operator_id: int
+    current_load: int
+    max_load: int
+
+
+class ContactBatchUpdateResponse(BaseModel):
+    updated: int
+    skipped: List[int]
+    operator_loads: List[OperatorLoad]
+
+
 class ContactResponse(BaseModel):
     id: int
     lead_id: int
@@ -113,7 +238,33 @@ class ContactResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class StatsBucket(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+class StatsGroupBy(str, Enum):
+    SOURCE = "source"
+    OPERATOR = "operator"
+    STATUS = "status"
+
+
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    group: Optional[Union[int, str]] = None
+    count: int
+
+
+class TimeseriesResponse(BaseModel):
+    start: datetime
+    end: datetime
+    bucket: StatsBucket
+    group_by: Optional[StatsGroupBy] = None
+    points: List[TimeseriesPoint]
+
+
 class ContactStats(BaseModel):
     total_contacts: int
     contacts_by_source: dict
     contacts_by_operator: dict
+    contacts_by_status: dict
@@ -1,139 +1,486 @@
-import random
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Callable, Dict, Iterable, Optional, List, TypeVar
 from app import models, schemas
+from app.counters import ContactCounterService, counter_key
+from app.database import pause
+from app.lead_cache import lead_cache, lead_filter
+from app.loads import load_tracker
+from app.metrics import distribution_candidates, distribution_step_duration, record_distribution
+from app.routing import RouteEntry, SourceRoute, routing_table
+
+T = TypeVar("T")
+
+
+class TransactionConflict(Exception):
+    """Данные изменились параллельной транзакцией, единицу работы нужно повторить"""
+
+
+class OperatorCapacityExceeded(Exception):
+    """У оператора недостаточно свободной нагрузки"""
+
+    def __init__(self, operator_id: int):
+        super().__init__(f"Operator {operator_id} has no capacity")
+        self.operator_id = operator_id
 
 
 class DistributionService:
     """Сервис для распределения обращений между операторами"""
 
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = 0.01
+    IN_CHUNK_SIZE = 500
+
+    @staticmethod
+    def run_in_transaction(db: Session, unit_of_work: Callable[[], T]) -> T:
+        """Выполнить единицу работы и зафиксировать транзакцию, повторяя ее при конфликте"""
+        for attempt in range(1, DistributionService.MAX_ATTEMPTS + 1):
+            try:
+                result = unit_of_work()
+                db.commit()
+                return result
+            except (IntegrityError, OperationalError, TransactionConflict):
+                db.rollback()
+                if attempt == DistributionService.MAX_ATTEMPTS:
+                    raise
+                pause(DistributionService.RETRY_DELAY * attempt)
+            except Exception:
+                db.rollback()
+                raise
+
     @staticmethod
     def find_or_create_lead(
         db: Session,
         external_id: str,
         phone: Optional[str] = None,
         email: Optional[str] = None
-    ) -> models.Lead:
-        lead = db.query(models.Lead).filter(
-            models.Lead.external_id == external_id
-        ).first()
-
-        if not lead:
-            lead = models.Lead(
-                external_id=external_id,
-                phone=phone,
-                email=email
+    ) -> int:
+        """
+        Вернуть id лида по external_id, создав его при отсутствии.
+        Горячие лиды берутся из LRU-кэша без запросов к БД, а ID, которых точно
+        нет в фильтре известных external_id, вставляются без предварительного SELECT.
+        """
+        lead_id = lead_cache.get(external_id)
+        if lead_id is not None:
+            return lead_id
+
+        if lead_filter.might_exist(external_id):
+            lead_id = db.scalar(
+                select(models.Lead.id).where(models.Lead.external_id == external_id)
             )
-            db.add(lead)
-            db.commit()
-            db.refresh(lead)
+            if lead_id is not None:
+                return lead_id
 
-        return lead
+        # Если лида параллельно вставил другой процесс, вставка даст IntegrityError,
+        # а повтор транзакции пройдет через SELECT: ID уже помечен в фильтре
+        lead_filter.add(external_id)
+        lead = models.Lead(
+            external_id=external_id,
+            phone=phone,
+            email=email
+        )
+        db.add(lead)
+        db.flush()
+        return lead.id
 
     @staticmethod
-    def get_available_operators(
-        db: Session,
-        source_id: int
-    ) -> List[models.Operator]:
-        source_weights = db.query(models.SourceOperatorWeight).filter(
-            models.SourceOperatorWeight.source_id == source_id
-        ).all()
+    def is_available(entry: RouteEntry) -> bool:
+        return load_tracker.get(entry.operator_id) < entry.max_load
 
-        if not source_weights:
-            return []
+    @staticmethod
+    def reserve_capacity(db: Session, operator_id: int, amount: int = 1) -> bool:
+        """
+        Атомарно занять нагрузку оператора (проверка лимита и инкремент
+        одним условным UPDATE в текущей транзакции)
+        """
+        result = db.execute(
+            update(models.Operator).where(
+                models.Operator.id == operator_id,
+                models.Operator.is_active == True,
+                models.Operator.active_load + amount <= models.Operator.max_load
+            ).values(
+                active_load=models.Operator.active_load + amount
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
 
-        operator_ids = [sw.operator_id for sw in source_weights]
-        operators = db.query(models.Operator).filter(
-            models.Operator.id.in_(operator_ids),
-            models.Operator.is_active == True
-        ).all()
+    @staticmethod
+    @distribution_step_duration.time("assign_operator")
+    def assign_operator(db: Session, source_id: int) -> Optional[RouteEntry]:
+        """Выбрать оператора по весам и занять его нагрузку в текущей транзакции"""
+        route = routing_table.get(db, source_id)
+        load_tracker.ensure_seeded(db)
+        distribution_candidates.observe(
+            sum(1 for entry in route.entries if DistributionService.is_available(entry))
+        )
+        rejected = set()
 
-        available_operators = []
-        for operator in operators:
-            current_load = operator.get_current_load(db)
-            if current_load < operator.max_load:
-                available_operators.append(operator)
+        def is_candidate(entry: RouteEntry) -> bool:
+            return entry.operator_id not in rejected and DistributionService.is_available(entry)
 
-        return available_operators
+        refreshed = False
+        while True:
+            entry = route.select(is_candidate)
+            if entry is None:
+                if refreshed or not route.entries:
+                    return None
+                # Счетчики процесса могли устареть: сверяем кандидатов с БД один раз
+                load_tracker.refresh(db, [candidate.operator_id for candidate in route.entries])
+                rejected.clear()
+                refreshed = True
+                continue
+
+            if DistributionService.reserve_capacity(db, entry.operator_id):
+                return entry
+
+            rejected.add(entry.operator_id)
+            load_tracker.mark_full(entry.operator_id, entry.max_load)
 
     @staticmethod
-    def select_operator_by_weights(
+    def distribute_contact(
         db: Session,
-        source_id: int,
-        available_operators: List[models.Operator]
-    ) -> Optional[models.Operator]:
-        """Выбрать оператора с учетом весов (вероятностный алгоритм)"""
-        if not available_operators:
-            return None
+        contact_data: schemas.ContactCreate
+    ) -> models.Contact:
+        """
+        Распределить обращение в одной транзакции:
+        1. Найти/создать лида
+        2. Выбрать доступного оператора по весам и занять его нагрузку
+        3. Создать обращение
+        При конфликте с параллельной транзакцией попытка повторяется.
+        """
+        def unit_of_work() -> models.Contact:
+            lead_id = DistributionService.find_or_create_lead(
+                db=db,
+                external_id=contact_data.external_id,
+                phone=contact_data.phone,
+                email=contact_data.email
+            )
 
-        operator_weights_map = {}
-        total_weight = 0
+            operator = DistributionService.assign_operator(
+                db=db,
+                source_id=contact_data.source_id
+            )
 
-        for operator in available_operators:
-            weight_obj = db.query(models.SourceOperatorWeight).filter(
-                models.SourceOperatorWeight.source_id == source_id,
-                models.SourceOperatorWeight.operator_id == operator.id
-            ).first()
+            contact = models.Contact(
+                lead_id=lead_id,
+                source_id=contact_data.source_id,
+                operator_id=operator.operator_id if operator else None,
+                status=schemas.ContactStatus.ACTIVE.value,
+                created_at=datetime.utcnow()
+            )
+            db.add(contact)
+            ContactCounterService.record(db, {
+                counter_key(contact.source_id, contact.operator_id, contact.status, contact.created_at): 1
+            })
+            return contact
 
-            if weight_obj:
-                weight = weight_obj.weight
-                operator_weights_map[operator.id] = weight
-                total_weight += weight
+        contact = DistributionService.run_in_transaction(db, unit_of_work)
+        db.refresh(contact)
+        # В кэш попадают только зафиксированные лиды
+        lead_cache.put(contact_data.external_id, contact.lead_id)
+        load_tracker.increment(contact.operator_id)
+        record_distribution(contact.source_id, contact.operator_id is not None)
+        return contact
 
-        if total_weight == 0:
-            return random.choice(available_operators)
+    @staticmethod
+    def resolve_leads(
+        db: Session,
+        items: List[schemas.ContactCreate]
+    ) -> Dict[str, int]:
+        """Найти лидов пачки по external_id (кэш, затем БД) и создать недостающих одной вставкой"""
+        new_leads = {}
+        for item in items:
+            new_leads.setdefault(item.external_id, {
+                "external_id": item.external_id,
+                "phone": item.phone,
+                "email": item.email
+            })
 
-        random_value = random.uniform(0, total_weight)
-        cumulative = 0
+        def select_existing(external_ids: List[str]) -> Dict[str, int]:
+            found = {}
+            for start in range(0, len(external_ids), DistributionService.IN_CHUNK_SIZE):
+                chunk = external_ids[start:start + DistributionService.IN_CHUNK_SIZE]
+                found.update(
+                    (external_id, lead_id) for lead_id, external_id in db.execute(
+                        select(models.Lead.id, models.Lead.external_id).where(
+                            models.Lead.external_id.in_(chunk)
+                        )
+                    )
+                )
+            return found
 
-        for operator in available_operators:
-            weight = operator_weights_map.get(operator.id, 0)
-            cumulative += weight
-            if random_value <= cumulative:
-                return operator
+        lead_ids = {}
+        for external_id in new_leads:
+            lead_id = lead_cache.get(external_id)
+            if lead_id is not None:
+                lead_ids[external_id] = lead_id
+        lead_ids.update(select_existing([
+            external_id for external_id in new_leads
+            if external_id not in lead_ids and lead_filter.might_exist(external_id)
+        ]))
+        missing = [row for external_id, row in new_leads.items() if external_id not in lead_ids]
+        if missing:
+            lead_filter.add_many(row["external_id"] for row in missing)
+            db.execute(insert(models.Lead), missing)
+            lead_ids.update(select_existing([row["external_id"] for row in missing]))
 
-        return available_operators[0]
+        return lead_ids
 
     @staticmethod
-    def distribute_contact(
+    def distribute_batch(
         db: Session,
-        contact_data: schemas.ContactCreate
-    ) -> models.Contact:
+        items: List[schemas.ContactCreate],
+        on_results: Optional[Callable[[List[schemas.ContactBatchItemResult]], None]] = None
+    ) -> List[schemas.ContactBatchItemResult]:
         """
-        Распределить обращение:
-        1. Найти/создать лида
-        2. Найти доступных операторов
-        3. Выбрать оператора по весам
-        4. Создать обращение
+        Распределить пачку обращений в одной транзакции:
+        1. Найти/создать лидов одним IN-запросом и одной вставкой
+        2. Распределить обращения в памяти по снимку нагрузки операторов
+        3. Занять нагрузку одним условным UPDATE на оператора
+        4. Вставить обращения одной пакетной вставкой
+        on_results вызывается с результатами в той же транзакции до фиксации.
         """
-        lead = DistributionService.find_or_create_lead(
-            db=db,
-            external_id=contact_data.external_id,
-            phone=contact_data.phone,
-            email=contact_data.email
-        )
+        def unit_of_work() -> List[schemas.ContactBatchItemResult]:
+            results = DistributionService._distribute_batch(db, items)
+            if on_results is not None:
+                on_results(results)
+            return results
+
+        results = DistributionService.run_in_transaction(db, unit_of_work)
 
-        available_operators = DistributionService.get_available_operators(
-            db=db,
-            source_id=contact_data.source_id
+        lead_cache.put_many({
+            result.external_id: result.lead_id for result in results if result.lead_id
+        })
+        assigned = Counter(result.operator_id for result in results if result.operator_id)
+        for operator_id, amount in assigned.items():
+            load_tracker.increment(operator_id, amount)
+        outcomes = Counter(
+            (result.source_id, result.operator_id is not None) for result in results if result.error is None
         )
+        for (source_id, is_assigned), amount in outcomes.items():
+            record_distribution(source_id, is_assigned, amount)
+        return results
 
-        operator = None
-        if available_operators:
-            operator = DistributionService.select_operator_by_weights(
-                db=db,
-                source_id=contact_data.source_id,
-                available_operators=available_operators
+    @staticmethod
+    def free_capacity(db: Session, routes: Iterable[SourceRoute]) -> Dict[int, int]:
+        """Свободная нагрузка активных операторов маршрутов по данным БД (снимок в транзакции)"""
+        operator_ids = {entry.operator_id for route in routes for entry in route.entries}
+        if not operator_ids:
+            return {}
+        return {
+            operator_id: max_load - active_load
+            for operator_id, active_load, max_load in db.execute(
+                select(
+                    models.Operator.id,
+                    models.Operator.active_load,
+                    models.Operator.max_load
+                ).where(
+                    models.Operator.id.in_(operator_ids),
+                    models.Operator.is_active == True
+                )
             )
+        }
+
+    @staticmethod
+    def _distribute_batch(
+        db: Session,
+        items: List[schemas.ContactCreate]
+    ) -> List[schemas.ContactBatchItemResult]:
+        source_ids = {item.source_id for item in items}
+        known_sources = set(db.scalars(
+            select(models.Source.id).where(models.Source.id.in_(source_ids))
+        ))
+        accepted = [item for item in items if item.source_id in known_sources]
+        lead_ids = DistributionService.resolve_leads(db, accepted) if accepted else {}
+
+        routes = {source_id: routing_table.get(db, source_id) for source_id in known_sources}
+        capacity = DistributionService.free_capacity(db, routes.values())
+
+        def has_capacity(entry: RouteEntry) -> bool:
+            return capacity.get(entry.operator_id, 0) > 0
 
-        contact = models.Contact(
-            lead_id=lead.id,
-            source_id=contact_data.source_id,
-            operator_id=operator.id if operator else None,
-            status=schemas.ContactStatus.ACTIVE
+        for route in routes.values():
+            distribution_candidates.observe(sum(1 for entry in route.entries if has_capacity(entry)))
+
+        results = []
+        contact_rows = []
+        reserved = Counter()
+        created_at = datetime.utcnow()
+        for index, item in enumerate(items):
+            if item.source_id not in known_sources:
+                results.append(schemas.ContactBatchItemResult(
+                    index=index,
+                    external_id=item.external_id,
+                    source_id=item.source_id,
+                    error="Source not found"
+                ))
+                continue
+
+            entry = routes[item.source_id].select(has_capacity)
+            operator_id = None
+            if entry is not None:
+                operator_id = entry.operator_id
+                capacity[operator_id] -= 1
+                reserved[operator_id] += 1
+
+            results.append(schemas.ContactBatchItemResult(
+                index=index,
+                external_id=item.external_id,
+                source_id=item.source_id,
+                lead_id=lead_ids[item.external_id],
+                operator_id=operator_id
+            ))
+            contact_rows.append({
+                "lead_id": lead_ids[item.external_id],
+                "source_id": item.source_id,
+                "operator_id": operator_id,
+                "status": schemas.ContactStatus.ACTIVE.value,
+                "created_at": created_at
+            })
+
+        for operator_id, amount in reserved.items():
+            if not DistributionService.reserve_capacity(db, operator_id, amount):
+                raise TransactionConflict(operator_id)
+
+        if contact_rows:
+            ContactCounterService.record(db, Counter(
+                counter_key(row["source_id"], row["operator_id"], row["status"], row["created_at"])
+                for row in contact_rows
+            ))
+            contact_ids = db.scalars(
+                insert(models.Contact).returning(models.Contact.id, sort_by_parameter_order=True),
+                contact_rows
+            ).all()
+            created = (result for result in results if result.error is None)
+            for result, contact_id in zip(created, contact_ids):
+                result.contact_id = contact_id
+
+        return results
+
+    @staticmethod
+    def release_capacity(db: Session, operator_id: int, amount: int = 1) -> None:
+        """Освободить нагрузку оператора в текущей транзакции"""
+        db.execute(
+            update(models.Operator).where(
+                models.Operator.id == operator_id
+            ).values(
+                active_load=case(
+                    (models.Operator.active_load > amount, models.Operator.active_load - amount),
+                    else_=0
+                )
+            ).execution_options(synchronize_session=False)
         )
-        db.add(contact)
-        db.commit()
-        db.refresh(contact)
 
-        return contact
+    @staticmethod
+    def _select_active_contacts(db: Session, contact_ids: List[int]) -> list:
+        rows = []
+        for start in range(0, len(contact_ids), DistributionService.IN_CHUNK_SIZE):
+            chunk = contact_ids[start:start + DistributionService.IN_CHUNK_SIZE]
+            rows.extend(db.execute(
+                select(
+                    models.Contact.id,
+                    models.Contact.source_id,
+                    models.Contact.operator_id,
+                    models.Contact.created_at
+                ).where(
+                    models.Contact.id.in_(chunk),
+                    models.Contact.status == schemas.ContactStatus.ACTIVE.value
+                )
+            ).all())
+        return rows
+
+    @staticmethod
+    def _update_active_contacts(db: Session, contact_ids: List[int], values: dict) -> None:
+        updated = 0
+        for start in range(0, len(contact_ids), DistributionService.IN_CHUNK_SIZE):
+            chunk = contact_ids[start:start + DistributionService.IN_CHUNK_SIZE]
+            updated += db.execute(
+                update(models.Contact).where(
+                    models.Contact.id.in_(chunk),
+                    models.Contact.status == schemas.ContactStatus.ACTIVE.value
+                ).values(**values).execution_options(synchronize_session=False)
+            ).rowcount
+        if updated != len(contact_ids):
+            raise TransactionConflict(contact_ids)
+
+    @staticmethod
+    def _change_contacts(
+        db: Session,
+        contact_ids: List[int],
+        action: schemas.ContactAction,
+        operator_id: Optional[int]
+    ):
+        rows = DistributionService._select_active_contacts(db, contact_ids)
+        if action == schemas.ContactAction.REASSIGN:
+            rows = [row for row in rows if row.operator_id != operator_id]
+
+        released = Counter(row.operator_id for row in rows if row.operator_id)
+        reserved = Counter()
+        deltas = Counter()
+        active = schemas.ContactStatus.ACTIVE.value
+
+        if action == schemas.ContactAction.CLOSE:
+            closed = schemas.ContactStatus.CLOSED.value
+            DistributionService._update_active_contacts(db, [row.id for row in rows], {"status": closed})
+            for row in rows:
+                deltas[counter_key(row.source_id, row.operator_id, active, row.created_at)] -= 1
+                deltas[counter_key(row.source_id, row.operator_id, closed, row.created_at)] += 1
+        else:
+            if rows:
+                if not DistributionService.reserve_capacity(db, operator_id, len(rows)):
+                    raise OperatorCapacityExceeded(operator_id)
+                reserved[operator_id] = len(rows)
+            DistributionService._update_active_contacts(db, [row.id for row in rows], {"operator_id": operator_id})
+            for row in rows:
+                deltas[counter_key(row.source_id, row.operator_id, active, row.created_at)] -= 1
+                deltas[counter_key(row.source_id, operator_id, active, row.created_at)] += 1
+
+        for released_operator_id, amount in released.items():
+            DistributionService.release_capacity(db, released_operator_id, amount)
+        ContactCounterService.record(db, deltas)
+        return [row.id for row in rows], released, reserved
+
+    @staticmethod
+    def change_contacts(
+        db: Session,
+        contact_ids: List[int],
+        action: schemas.ContactAction,
+        operator_id: Optional[int] = None
+    ) -> schemas.ContactBatchUpdateResponse:
+        """
+        Закрыть или переназначить активные обращения одной транзакцией:
+        статус или оператор меняются пакетным UPDATE, освобожденная нагрузка
+        сразу возвращается операторам, нагрузка нового оператора занимается
+        условным UPDATE. Неактивные и ненайденные обращения пропускаются.
+        """
+        contact_ids = list(dict.fromkeys(contact_ids))
+        updated_ids, released, reserved = DistributionService.run_in_transaction(
+            db, lambda: DistributionService._change_contacts(db, contact_ids, action, operator_id)
+        )
+
+        for released_operator_id, amount in released.items():
+            load_tracker.decrement(released_operator_id, amount)
+        for reserved_operator_id, amount in reserved.items():
+            load_tracker.increment(reserved_operator_id, amount)
+
+        affected = set(released) | set(reserved)
+        operators = db.query(models.Operator).filter(
+            models.Operator.id.in_(affected)
+        ).order_by(models.Operator.id).all() if affected else []
+
+        updated = set(updated_ids)
+        return schemas.ContactBatchUpdateResponse(
+            updated=len(updated_ids),
+            skipped=[contact_id for contact_id in contact_ids if contact_id not in updated],
+            operator_loads=[
+                schemas.OperatorLoad(
+                    operator_id=operator.id,
+                    current_load=operator.active_load,
+                    max_load=operator.max_load
+                )
+                for operator in operators
+            ]
+        )
@@ -0,0 +1,244 @@
+import heapq
+from typing import List, NamedTuple, Optional, Sequence
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.config import settings
+from app.routing import RouteEntry, routing_table
+
+
+class SimulationError(Exception):
+    pass
+
+
+class OperatorNotFound(SimulationError):
+    def __init__(self, operator_id: int):
+        super().__init__(f"Operator with id {operator_id} not found")
+        self.operator_id = operator_id
+
+
+class SimulationOutcome(NamedTuple):
+    assigned: int
+    unassigned: int
+    first_unassigned_after: Optional[float]
+    operators: List[schemas.SimulationOperatorResult]
+
+
+def simulate(
+    entries: Sequence[RouteEntry],
+    arrival_times: np.ndarray,
+    mean_lifetime_seconds: float,
+    initial_loads: Optional[Sequence[int]] = None,
+    seed: Optional[int] = None
+) -> SimulationOutcome:
+    """
+    Проиграть поток обращений (секунды от начала, по возрастанию) на конфигурации
+    операторов по правилам SourceRoute.select: выбор по всем весам с отбраковкой
+    занятых, затем по весам среди операторов ниже max_load; без свободных -
+    обращение не распределено. Время жизни активного обращения - экспоненциальное.
+    Случайные величины выбираются векторно заранее, в цикле остается только учет нагрузки.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(arrival_times)
+    operator_count = len(entries)
+    weights = np.array([entry.weight for entry in entries], dtype=float)
+    max_loads = [entry.max_load for entry in entries]
+    total_weight = weights.sum()
+
+    lifetimes = rng.exponential(mean_lifetime_seconds, count)
+    ends = (arrival_times + lifetimes).tolist()
+    fallback_draws = rng.random(count).tolist()
+    if total_weight > 0:
+        first_choice = np.minimum(
+            np.searchsorted(np.cumsum(weights), rng.uniform(0, total_weight, count)), operator_count - 1
+        ).tolist()
+    else:
+        first_choice = [None] * count
+    weight_list = weights.tolist()
+
+    loads = [0] * operator_count
+    busy = np.zeros(operator_count)
+    # Обращения, активные на старте: по свойству экспоненты остаток жизни распределен так же
+    releases = []
+    for index, load in enumerate(initial_loads or ()):
+        loads[index] = load
+        initial_ends = rng.exponential(mean_lifetime_seconds, load)
+        releases.extend((end, index) for end in initial_ends.tolist())
+        busy[index] += np.minimum(initial_ends, arrival_times[-1] if count else 0).sum()
+    heapq.heapify(releases)
+    peaks = list(loads)
+    saturated_at: List[Optional[float]] = [
+        0.0 if loads[index] >= max_loads[index] else None for index in range(operator_count)
+    ]
+    first_unassigned = None
+    choices = [-1] * count
+
+    for position, arrival in enumerate(arrival_times.tolist()):
+        while releases and releases[0][0] <= arrival:
+            loads[heapq.heappop(releases)[1]] -= 1
+
+        index = first_choice[position]
+        if index is None or weight_list[index] <= 0 or loads[index] >= max_loads[index]:
+            index = _select_available(weight_list, loads, max_loads, fallback_draws[position])
+            if index is None:
+                if first_unassigned is None:
+                    first_unassigned = arrival
+                continue
+
+        load = loads[index] = loads[index] + 1
+        if load > peaks[index]:
+            peaks[index] = load
+        if load >= max_loads[index] and saturated_at[index] is None:
+            saturated_at[index] = arrival
+        choices[position] = index
+        heapq.heappush(releases, (ends[position], index))
+
+    choices = np.array(choices, dtype=np.int64)
+    assigned_mask = choices >= 0
+    horizon = float(arrival_times[-1]) if count else 0.0
+    assigned_counts = np.bincount(choices[assigned_mask], minlength=operator_count)
+    busy += np.bincount(
+        choices[assigned_mask],
+        weights=np.minimum(np.array(ends)[assigned_mask], horizon) - arrival_times[assigned_mask],
+        minlength=operator_count
+    )
+    assigned = int(assigned_mask.sum())
+
+    operators = []
+    for index, entry in enumerate(entries):
+        mean_load = float(busy[index] / horizon) if horizon > 0 else float(loads[index])
+        operators.append(schemas.SimulationOperatorResult(
+            operator_id=entry.operator_id,
+            weight=entry.weight,
+            max_load=entry.max_load,
+            assigned=int(assigned_counts[index]),
+            share=round(int(assigned_counts[index]) / assigned, 4) if assigned else 0.0,
+            mean_load=round(mean_load, 3),
+            utilization=round(mean_load / entry.max_load, 4) if entry.max_load else 0.0,
+            peak_load=peaks[index],
+            saturated_after_seconds=None if saturated_at[index] is None else round(saturated_at[index], 3)
+        ))
+    return SimulationOutcome(assigned, count - assigned, first_unassigned, operators)
+
+
+def _select_available(weights: List[float], loads: List[int], max_loads: List[int], draw: float) -> Optional[int]:
+    """Выбор по весам среди операторов ниже max_load (как select_by_weights)"""
+    candidates = [index for index in range(len(weights)) if loads[index] < max_loads[index]]
+    if not candidates:
+        return None
+    total_weight = sum(weights[index] for index in candidates)
+    if total_weight == 0:
+        return candidates[min(int(draw * len(candidates)), len(candidates) - 1)]
+
+    value = draw * total_weight
+    cumulative = 0.0
+    for index in candidates:
+        cumulative += weights[index]
+        if value <= cumulative:
+            return index
+    return candidates[-1]
+
+
+def _operator_entries(db: Session, source_id: int, config: schemas.SimulationRequest) -> List[RouteEntry]:
+    if config.operators is None:
+        return list(routing_table.get(db, source_id).entries)
+
+    operator_ids = [operator.operator_id for operator in config.operators]
+    if len(set(operator_ids)) != len(operator_ids):
+        raise SimulationError("Duplicate operator_id in simulation")
+    max_loads = dict(db.execute(
+        select(models.Operator.id, models.Operator.max_load).where(models.Operator.id.in_(operator_ids))
+    ).all())
+    entries = []
+    for operator in config.operators:
+        if operator.operator_id not in max_loads:
+            raise OperatorNotFound(operator.operator_id)
+        entries.append(RouteEntry(
+            operator_id=operator.operator_id,
+            weight=operator.weight,
+            max_load=max_loads[operator.operator_id] if operator.max_load is None else operator.max_load
+        ))
+    return entries
+
+
+def _history_query(source_id: int, config: schemas.SimulationRequest):
+    query = select(models.Contact.created_at).where(models.Contact.source_id == source_id)
+    if config.since is not None:
+        query = query.where(models.Contact.created_at >= config.since)
+    if config.until is not None:
+        query = query.where(models.Contact.created_at < config.until)
+    return query
+
+
+def _history_arrivals(db: Session, source_id: int, config: schemas.SimulationRequest) -> np.ndarray:
+    """Моменты создания обращений источника за период (секунды от первого)"""
+    created = db.scalars(
+        _history_query(source_id, config).order_by(models.Contact.id).limit(config.contacts)
+    ).all()
+    if not created:
+        raise SimulationError("No contacts of the source in the selected period")
+    times = np.sort(np.array(created, dtype="datetime64[us]"))
+    return (times - times[0]) / np.timedelta64(1, "s") / config.rate_multiplier
+
+
+def _historical_rate(db: Session, source_id: int, config: schemas.SimulationRequest) -> float:
+    """Средняя интенсивность поступления обращений источника за период (в час)"""
+    query = _history_query(source_id, config).with_only_columns(
+        func.count(), func.min(models.Contact.created_at), func.max(models.Contact.created_at)
+    )
+    count, first, last = db.execute(query).one()
+    if count < 2 or first == last:
+        raise SimulationError("rate_per_hour is required: the source has no contact history to estimate it")
+    return (count - 1) / ((last - first).total_seconds() / 3600)
+
+
+def _poisson_arrivals(rate_per_hour: float, count: int, seed: Optional[int]) -> np.ndarray:
+    gaps = np.random.default_rng(seed).exponential(3600 / rate_per_hour, count)
+    gaps[0] = 0.0
+    return np.cumsum(gaps)
+
+
+def simulate_source(db: Session, source_id: int, config: schemas.SimulationRequest) -> schemas.SimulationResult:
+    """Что будет с нагрузкой при предложенных весах и max_load операторов источника"""
+    if config.contacts > settings.SIMULATION_MAX_CONTACTS:
+        raise SimulationError(f"contacts must not exceed {settings.SIMULATION_MAX_CONTACTS}")
+
+    entries = _operator_entries(db, source_id, config)
+    if not entries:
+        raise SimulationError("No operators to simulate: pass operators or configure the source distribution")
+
+    if config.arrivals == schemas.SimulationArrivals.HISTORY:
+        arrival_times = _history_arrivals(db, source_id, config)
+    else:
+        rate = config.rate_per_hour or _historical_rate(db, source_id, config)
+        arrival_times = _poisson_arrivals(rate * config.rate_multiplier, config.contacts, config.seed)
+
+    initial_loads = None
+    if config.from_current_load:
+        current = dict(db.execute(
+            select(models.Operator.id, models.Operator.active_load).where(
+                models.Operator.id.in_([entry.operator_id for entry in entries])
+            )
+        ).all())
+        initial_loads = [min(current.get(entry.operator_id, 0), entry.max_load) for entry in entries]
+
+    # Потоки прихода и выбора независимы: разные генераторы при общем seed
+    outcome = simulate(
+        entries, arrival_times, config.mean_lifetime_minutes * 60, initial_loads,
+        None if config.seed is None else config.seed + 1
+    )
+    contacts = len(arrival_times)
+    return schemas.SimulationResult(
+        source_id=source_id,
+        arrivals=config.arrivals,
+        contacts=contacts,
+        duration_seconds=round(float(arrival_times[-1]), 3),
+        assigned=outcome.assigned,
+        unassigned=outcome.unassigned,
+        unassigned_rate=round(outcome.unassigned / contacts, 4),
+        first_unassigned_after_seconds=(
+            None if outcome.first_unassigned_after is None else round(outcome.first_unassigned_after, 3)
+        ),
+        operators=outcome.operators
+    )
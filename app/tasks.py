@@ -0,0 +1,31 @@
+import asyncio
+import logging
+from typing import Callable
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(interval: float, func: Callable, *args) -> None:
+    """Периодически выполнять синхронную функцию в пуле потоков"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(func, *args)
+        except Exception:
+            logger.exception("Periodic task %s failed", func.__name__)
+
+
+async def run_until_idle(interval: float, func: Callable[[], bool]) -> None:
+    """
+    Вызывать синхронную функцию в пуле потоков подряд, пока она сообщает,
+    что работа осталась; без работы (или после ошибки) ждать interval секунд
+    """
+    while True:
+        busy = False
+        try:
+            busy = await run_in_threadpool(func)
+        except Exception:
+            logger.exception("Background task %s failed", func.__name__)
+        if not busy:
+            await asyncio.sleep(interval)
@@ -0,0 +1,8 @@
+"""
+Нагрузочные тесты: генератор данных, сценарии поверх ASGI-приложения в процессе
+и JSON-отчеты для сравнения запусков.
+
+    python -m benchmarks generate --scale small
+    python -m benchmarks run --scenarios create,list,stats,config --output results/base.json
+    python -m benchmarks compare results/base.json results/new.json
+"""
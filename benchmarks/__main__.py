@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+
+DEFAULT_DATABASE_URL = "sqlite:///./benchmark.db"
+DEFAULT_SCENARIOS = "create,batch,list,list_sparse,stats,config"
+
+
+def _configure_environment(args) -> None:
+    """Настройки приложения читаются при импорте app, поэтому задаются до него"""
+    os.environ["DATABASE_URL"] = args.database
+    os.environ.setdefault("APP_NAME", "Mini CRM benchmark")
+    os.environ.setdefault("APP_DESCRIPTION", "Benchmark run")
+    os.environ.setdefault("APP_VERSION", "benchmark")
+    # Фоновые задачи не должны влиять на замеры
+    os.environ.setdefault("LOAD_RECONCILE_INTERVAL", "0")
+    os.environ.setdefault("STATS_COMPACT_INTERVAL", "0")
+    os.environ.setdefault("BACKLOG_ENABLED", "false")
+    os.environ.setdefault("ARCHIVE_INTERVAL", "0")
+
+
+def _scale(args):
+    from benchmarks.generator import SCALES, with_contacts
+
+    scale = SCALES[args.scale]
+    return with_contacts(scale, args.contacts) if args.contacts else scale
+
+
+def generate(args) -> None:
+    from benchmarks.generator import generate
+
+    summary = generate(_scale(args), seed=args.seed, active_share=args.active_share)
+    print(f"Generated {args.scale} dataset: {summary}")
+
+
+def run(args) -> None:
+    from benchmarks import report
+    from benchmarks.runner import run
+    from benchmarks.scenarios import SCENARIOS
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)} (available: {', '.join(SCENARIOS)})")
+
+    if args.scale:
+        from benchmarks.generator import generate
+        generate(_scale(args), seed=args.seed)
+
+    def print_result(name: str, result: dict) -> None:
+        latency = result["latency_ms"]
+        print(
+            f"{name:<12} {result['throughput_rps']:>9} rps  "
+            f"p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  p99 {latency['p99']:>8} ms  "
+            f"{result['queries_per_request']['mean']:>6} q/req  {result['response_bytes']['mean']:>8} B  "
+            f"errors {result['errors']}"
+        )
+
+    results = asyncio.run(run(
+        scenarios, args.requests, args.concurrency, args.warmup, args.seed, print_result
+    ))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        report.save({
+            "environment": report.environment({
+                "scenarios": scenarios,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "warmup": args.warmup,
+                "seed": args.seed,
+                "scale": args.scale,
+                "contacts": args.contacts,
+            }),
+            "scenarios": results,
+        }, args.output)
+        print(f"Report saved to {args.output}")
+
+
+def compare(args) -> None:
+    from benchmarks import report
+
+    print(report.compare(report.load(args.baseline), report.load(args.candidate)))
+
+
+def modes(args) -> None:
+    """Прогнать сценарии с DB_ASYNC=false и DB_ASYNC=true на одинаковых данных и сравнить"""
+    from benchmarks import report
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    os.makedirs(args.output_dir, exist_ok=True)
+    for concurrency in levels:
+        paths = {}
+        for mode, db_async in (("sync", "false"), ("async", "true")):
+            paths[mode] = os.path.join(args.output_dir, f"{mode}-c{concurrency}.json")
+            print(f"== {mode}, concurrency {concurrency}")
+            # Настройки читаются при импорте app: каждый режим - в своем процессе
+            subprocess.run([
+                sys.executable, "-m", "benchmarks", "run",
+                "--database", args.database,
+                "--scale", args.scale,
+                "--scenarios", args.scenarios,
+                "--requests", str(args.requests),
+                "--concurrency", str(concurrency),
+                "--warmup", str(args.warmup),
+                "--seed", str(args.seed),
+                "--output", paths[mode],
+            ], env=dict(os.environ, DB_ASYNC=db_async), check=True)
+        print(f"\nconcurrency {concurrency}")
+        print(report.compare(report.load(paths["sync"]), report.load(paths["async"]), ("sync", "async")))
+
+
+def sweep(args) -> None:
+    """Прогнать сценарии на БД разного размера при одной конфигурации распределения"""
+    from benchmarks import report
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    os.makedirs(args.output_dir, exist_ok=True)
+    reports = {}
+    for contacts in sizes:
+        path = os.path.join(args.output_dir, f"contacts-{contacts}.json")
+        print(f"== {contacts} contacts")
+        # Каждый размер - в своем процессе: кэши маршрутов, нагрузки и лидов не переходят между БД
+        subprocess.run([
+            sys.executable, "-m", "benchmarks", "run",
+            "--database", args.database,
+            "--scale", args.scale,
+            "--contacts", str(contacts),
+            "--scenarios", args.scenarios,
+            "--requests", str(args.requests),
+            "--concurrency", str(args.concurrency),
+            "--warmup", str(args.warmup),
+            "--seed", str(args.seed),
+            "--output", path,
+        ], check=True)
+        reports[contacts] = report.load(path)
+    print()
+    print(report.sweep(reports))
+
+
+def main(argv=None) -> None:
+    """Нагрузочные тесты: python -m benchmarks <команда>"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scales = ["tiny", "small", "medium", "large", "xlarge"]
+
+    generate_parser = commands.add_parser("generate", help="заполнить БД синтетическими данными")
+    generate_parser.add_argument("--scale", choices=scales, default="small")
+    generate_parser.add_argument("--seed", type=int, default=42)
+    generate_parser.add_argument("--contacts", type=int, help="число обращений вместо заданного масштабом")
+    generate_parser.add_argument("--active-share", type=float, default=0.3, help="доля активных обращений")
+    generate_parser.set_defaults(handler=generate)
+
+    run_parser = commands.add_parser("run", help="выполнить сценарии и сохранить отчет")
+    run_parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="сценарии через запятую")
+    run_parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--warmup", type=int, default=20, help="неучитываемых запросов перед замером")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--scale", choices=scales, help="перед запуском пересоздать данные этого масштаба")
+    run_parser.add_argument("--contacts", type=int, help="число обращений вместо заданного масштабом")
+    run_parser.add_argument("--output", help="путь к JSON-отчету")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="сравнить два отчета")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(handler=compare)
+
+    modes_parser = commands.add_parser("modes", help="сравнить синхронный и асинхронный режим (DB_ASYNC)")
+    modes_parser.add_argument("--scenarios", default="create,list,stats", help="сценарии через запятую")
+    modes_parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    modes_parser.add_argument("--concurrency", default="8,64", help="уровни параллельности через запятую")
+    modes_parser.add_argument("--warmup", type=int, default=20, help="неучитываемых запросов перед замером")
+    modes_parser.add_argument("--seed", type=int, default=42)
+    modes_parser.add_argument("--scale", choices=scales, default="small", help="данные пересоздаются перед каждым прогоном")
+    modes_parser.add_argument("--output-dir", default="results/modes", help="каталог JSON-отчетов")
+    modes_parser.set_defaults(handler=modes)
+
+    sweep_parser = commands.add_parser("sweep", help="задержки сценариев в зависимости от числа обращений")
+    sweep_parser.add_argument(
+        "--sizes", default="10000,100000,1000000,10000000", help="числа обращений через запятую"
+    )
+    sweep_parser.add_argument("--scale", choices=scales, default="medium", help="операторы, источники и веса")
+    sweep_parser.add_argument("--scenarios", default="create", help="сценарии через запятую")
+    sweep_parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    sweep_parser.add_argument("--concurrency", type=int, default=8)
+    sweep_parser.add_argument("--warmup", type=int, default=20, help="неучитываемых запросов перед замером")
+    sweep_parser.add_argument("--seed", type=int, default=42)
+    sweep_parser.add_argument("--output-dir", default="results/sweep", help="каталог JSON-отчетов")
+    sweep_parser.set_defaults(handler=sweep)
+
+    for command_parser in (generate_parser, run_parser, modes_parser, sweep_parser):
+        command_parser.add_argument(
+            "--database",
+            default=os.environ.get("BENCHMARK_DATABASE_URL", DEFAULT_DATABASE_URL),
+            help="БД для нагрузочных тестов (не рабочая: generate пересоздает схему)"
+        )
+
+    args = parser.parse_args(argv)
+    if hasattr(args, "database"):
+        _configure_environment(args)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, NamedTuple
+from sqlalchemy import insert
+from app import models
+from app.counters import ContactCounterService
+from app.database import Base, SessionLocal, engine, init_db
+from app.loads import recount_operator_loads
+
+CHUNK_SIZE = 10000
+
+
+class Scale(NamedTuple):
+    operators: int
+    sources: int
+    weights_per_source: int
+    leads: int
+    contacts: int
+
+
+SCALES: Dict[str, Scale] = {
+    "tiny": Scale(operators=5, sources=3, weights_per_source=3, leads=1000, contacts=5000),
+    "small": Scale(operators=20, sources=10, weights_per_source=5, leads=10000, contacts=50000),
+    "medium": Scale(operators=100, sources=50, weights_per_source=10, leads=100000, contacts=500000),
+    "large": Scale(operators=500, sources=200, weights_per_source=20, leads=1000000, contacts=5000000),
+    "xlarge": Scale(operators=1000, sources=500, weights_per_source=20, leads=2000000, contacts=10000000),
+}
+
+
+def with_contacts(scale: Scale, contacts: int) -> Scale:
+    """Масштаб с другим числом обращений (лидов - в пять раз меньше) при той же конфигурации распределения"""
+    return scale._replace(leads=max(contacts // 5, 1), contacts=contacts)
+
+
+def generate(
+    scale: Scale,
+    seed: int = 42,
+    active_share: float = 0.3,
+    unassigned_share: float = 0.05,
+    days: int = 30
+) -> dict:
+    """
+    Пересоздать схему и заполнить БД воспроизводимыми данными заданного масштаба.
+    Активные обращения назначаются только в пределах лимита оператора,
+    счетчики статистики и нагрузка пересчитываются по итоговым данным.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = now - timedelta(days=days)
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    with engine.begin() as connection:
+        operators = [
+            {
+                "id": operator_id,
+                "name": f"operator-{operator_id}",
+                "is_active": rng.random() < 0.9,
+                "max_load": rng.randint(20, 200),
+                "created_at": started
+            }
+            for operator_id in range(1, scale.operators + 1)
+        ]
+        connection.execute(insert(models.Operator), operators)
+        connection.execute(insert(models.Source), [
+            {"id": source_id, "name": f"source-{source_id}", "created_at": started}
+            for source_id in range(1, scale.sources + 1)
+        ])
+
+        routes = {}
+        weights = []
+        for source_id in range(1, scale.sources + 1):
+            operator_ids = rng.sample(range(1, scale.operators + 1), min(scale.weights_per_source, scale.operators))
+            source_weights = [rng.randint(1, 100) for _ in operator_ids]
+            routes[source_id] = (operator_ids, list(accumulate(source_weights)))
+            weights.extend(
+                {"source_id": source_id, "operator_id": operator_id, "weight": weight}
+                for operator_id, weight in zip(operator_ids, source_weights)
+            )
+        connection.execute(insert(models.SourceOperatorWeight), weights)
+
+        for start in range(1, scale.leads + 1, CHUNK_SIZE):
+            connection.execute(insert(models.Lead), [
+                {
+                    "id": lead_id,
+                    "external_id": f"lead-{lead_id}",
+                    "phone": f"+7900{lead_id:07d}",
+                    "email": f"lead{lead_id}@example.com" if lead_id % 2 else None,
+                    "created_at": started + timedelta(seconds=rng.randrange(days * 86400))
+                }
+                for lead_id in range(start, min(start + CHUNK_SIZE, scale.leads + 1))
+            ])
+
+        capacity = {
+            operator["id"]: operator["max_load"] if operator["is_active"] else 0
+            for operator in operators
+        }
+        statuses = {"active": 0, "closed": 0}
+        assigned = 0
+        for start in range(0, scale.contacts, CHUNK_SIZE):
+            rows = []
+            for _ in range(min(CHUNK_SIZE, scale.contacts - start)):
+                source_id = rng.randint(1, scale.sources)
+                operator_id = None
+                if rng.random() >= unassigned_share:
+                    operator_ids, cumulative = routes[source_id]
+                    operator_id = rng.choices(operator_ids, cum_weights=cumulative)[0]
+
+                status = "closed"
+                if rng.random() < active_share and (operator_id is None or capacity[operator_id] > 0):
+                    status = "active"
+                    if operator_id is not None:
+                        capacity[operator_id] -= 1
+                statuses[status] += 1
+                assigned += operator_id is not None
+                rows.append({
+                    "lead_id": rng.randint(1, scale.leads),
+                    "source_id": source_id,
+                    "operator_id": operator_id,
+                    "status": status,
+                    "created_at": started + timedelta(seconds=rng.randrange(days * 86400))
+                })
+            connection.execute(insert(models.Contact), rows)
+
+    db = SessionLocal()
+    try:
+        ContactCounterService.rebuild(db)
+        recount_operator_loads(db)
+    finally:
+        db.close()
+
+    return {
+        "scale": scale._asdict(),
+        "seed": seed,
+        "assigned": assigned,
+        "statuses": statuses,
+    }
@@ -0,0 +1,133 @@
+import json
+import math
+import platform
+import sqlite3
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(
+    latencies: List[float],
+    queries: List[int],
+    duration: float,
+    errors: int,
+    statuses: Dict[int, int],
+    sizes: Optional[List[int]] = None
+) -> dict:
+    latencies_ms = [latency * 1000 for latency in latencies]
+    sizes = sizes or []
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 3),
+            "p95": round(percentile(latencies_ms, 95), 3),
+            "p99": round(percentile(latencies_ms, 99), 3),
+            "mean": round(sum(latencies_ms) / len(latencies_ms), 3) if latencies_ms else 0.0,
+            "max": round(max(latencies_ms), 3) if latencies_ms else 0.0,
+        },
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+            "p50": percentile(queries, 50),
+            "max": max(queries) if queries else 0,
+        },
+        # Размер тела ответа: у списков он определяет и время сериализации, и объем передачи
+        "response_bytes": {
+            "mean": round(sum(sizes) / len(sizes)) if sizes else 0,
+            "p50": percentile(sizes, 50),
+            "max": max(sizes) if sizes else 0,
+        },
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(parameters: dict) -> dict:
+    from app.config import settings
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "database_url": settings.DATABASE_URL,
+        "db_async": settings.DB_ASYNC,
+        "parameters": parameters,
+    }
+
+
+def save(report: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return ""
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(baseline: dict, candidate: dict, labels: Tuple[str, str] = ("baseline", "candidate")) -> str:
+    """Таблица изменений задержек, пропускной способности и числа запросов к БД"""
+    lines = [
+        f"{'scenario':<14}{'metric':<10}{labels[0]:>12}{labels[1]:>12}{'change':>10}"
+    ]
+    for name, after in candidate["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        metrics = [
+            ("p50 ms", before["latency_ms"]["p50"], after["latency_ms"]["p50"]),
+            ("p95 ms", before["latency_ms"]["p95"], after["latency_ms"]["p95"]),
+            ("p99 ms", before["latency_ms"]["p99"], after["latency_ms"]["p99"]),
+            ("rps", before["throughput_rps"], after["throughput_rps"]),
+            ("q/req", before["queries_per_request"]["mean"], after["queries_per_request"]["mean"]),
+        ]
+        # Отчеты, сохраненные до появления response_bytes, сравниваются без него
+        if "response_bytes" in before and "response_bytes" in after:
+            metrics.append(("bytes", before["response_bytes"]["mean"], after["response_bytes"]["mean"]))
+        for metric, value_before, value_after in metrics:
+            lines.append(
+                f"{name:<14}{metric:<10}{value_before:>12}{value_after:>12}{_change(value_before, value_after):>10}"
+            )
+    return "\n".join(lines)
+
+
+def sweep(reports: Dict[int, dict]) -> str:
+    """Таблица задержек и пропускной способности сценариев по числу обращений в БД"""
+    lines = [f"{'contacts':>10}  {'scenario':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'q/req':>8}"]
+    for contacts, report in sorted(reports.items()):
+        for name, result in report["scenarios"].items():
+            latency = result["latency_ms"]
+            lines.append(
+                f"{contacts:>10}  {name:<14}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+                f"{result['throughput_rps']:>9}{result['queries_per_request']['mean']:>8}"
+            )
+    return "\n".join(lines)
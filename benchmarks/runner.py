@@ -0,0 +1,84 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Callable, Dict, List
+from app.main import app
+from benchmarks.asgi import ASGIClient
+from benchmarks.report import summarize
+from benchmarks.scenarios import (
+    SCENARIOS, BenchmarkContext, RequestSpec, install_query_counter, start_query_count, stop_query_count
+)
+
+
+async def run_scenario(
+    client: ASGIClient,
+    context: BenchmarkContext,
+    build: Callable[[BenchmarkContext], RequestSpec],
+    requests: int,
+    concurrency: int,
+    warmup: int
+) -> dict:
+    """Выполнить requests запросов сценария в concurrency параллельных потоках запросов"""
+    latencies: List[float] = []
+    queries: List[int] = []
+    sizes: List[int] = []
+    statuses = Counter()
+    errors = 0
+
+    async def send(spec: RequestSpec, record: bool) -> None:
+        nonlocal errors
+        counter, token = start_query_count()
+        started = time.perf_counter()
+        try:
+            response = await client.request(spec.method, spec.path, spec.json_body, spec.headers)
+        finally:
+            stop_query_count(token)
+        elapsed = time.perf_counter() - started
+
+        if "etag" in response.headers:
+            context.etags[spec.path] = response.headers["etag"]
+        if not record:
+            return
+        latencies.append(elapsed)
+        queries.append(counter[0])
+        sizes.append(len(response.body))
+        statuses[response.status] += 1
+        if response.status >= 400:
+            errors += 1
+
+    for _ in range(warmup):
+        await send(build(context), record=False)
+
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            await send(build(context), record=True)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    return summarize(latencies, queries, duration, errors, statuses, sizes)
+
+
+async def run(
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed: int,
+    on_result: Callable[[str, dict], None] = None
+) -> Dict[str, dict]:
+    """Запустить сценарии по очереди внутри жизненного цикла приложения"""
+    install_query_counter()
+    results = {}
+    async with app.router.lifespan_context(app):
+        client = ASGIClient(app)
+        context = BenchmarkContext(seed)
+        for name in scenarios:
+            results[name] = await run_scenario(
+                client, context, SCENARIOS[name], requests, concurrency, warmup
+            )
+            if on_result:
+                on_result(name, results[name])
+    return results
@@ -0,0 +1,130 @@
+import random
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy import event, func
+from app import models
+from app.config import settings
+from app.database import SessionLocal, async_engine, engine
+
+# Счетчик SQL-запросов текущего запроса: контекст переходит в пул потоков и run_sync
+_query_counter: ContextVar[Optional[List[int]]] = ContextVar("benchmark_query_counter", default=None)
+
+
+def _count_query(*args) -> None:
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install_query_counter() -> None:
+    event.listen(engine, "before_cursor_execute", _count_query)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "before_cursor_execute", _count_query)
+
+
+def start_query_count():
+    counter = [0]
+    return counter, _query_counter.set(counter)
+
+
+def stop_query_count(token) -> None:
+    _query_counter.reset(token)
+
+
+class RequestSpec(NamedTuple):
+    method: str
+    path: str
+    json_body: Any = None
+    headers: Optional[Dict[str, str]] = None
+
+
+class BenchmarkContext:
+    """Данные, по которым сценарии строят запросы"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.prefix = settings.API_V1_PREFIX
+        self.etags: Dict[str, str] = {}
+        self.new_leads = 0
+        self.run_id = seed
+
+        db = SessionLocal()
+        try:
+            self.source_ids = [source_id for source_id, in db.query(models.Source.id).all()]
+            self.leads = db.query(func.count(models.Lead.id)).scalar()
+        finally:
+            db.close()
+        if not self.source_ids:
+            raise RuntimeError("Database is empty: run 'python -m benchmarks generate' first")
+
+    def url(self, path: str) -> str:
+        return self.prefix + path
+
+    def external_id(self) -> str:
+        """Повторный лид в 80% случаев, иначе новый"""
+        if self.leads and self.rng.random() < 0.8:
+            return f"lead-{self.rng.randint(1, self.leads)}"
+        self.new_leads += 1
+        return f"bench-{self.run_id}-{self.new_leads}"
+
+    def source_id(self) -> int:
+        return self.rng.choice(self.source_ids)
+
+
+def create_contact(context: BenchmarkContext) -> RequestSpec:
+    return RequestSpec("POST", context.url("/contacts/"), {
+        "external_id": context.external_id(),
+        "source_id": context.source_id()
+    })
+
+
+def ingest_contact(context: BenchmarkContext) -> RequestSpec:
+    """Прием через очередь (при INGEST_QUEUE_ENABLED, иначе обычное создание)"""
+    return RequestSpec("POST", context.url("/contacts/"), {
+        "external_id": context.external_id(),
+        "source_id": context.source_id()
+    }, {"Prefer": "respond-async"})
+
+
+def create_batch(context: BenchmarkContext) -> RequestSpec:
+    return RequestSpec("POST", context.url("/contacts/batch"), {
+        "contacts": [
+            {"external_id": context.external_id(), "source_id": context.source_id()}
+            for _ in range(100)
+        ]
+    })
+
+
+def list_contacts(context: BenchmarkContext) -> RequestSpec:
+    """Страница из 1000 обращений со всеми вложенными объектами"""
+    return RequestSpec("GET", context.url(f"/contacts/?limit=1000&source_id={context.source_id()}"))
+
+
+def list_contacts_sparse(context: BenchmarkContext) -> RequestSpec:
+    """Та же страница без JOIN и только с нужными полями"""
+    return RequestSpec("GET", context.url(
+        f"/contacts/?limit=1000&source_id={context.source_id()}&expand=&fields=id,lead_id,operator_id"
+    ))
+
+
+def stats(context: BenchmarkContext) -> RequestSpec:
+    path = context.rng.choice(("/stats/contacts", "/stats/distribution"))
+    return RequestSpec("GET", context.url(path))
+
+
+def config_poll(context: BenchmarkContext) -> RequestSpec:
+    """Опрос конфигурации ботом: условный запрос с последним полученным ETag"""
+    path = context.url(f"/sources/{context.source_id()}/distribution")
+    etag = context.etags.get(path)
+    return RequestSpec("GET", path, headers={"If-None-Match": etag} if etag else None)
+
+
+SCENARIOS: Dict[str, Callable[[BenchmarkContext], RequestSpec]] = {
+    "create": create_contact,
+    "ingest": ingest_contact,
+    "batch": create_batch,
+    "list": list_contacts,
+    "list_sparse": list_contacts_sparse,
+    "stats": stats,
+    "config": config_poll,
+}
@@ -0,0 +1,82 @@
+import itertools
+import os
+import tempfile
+
+import pytest
+
+# Настройки читаются при импорте app: отдельная БД и без фоновых задач
+_DATABASE_DIR = tempfile.mkdtemp(prefix="crm-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DATABASE_DIR, 'crm.db')}"
+os.environ.setdefault("APP_NAME", "Mini CRM tests")
+os.environ.setdefault("APP_DESCRIPTION", "Tests")
+os.environ.setdefault("APP_VERSION", "test")
+os.environ["DB_ASYNC"] = "false"
+os.environ["INGEST_QUEUE_ENABLED"] = "false"
+os.environ["READ_REPLICA_URLS"] = ""
+os.environ["LOAD_RECONCILE_INTERVAL"] = "0"
+os.environ["STATS_COMPACT_INTERVAL"] = "0"
+os.environ["ARCHIVE_INTERVAL"] = "0"
+os.environ["BACKLOG_ENABLED"] = "false"
+os.environ["IMPORT_ERRORS_DIR"] = os.path.join(_DATABASE_DIR, "import_errors")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_source(client):
+    def make(name: str = "source") -> int:
+        # Имя источника уникально, а БД общая для всех тестов
+        response = client.post("/sources/", json={"name": f"{name}-{next(_names)}"})
+        assert response.status_code == 200
+        return response.json()["id"]
+    return make
+
+
+@pytest.fixture
+def make_operator(client):
+    def make(max_load: int, name: str = "operator") -> int:
+        response = client.post("/operators/", json={"name": name, "max_load": max_load})
+        assert response.status_code == 200
+        return response.json()["id"]
+    return make
+
+
+@pytest.fixture
+def set_distribution(client):
+    def set_weights(source_id: int, weights: dict) -> None:
+        response = client.post(f"/sources/{source_id}/distribution", json={"operator_weights": [
+            {"operator_id": operator_id, "weight": weight} for operator_id, weight in weights.items()
+        ]})
+        assert response.status_code == 200
+    return set_weights
+
+
+@pytest.fixture
+def make_contacts(client):
+    def make(source_id: int, count: int) -> list:
+        contact_ids = []
+        for _ in range(count):
+            response = client.post("/contacts/", json={"external_id": f"lead-{next(_names)}", "source_id": source_id})
+            assert response.status_code == 200
+            contact_ids.append(response.json()["id"])
+        return contact_ids
+    return make
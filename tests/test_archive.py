@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+from app import models
+from app.archive import archive_batch
+from app.counters import ContactCounterService
+
+
+def _archive(client, db, contact_id: int) -> None:
+    assert client.patch(f"/contacts/{contact_id}", json={"action": "close"}).status_code == 200
+    # Только это обращение старше границы архивации: БД общая для всех тестов
+    db.query(models.Contact).filter(models.Contact.id == contact_id).update({"created_at": datetime(2000, 1, 1)})
+    db.commit()
+    assert archive_batch(db, before=datetime(2000, 1, 2), limit=1000) == 1
+    assert db.get(models.Contact, contact_id) is None
+    assert db.get(models.ContactArchive, contact_id) is not None
+
+
+def test_archived_contact_is_still_readable(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("archive-read")
+    operator_id = make_operator(5)
+    set_distribution(source_id, {operator_id: 10})
+    archived_id, active_id = make_contacts(source_id, 2)
+    _archive(client, db, archived_id)
+
+    response = client.get(f"/contacts/{archived_id}")
+    assert response.status_code == 200
+    assert response.json()["id"] == archived_id
+    assert response.json()["status"] == "closed"
+    assert response.json()["operator_id"] == operator_id
+
+    response = client.get("/contacts/export", params={"format": "ndjson", "source_id": source_id})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [archived_id, active_id]
+    response = client.get("/contacts/export", params={"format": "ndjson", "source_id": source_id, "status": "closed"})
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [archived_id]
+
+
+def test_rebuild_counts_archived_contacts(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("archive-rebuild")
+    operator_id = make_operator(5)
+    set_distribution(source_id, {operator_id: 10})
+    archived_id, _ = make_contacts(source_id, 2)
+    _archive(client, db, archived_id)
+
+    ContactCounterService.rebuild(db)
+    counters = {
+        counter.status: counter.count
+        for counter in db.query(models.ContactCounter).filter_by(source_id=source_id, operator_id=operator_id)
+    }
+    assert counters == {"active": 1, "closed": 1}
+    daily = db.query(models.ContactRollupDaily).filter_by(
+        source_id=source_id, operator_id=operator_id, status="closed"
+    ).one()
+    assert (daily.bucket_start, daily.count) == (datetime(2000, 1, 1), 1)
+
+
+def test_patch_archived_contact_is_conflict_not_missing(
+    client, db, make_source, make_operator, set_distribution, make_contacts
+):
+    source_id = make_source("archive-patch")
+    operator_id = make_operator(5)
+    set_distribution(source_id, {operator_id: 10})
+    archived_id, _ = make_contacts(source_id, 2)
+    _archive(client, db, archived_id)
+
+    assert client.patch(f"/contacts/{archived_id}", json={"action": "close"}).status_code == 409
+    response = client.patch(f"/contacts/{archived_id}", json={"action": "reassign", "operator_id": operator_id})
+    assert response.status_code == 409
+    assert client.patch("/contacts/999999999", json={"action": "close"}).status_code == 404
@@ -0,0 +1,47 @@
+from app import models
+from app.backlog import _assign_backlog, assign_backlog
+from app.loads import load_tracker
+from app.services import DistributionService
+
+
+def _operator_ids(db, contact_ids: list) -> list:
+    db.expire_all()
+    return [db.get(models.Contact, contact_id).operator_id for contact_id in contact_ids]
+
+
+def test_backlog_is_assigned_oldest_first_up_to_free_capacity(
+    client, db, make_source, make_operator, set_distribution, make_contacts
+):
+    source_id = make_source("backlog")
+    operator_id = make_operator(2)
+    set_distribution(source_id, {operator_id: 10})
+    assigned = make_contacts(source_id, 2)
+    # Оператор занят: новые обращения остаются в очереди
+    backlog = make_contacts(source_id, 3)
+    assert _operator_ids(db, backlog) == [None, None, None]
+
+    for contact_id in assigned:
+        response = client.patch(f"/contacts/{contact_id}", json={"action": "close"})
+        assert response.status_code == 200
+
+    assert assign_backlog(db, [source_id]) == 2
+    assert _operator_ids(db, backlog) == [operator_id, operator_id, None]
+    assert db.get(models.Operator, operator_id).active_load == 2
+    assert load_tracker.get(operator_id) == 2
+    # Свободной нагрузки больше нет
+    assert assign_backlog(db, [source_id]) == 0
+
+
+def test_backlog_batch_is_capped_by_limit(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("backlog-limit")
+    operator_id = make_operator(1)
+    set_distribution(source_id, {operator_id: 10})
+    make_contacts(source_id, 1)
+    backlog = make_contacts(source_id, 3)
+    response = client.patch(f"/operators/{operator_id}", json={"max_load": 10})
+    assert response.status_code == 200
+
+    assignments = DistributionService.run_in_transaction(db, lambda: _assign_backlog(db, [source_id], 2))
+    assert [assignment.contact_id for assignment in assignments] == backlog[:2]
+    assert _operator_ids(db, backlog) == [operator_id, operator_id, None]
+    assert db.get(models.Operator, operator_id).active_load == 3
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+from app import models
+
+
+def test_concurrent_contacts_do_not_exceed_max_load(client, db, make_source, make_operator, set_distribution):
+    source_id = make_source("concurrent")
+    max_loads = {make_operator(max_load): max_load for max_load in (1, 2, 3)}
+    set_distribution(source_id, {operator_id: 10 for operator_id in max_loads})
+
+    def create(number: int) -> int:
+        response = client.post("/contacts/", json={"external_id": f"concurrent-{number}", "source_id": source_id})
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        statuses = list(executor.map(create, range(40)))
+    assert statuses == [200] * 40
+
+    active_contacts = dict(db.execute(
+        select(models.Contact.operator_id, func.count()).where(
+            models.Contact.source_id == source_id,
+            models.Contact.status == "active",
+            models.Contact.operator_id.is_not(None)
+        ).group_by(models.Contact.operator_id)
+    ).all())
+    for operator_id, max_load in max_loads.items():
+        operator = db.get(models.Operator, operator_id)
+        assert operator.active_load <= max_load
+        assert operator.active_load == active_contacts.get(operator_id, 0)
+    # Мест меньше, чем обращений: все они заняты, остальные обращения без оператора
+    assert sum(active_contacts.values()) == sum(max_loads.values())
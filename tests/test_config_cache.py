@@ -0,0 +1,14 @@
+def test_etag_is_specific_to_resource(client, make_source, make_operator, set_distribution):
+    first = make_source("etag-first")
+    second = make_source("etag-second")
+    set_distribution(first, {make_operator(5): 10})
+    set_distribution(second, {make_operator(5): 10})
+
+    response = client.get(f"/sources/{first}/distribution")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    assert client.get(f"/sources/{first}/distribution", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/sources/{second}/distribution", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/sources/999999/distribution", headers={"If-None-Match": etag}).status_code == 404
+    assert client.get("/sources/999999/distribution", headers={"If-None-Match": "*"}).status_code == 404
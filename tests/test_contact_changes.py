@@ -0,0 +1,70 @@
+import pytest
+from app import models, schemas
+from app.loads import load_tracker
+from app.services import DistributionService, OperatorCapacityExceeded
+
+
+def _counter(db, source_id: int, operator_id: int, status: str) -> int:
+    counter = db.query(models.ContactCounter).filter_by(
+        source_id=source_id, operator_id=operator_id, status=status
+    ).first()
+    return counter.count if counter else 0
+
+
+def _load(db, operator_id: int) -> int:
+    db.expire_all()
+    return db.get(models.Operator, operator_id).active_load
+
+
+def test_reassign_moves_load_between_operators(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("reassign")
+    old_operator_id = make_operator(5)
+    new_operator_id = make_operator(5)
+    set_distribution(source_id, {old_operator_id: 10})
+    contact_id, = make_contacts(source_id, 1)
+    assert (_load(db, old_operator_id), _load(db, new_operator_id)) == (1, 0)
+    assert (load_tracker.get(old_operator_id), load_tracker.get(new_operator_id)) == (1, 0)
+
+    response = client.patch(f"/contacts/{contact_id}", json={"action": "reassign", "operator_id": new_operator_id})
+    assert response.status_code == 200
+    assert response.json()["operator_id"] == new_operator_id
+    assert (_load(db, old_operator_id), _load(db, new_operator_id)) == (0, 1)
+    assert (load_tracker.get(old_operator_id), load_tracker.get(new_operator_id)) == (0, 1)
+    assert _counter(db, source_id, old_operator_id, "active") == 0
+    assert _counter(db, source_id, new_operator_id, "active") == 1
+
+
+def test_reassign_to_full_operator_is_rejected(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("reassign-full")
+    operator_id = make_operator(5)
+    full_operator_id = make_operator(1)
+    set_distribution(source_id, {full_operator_id: 10})
+    make_contacts(source_id, 1)
+    set_distribution(source_id, {operator_id: 10})
+    contact_id, = make_contacts(source_id, 1)
+
+    with pytest.raises(OperatorCapacityExceeded):
+        DistributionService.change_contacts(db, [contact_id], schemas.ContactAction.REASSIGN, full_operator_id)
+    response = client.patch(f"/contacts/{contact_id}", json={"action": "reassign", "operator_id": full_operator_id})
+    assert response.status_code == 409
+    # Отказ не меняет ни обращение, ни нагрузку
+    assert (_load(db, operator_id), _load(db, full_operator_id)) == (1, 1)
+    assert db.get(models.Contact, contact_id).operator_id == operator_id
+
+
+def test_close_releases_load_and_moves_counters(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("close")
+    operator_id = make_operator(5)
+    set_distribution(source_id, {operator_id: 10})
+    contact_ids = make_contacts(source_id, 2)
+
+    response = client.patch(f"/contacts/{contact_ids[0]}", json={"action": "close"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "closed"
+    assert _load(db, operator_id) == 1
+    assert load_tracker.get(operator_id) == 1
+    assert _counter(db, source_id, operator_id, "active") == 1
+    assert _counter(db, source_id, operator_id, "closed") == 1
+
+    assert client.patch(f"/contacts/{contact_ids[0]}", json={"action": "close"}).status_code == 409
+    assert _counter(db, source_id, operator_id, "closed") == 1
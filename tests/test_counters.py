@@ -0,0 +1,124 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import func, update
+from app import models
+from app.archive import archive_batch
+from app.counters import UNASSIGNED, ContactCounterService, day_bucket
+
+
+def test_changing_compacted_contact_keeps_rollups_non_negative(
+    client, db, make_source, make_operator, set_distribution, make_contacts
+):
+    source_id = make_source("counters-old")
+    operator_id = make_operator(10)
+    other_operator_id = make_operator(10)
+    set_distribution(source_id, {operator_id: 10})
+    contact_ids = make_contacts(source_id, 3)
+
+    # Обращения месячной давности: их часовые агрегаты уже свернуты в суточные
+    created_at = day_bucket(datetime.utcnow() - timedelta(days=30)) + timedelta(hours=10)
+    db.execute(update(models.Contact).where(models.Contact.id.in_(contact_ids)).values(created_at=created_at))
+    db.commit()
+    ContactCounterService.rebuild(db)
+    ContactCounterService.compact(db)
+
+    assert client.patch(f"/contacts/{contact_ids[0]}", json={"action": "close"}).status_code == 200
+    assert client.patch(
+        f"/contacts/{contact_ids[1]}", json={"action": "reassign", "operator_id": other_operator_id}
+    ).status_code == 200
+
+    params = {
+        "start": (created_at - timedelta(days=1)).isoformat(),
+        "end": (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+        "group_by": "status",
+    }
+    hourly = client.get("/stats/timeseries", params={**params, "bucket": "hour"}).json()["points"]
+    assert all(point["count"] >= 0 for point in hourly), hourly
+
+    daily = client.get("/stats/timeseries", params={**params, "bucket": "day"}).json()["points"]
+    day = day_bucket(created_at).isoformat()
+    actual = dict(db.query(models.Contact.status, func.count()).filter(
+        func.date(models.Contact.created_at) == created_at.date().isoformat()
+    ).group_by(models.Contact.status).all())
+    assert {
+        point["group"]: point["count"] for point in daily if point["bucket_start"].startswith(day)
+    } == actual == {"active": 2, "closed": 1}
+
+
+def _actual_counts(db) -> Counter:
+    """Обращения (с архивом) по источнику, оператору и статусу - прямой GROUP BY"""
+    counts = Counter()
+    for model in (models.Contact, models.ContactArchive):
+        for source_id, operator_id, status, count in db.query(
+            model.source_id, model.operator_id, model.status, func.count()
+        ).group_by(model.source_id, model.operator_id, model.status):
+            counts[(source_id, operator_id or UNASSIGNED, status)] += count
+    return +counts
+
+
+def _counter_counts(db) -> Counter:
+    return +Counter({
+        (counter.source_id, counter.operator_id, counter.status): counter.count
+        for counter in db.query(models.ContactCounter)
+    })
+
+
+def _rollup_counts(db) -> Counter:
+    counts = Counter()
+    for model in (models.ContactRollupHourly, models.ContactRollupDaily):
+        for source_id, operator_id, status, count in db.query(
+            model.source_id, model.operator_id, model.status, func.sum(model.count)
+        ).group_by(model.source_id, model.operator_id, model.status):
+            counts[(source_id, operator_id, status)] += count
+    return +counts
+
+
+def test_counters_match_contacts(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("counters-parity")
+    operator_id = make_operator(3)
+    other_operator_id = make_operator(10)
+    set_distribution(source_id, {operator_id: 10})
+
+    contact_ids = make_contacts(source_id, 4)
+    response = client.post("/contacts/batch", json={"contacts": [
+        {"external_id": f"counters-parity-{source_id}-{number}", "source_id": source_id} for number in range(3)
+    ]})
+    assert response.status_code == 200
+    assert client.patch(f"/contacts/{contact_ids[0]}", json={"action": "close"}).status_code == 200
+    assert client.patch(
+        f"/contacts/{contact_ids[1]}", json={"action": "reassign", "operator_id": other_operator_id}
+    ).status_code == 200
+    assert client.patch("/contacts/batch", json={
+        "action": "close", "contact_ids": contact_ids[2:]
+    }).status_code == 200
+    db.execute(update(models.Contact).where(models.Contact.id == contact_ids[0]).values(created_at=datetime(2001, 1, 1)))
+    db.commit()
+    assert archive_batch(db, before=datetime(2001, 1, 2), limit=1000) == 1
+
+    db.expire_all()
+    actual = _actual_counts(db)
+    for model in (models.ContactCounter, models.ContactRollupHourly, models.ContactRollupDaily):
+        assert db.query(model).filter(model.count < 0).count() == 0
+    assert _counter_counts(db) == actual
+    assert _rollup_counts(db) == actual
+
+    stats = client.get("/stats/contacts").json()
+    assert stats["total_contacts"] == sum(actual.values())
+    by_status = Counter()
+    for (_, _, status), count in actual.items():
+        by_status[status] += count
+    assert stats["contacts_by_status"] == dict(by_status)
+
+    distribution = client.get("/stats/distribution").json()
+    source_name = db.get(models.Source, source_id).name
+    assert distribution[source_name] == {
+        db.get(models.Operator, key_operator_id).name: sum(
+            count for (key_source_id, counted_operator_id, _), count in actual.items()
+            if key_source_id == source_id and counted_operator_id == key_operator_id
+        )
+        for key_operator_id in (operator_id, other_operator_id)
+    }
+
+    ContactCounterService.rebuild(db)
+    assert _counter_counts(db) == actual
+    assert _rollup_counts(db) == actual
@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app import models
+from app.database import Base
+from app.exports import FileFormat
+from app.imports import LeadImportService
+
+WINDOW = datetime(2002, 1, 1)
+
+
+def _parse(response, export_format: str) -> list:
+    if export_format == "csv":
+        return list(csv.DictReader(io.StringIO(response.text)))
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.fixture
+def window_leads(client, db):
+    """Лиды с created_at WINDOW, WINDOW + 1ч, WINDOW + 2ч - только они попадают в окно выгрузки"""
+    body = "external_id,phone,email\n" + "".join(
+        f"window-{hour},+7000{hour},window{hour}@example.com\n" for hour in range(3)
+    )
+    response = client.post("/leads/import", params={"format": "csv"}, content=body)
+    assert response.json()["imported"] == 3
+    leads = db.query(models.Lead).filter(models.Lead.external_id.like("window-%")).order_by(models.Lead.id).all()
+    for hour, lead in enumerate(leads):
+        lead.created_at = WINDOW + timedelta(hours=hour)
+    db.commit()
+    return [lead.id for lead in leads]
+
+
+@pytest.mark.parametrize("export_format", ["ndjson", "csv"])
+def test_lead_export_imports_back(client, db, window_leads, export_format):
+    response = client.get("/leads/export", params={
+        "format": export_format, "start": WINDOW.isoformat(), "end": (WINDOW + timedelta(days=1)).isoformat()
+    })
+    assert response.status_code == 200
+    exported = _parse(response, export_format)
+    assert [int(row["id"]) for row in exported] == window_leads
+
+    # Выгрузка загружается импортом без ошибок и без потери полей (лишние колонки игнорируются)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as target:
+        report = LeadImportService.import_leads(
+            target, io.StringIO(response.text, newline=""), FileFormat(export_format)
+        )
+        assert (report.processed, report.imported, report.failed) == (3, 3, 0)
+        imported = target.query(models.Lead.external_id, models.Lead.phone, models.Lead.email).order_by(
+            models.Lead.external_id
+        ).all()
+    assert [tuple(row) for row in imported] == [
+        (row["external_id"], row["phone"], row["email"]) for row in exported
+    ]
+
+
+def test_lead_export_bounds_are_half_open(client, window_leads):
+    response = client.get("/leads/export", params={
+        "start": (WINDOW + timedelta(hours=1)).isoformat(), "end": (WINDOW + timedelta(hours=2)).isoformat()
+    })
+    assert [row["id"] for row in _parse(response, "ndjson")] == [window_leads[1]]
+
+
+def test_contact_export_bounds_are_half_open(client, db, make_source, make_operator, set_distribution, make_contacts):
+    source_id = make_source("export-bounds")
+    set_distribution(source_id, {make_operator(5): 10})
+    contact_ids = make_contacts(source_id, 3)
+    for hour, contact_id in enumerate(contact_ids):
+        db.query(models.Contact).filter(models.Contact.id == contact_id).update(
+            {"created_at": WINDOW + timedelta(hours=hour)}
+        )
+    db.commit()
+
+    for export_format in ("ndjson", "csv"):
+        response = client.get("/contacts/export", params={
+            "format": export_format,
+            "source_id": source_id,
+            "start": WINDOW.isoformat(),
+            "end": (WINDOW + timedelta(hours=2)).isoformat()
+        })
+        assert [int(row["id"]) for row in _parse(response, export_format)] == contact_ids[:2]
+    response = client.get("/contacts/export", params={
+        "source_id": source_id, "start": (WINDOW + timedelta(hours=2)).isoformat()
+    })
+    assert [row["id"] for row in _parse(response, "ndjson")] == contact_ids[2:]
+
+
+def test_bad_import_rows_go_to_error_file(client, db):
+    body = "external_id,phone,email\nbad-rows-1,+1,one@example.com\n"
+    response = client.post("/leads/import", params={"format": "csv"}, content=body)
+    assert response.json()["imported"] == 1
+
+    body = (
+        "external_id,phone,email\n"
+        "bad-rows-1,+2,\n"
+        "bad-rows-2,,not-an-email\n"
+        "bad-rows-3,+3,three@example.com\n"
+    )
+    response = client.post("/leads/import", params={"format": "csv"}, content=body)
+    report = response.json()
+    assert (report["processed"], report["imported"], report["failed"]) == (3, 2, 1)
+    assert [(error["line"], error["external_id"]) for error in report["errors"]] == [(3, "bad-rows-2")]
+    errors = list(csv.DictReader(io.StringIO(client.get(report["error_file"]).text)))
+    assert [(row["line"], row["external_id"]) for row in errors] == [("3", "bad-rows-2")]
+
+    leads = {
+        lead.external_id: (lead.phone, lead.email)
+        for lead in db.query(models.Lead).filter(models.Lead.external_id.like("bad-rows-%"))
+    }
+    # Пустой email не затирает известный
+    assert leads == {"bad-rows-1": ("+2", "one@example.com"), "bad-rows-3": ("+3", "three@example.com")}
+
+    response = client.post("/leads/import", params={"format": "ndjson"}, content=b'{"external_id": "bad-rows-4"}\nnot json\n[1]\n')
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (1, 2)
+    assert [error["line"] for error in report["errors"]] == [2, 3]
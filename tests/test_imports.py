@@ -0,0 +1,46 @@
+import csv
+import io
+import os
+import pytest
+from app.config import settings
+from app.imports import LeadImportService
+
+
+def _error_files() -> set:
+    if not os.path.isdir(settings.IMPORT_ERRORS_DIR):
+        return set()
+    return set(os.listdir(settings.IMPORT_ERRORS_DIR))
+
+
+def test_import_errors_are_downloadable_by_url(client):
+    body = "external_id,phone,email\nerrors-url-1,+100,\nerrors-url-2,,not-an-email\n"
+    response = client.post("/leads/import", params={"format": "csv"}, content=body)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (1, 1)
+    # Клиент получает ссылку, а не путь на сервере
+    assert report["error_file"].startswith("/leads/import/errors/")
+    assert settings.IMPORT_ERRORS_DIR not in report["error_file"]
+
+    response = client.get(report["error_file"])
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["line", "external_id", "error"]
+    assert [row[:2] for row in rows[1:]] == [["3", "errors-url-2"]]
+
+
+def test_import_errors_rejects_foreign_names(client):
+    assert client.get("/leads/import/errors/leads-20000101000000-00000000.errors.csv").status_code == 404
+    assert client.get("/leads/import/errors/crm.db").status_code == 404
+    assert client.get("/leads/import/errors/..%2Fcrm.db").status_code == 404
+
+
+def test_failed_import_removes_error_file(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("import failed")
+
+    before = _error_files()
+    monkeypatch.setattr(LeadImportService, "import_leads", fail)
+    with pytest.raises(RuntimeError):
+        client.post("/leads/import", params={"format": "csv"}, content="external_id\nerrors-failed-1\n")
+    assert _error_files() == before
@@ -0,0 +1,51 @@
+import re
+import pytest
+from sqlalchemy import func, select
+from app import models
+from app.archive import CLOSED
+from app.backlog import ACTIVE
+
+Contact = models.Contact
+ContactArchive = models.ContactArchive
+Weight = models.SourceOperatorWeight
+
+QUERIES = {
+    "ix_contacts_lead_id": select(Contact.id).where(Contact.lead_id == 1).order_by(Contact.id),
+    "ix_contacts_source_id": select(Contact.id).where(Contact.source_id == 1).order_by(Contact.id),
+    "ix_contacts_operator_id": select(Contact.id).where(Contact.operator_id == 1).order_by(Contact.id),
+    "ix_contacts_operator_status": select(func.count(Contact.id)).where(
+        Contact.operator_id == 1, Contact.status == "active"
+    ),
+    "ix_contacts_backlog": select(Contact.id, Contact.source_id, Contact.created_at).where(
+        Contact.source_id == 1, Contact.operator_id.is_(None), Contact.status == ACTIVE
+    ).order_by(Contact.id).limit(100),
+    "ix_contacts_closed_created_at": select(Contact.id).where(
+        Contact.status == CLOSED, Contact.created_at < "2024-01-01"
+    ).order_by(Contact.created_at).limit(100),
+    "ix_contacts_archive_source_id": select(ContactArchive.id).where(
+        ContactArchive.source_id == 1
+    ).order_by(ContactArchive.id),
+    "ix_contacts_archive_operator_id": select(ContactArchive.id).where(
+        ContactArchive.operator_id == 1
+    ).order_by(ContactArchive.id),
+    "ix_contacts_archive_created_at": select(ContactArchive.id).where(
+        ContactArchive.created_at >= "2024-01-01", ContactArchive.created_at < "2024-02-01"
+    ),
+    "ux_source_operator_weights_source_operator": select(Weight.operator_id, Weight.weight).where(
+        Weight.source_id == 1
+    ),
+    "ix_source_operator_weights_operator_id": select(Weight.source_id).where(Weight.operator_id == 1),
+}
+
+
+def query_plan(db, statement) -> str:
+    compiled = statement.compile(dialect=db.get_bind().dialect)
+    parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", parameters).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("index_name", QUERIES)
+def test_query_uses_index(client, db, index_name):
+    plan = query_plan(db, QUERIES[index_name])
+    assert re.search(rf"USING (COVERING )?INDEX {index_name}\b", plan), plan
@@ -0,0 +1,42 @@
+from app import ingest, schemas
+from app.config import settings
+from app.ingest import IngestQueue, drain_ingest_queue, ticket_status
+from app.services import DistributionService
+
+
+def test_poison_contact_fails_after_max_attempts(tmp_path, monkeypatch, db, make_source, make_operator, set_distribution):
+    queue = IngestQueue(f"sqlite:///{tmp_path / 'ingest_queue.db'}")
+    queue.init()
+    monkeypatch.setattr(ingest, "ingest_queue", queue)
+    monkeypatch.setattr(settings, "INGEST_MAX_ATTEMPTS", 2)
+
+    distribute_batch = DistributionService.distribute_batch
+
+    def failing_distribute_batch(db, items, on_results=None):
+        if any(item.external_id == "poison" for item in items):
+            raise RuntimeError("poison contact")
+        return distribute_batch(db, items, on_results)
+
+    monkeypatch.setattr(DistributionService, "distribute_batch", staticmethod(failing_distribute_batch))
+
+    source_id = make_source("ingest-poison")
+    set_distribution(source_id, {make_operator(10): 10})
+    tickets = {
+        external_id: queue.put(schemas.ContactCreate(external_id=external_id, source_id=source_id))
+        for external_id in ("ingest-first", "poison", "ingest-second")
+    }
+
+    drain_ingest_queue()
+    # Пачка разделена: исправные обращения распределены, сбойное ждет следующей попытки
+    for external_id in ("ingest-first", "ingest-second"):
+        status = ticket_status(db, tickets[external_id])
+        assert status.status == schemas.IngestStatus.DONE
+        assert status.contact_id is not None
+    assert ticket_status(db, tickets["poison"]).status == schemas.IngestStatus.QUEUED
+
+    drain_ingest_queue()
+    status = ticket_status(db, tickets["poison"])
+    assert status.status == schemas.IngestStatus.FAILED
+    assert "poison contact" in status.error
+    assert queue.depth() == {}
+    assert drain_ingest_queue() is False
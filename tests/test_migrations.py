@@ -0,0 +1,15 @@
+from unittest import mock
+from sqlalchemy import create_engine
+from app.counters import ContactCounterService
+from app.database import Base
+from app.migrations import MIGRATIONS, apply_migrations
+
+
+def test_upgrade_rebuilds_counters_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'crm.db'}")
+    Base.metadata.create_all(bind=engine)
+    with mock.patch.object(ContactCounterService, "rebuild", wraps=ContactCounterService.rebuild) as rebuild:
+        assert apply_migrations(engine) == [migration.version for migration in MIGRATIONS]
+        assert apply_migrations(engine) == []
+    assert rebuild.call_count == 1
+    engine.dispose()
@@ -0,0 +1,39 @@
+import pytest
+from app.pagination import NEXT_CURSOR_HEADER
+
+
+def _walk(client, params: dict) -> list:
+    pages = []
+    cursor = None
+    while True:
+        response = client.get("/contacts/", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append([contact["id"] for contact in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("count, page_sizes", [(7, [3, 3, 1]), (6, [3, 3])])
+def test_cursor_walk_returns_filtered_rows_once(
+    client, make_source, make_operator, set_distribution, make_contacts, count, page_sizes
+):
+    source_id = make_source("pagination")
+    other_source_id = make_source("pagination-other")
+    set_distribution(source_id, {make_operator(100): 10})
+    set_distribution(other_source_id, {make_operator(100): 10})
+    expected = []
+    for _ in range(count):
+        expected.extend(make_contacts(source_id, 1))
+        make_contacts(other_source_id, 1)
+
+    pages = _walk(client, {"source_id": source_id, "limit": 3})
+    assert [contact_id for page in pages for contact_id in page] == expected
+    # Последняя страница непуста и без курсора
+    assert [len(page) for page in pages] == page_sizes
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", "eyJpZCI6ICJ4In0"])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/contacts/", params={"cursor": cursor})
+    assert response.status_code == 400
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import event
+from app.database import engine
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "after_cursor_execute", record)
+    yield executed
+    event.remove(engine, "after_cursor_execute", record)
+
+
+@pytest.fixture
+def source_id(client, make_source, make_operator, set_distribution):
+    source_id = make_source("query-counts")
+    set_distribution(source_id, {make_operator(100): 10})
+    # Прогрев: маршрут источника, нагрузка операторов и строки счетчиков текущего часа
+    for number in range(3):
+        response = client.post("/contacts/", json={"external_id": f"query-counts-{source_id}-{number}", "source_id": source_id})
+        assert response.status_code == 200
+    return source_id
+
+
+def test_create_contact_statement_count(client, source_id, statements):
+    # Источник, лид (новый - INSERT без SELECT), нагрузка, два счетчика, обращение, ответ одной выборкой
+    response = client.post("/contacts/", json={"external_id": "query-counts-new", "source_id": source_id})
+    assert response.status_code == 200
+    assert len(statements) == 8
+
+    statements.clear()
+    # Повторный лид берется из кэша без запроса
+    response = client.post("/contacts/", json={"external_id": "query-counts-new", "source_id": source_id})
+    assert response.status_code == 200
+    assert len(statements) == 7
+
+
+@pytest.mark.parametrize("limit", [1, 3, 100])
+def test_list_contacts_statement_count(client, source_id, statements, limit):
+    response = client.get("/contacts/", params={"source_id": source_id, "limit": limit})
+    assert response.status_code == 200
+    assert len(response.json()) == min(limit, 3)
+    # Обращения вместе с лидом, источником и оператором - одним запросом при любом размере страницы
+    assert len(statements) == 1
@@ -0,0 +1,53 @@
+import sqlite3
+import time
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.config import settings
+from app.replicas import ReadReplicas
+
+
+def _create_replica(path) -> None:
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE contacts (id INTEGER PRIMARY KEY)")
+    connection.close()
+
+
+def test_unavailable_replica_is_reprobed_after_backoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "READ_REPLICA_RETRY_INTERVAL", 0.2)
+    replica_dir = tmp_path / "replica"
+    replicas = ReadReplicas([f"sqlite:///{replica_dir / 'replica.db'}"])
+
+    def session_url() -> str:
+        db = replicas.session()
+        try:
+            return str(db.get_bind().url)
+        finally:
+            db.close()
+
+    # Каталога реплики нет: соединение не открывается, чтения идут на основную БД
+    assert session_url() == settings.DATABASE_URL
+    assert replicas.healthy == [False]
+
+    # Файла реплики нет: он не создается пустым, реплика остается неисправной
+    replica_dir.mkdir()
+    time.sleep(0.3)
+    assert session_url() == settings.DATABASE_URL
+    assert not (replica_dir / "replica.db").exists()
+
+    _create_replica(replica_dir / "replica.db")
+    time.sleep(0.5)
+    assert "replica.db" in session_url()
+    assert replicas.healthy == [True]
+
+
+def test_replica_without_schema_is_unhealthy(tmp_path):
+    empty = tmp_path / "empty.db"
+    sqlite3.connect(empty).close()
+    replica = tmp_path / "replica.db"
+    _create_replica(replica)
+    replicas = ReadReplicas([f"sqlite:///{empty}", f"sqlite:///{replica}"])
+
+    assert replicas.check() == [False, True]
+    # Реплика открыта только для чтения
+    with replicas.engines[1].connect() as connection, pytest.raises(OperationalError, match="readonly"):
+        connection.exec_driver_sql("INSERT INTO contacts (id) VALUES (1)")